@@ -4,6 +4,7 @@ import sys
 from dotenv import load_dotenv
 import time
 import json
+import uuid
 from datetime import datetime
 
 # Configuração da página
@@ -23,10 +24,25 @@ PASTA_DOCUMENTOS = "base"
 
 # Imports do projeto
 try:
-    from langchain_chroma.vectorstores import Chroma
-    from langchain_openai import OpenAIEmbeddings
-    from langchain_core.prompts import ChatPromptTemplate
-    from langchain_groq import ChatGroq
+    from cache_respostas import CacheRespostas
+    from cliente_servico import ClienteServico
+    from conversas import TAMANHO_PAGINA, criar_armazem
+    from filtros import FiltroBusca
+    from rastreamento import (
+        ETAPAS,
+        ExportadorJsonl,
+        ExportadorMemoria,
+        Rastreamento,
+        etapa,
+    )
+    from rag import (
+        buscar_em_colecoes,
+        criar_chain,
+        gerar_resposta,
+        modelo_chat,
+        montar_contexto,
+    )
+    from reranqueamento import CacheScores, carregar_reranqueador
 except ImportError as e:
     st.error(f"❌ Erro ao importar bibliotecas: {e}")
     st.stop()
@@ -140,23 +156,109 @@ st.markdown(
 )
 
 
-# Função para verificar se o banco de dados existe
+# Coleções abertas na primeira consulta e fechadas acima de COLECOES_MEMORIA_MB
 @st.cache_resource(show_spinner=False)
-def carregar_banco_dados():
-    """Carrega o banco vetorial com cache para performance."""
-    if not os.path.exists(CAMINHO_DB):
+def carregar_gerenciador_colecoes():
+    """Gerenciador das coleções do processo, com um cliente de embeddings.
+
+    O cliente é criado ao abrir a primeira coleção e compartilhado pelas demais.
+    """
+    # importado só no modo local: com o serviço no ar a página abre sem ele
+    from colecoes import GerenciadorColecoes
+
+    return GerenciadorColecoes(caminho_padrao=CAMINHO_DB)
+
+
+# Um roteador por temperatura: disjuntores e latências valem para todo o processo
+@st.cache_resource(show_spinner=False)
+def carregar_chain(temperature):
+    return criar_chain(temperature)
+
+
+def listar_colecoes():
+    """Coleções indexadas neste computador, a padrão primeiro."""
+    from db import listar_colecoes
+
+    return listar_colecoes()
+
+
+@st.cache_data(ttl=10, show_spinner=False)
+def listar_fontes(colecoes):
+    """Nomes dos PDFs indexados nas coleções, lidos dos manifestos publicados.
+
+    Sem coleções escolhidas, a busca vai para a padrão, e a lista também.
+    """
+    from db import COLECAO_PADRAO, caminhos_colecao, datas_indexacao
+
+    fontes = set()
+    for nome in colecoes or [COLECAO_PADRAO]:
+        caminho = CAMINHO_DB if nome == COLECAO_PADRAO else caminhos_colecao(nome)[1]
+        fontes.update(datas_indexacao(caminho))
+    return sorted({os.path.basename(fonte) for fonte in fontes})
+
+
+# Função para verificar se o banco de dados existe
+def carregar_colecoes(nomes=None):
+    """Abre (uma vez por processo) as coleções escolhidas; None se falhar."""
+    if not listar_colecoes():
         st.error("❌ Banco de dados não encontrado! Execute `python db.py` primeiro.")
         return None
 
     try:
-        embeddings = OpenAIEmbeddings()
-        db = Chroma(persist_directory=CAMINHO_DB, embedding_function=embeddings)
-        return db
+        return carregar_gerenciador_colecoes().obter_varias(nomes)
     except Exception as e:
         st.error(f"❌ Erro ao carregar banco de dados: {e}")
         return None
 
 
+# Cache de respostas compartilhado entre as sessões
+@st.cache_resource(show_spinner=False)
+def carregar_cache_respostas():
+    """Cria o cache de respostas (exato + semântico) do processo."""
+    return CacheRespostas()
+
+
+# Cross-encoder local (RERANQUEADOR_MODELO) e os scores que ele já calculou
+@st.cache_resource(show_spinner=False)
+def carregar_reranqueamento():
+    """Retorna (reranqueador ou None, cache de scores) do processo."""
+    return carregar_reranqueador(), CacheScores()
+
+
+# Histórico das conversas (SQLite por padrão), limitado a CONVERSAS_MAX_TURNOS
+@st.cache_resource(show_spinner=False)
+def carregar_conversas():
+    """Armazém de conversas do processo, compartilhado entre as sessões."""
+    return criar_armazem()
+
+
+def id_conversa():
+    """Id da conversa desta aba, guardado na URL para sobreviver a reinícios."""
+    if "conversa" not in st.query_params:
+        st.query_params["conversa"] = uuid.uuid4().hex
+    return st.query_params["conversa"]
+
+
+# Destinos dos rastreamentos das consultas (arquivo JSONL + memória do processo)
+@st.cache_resource(show_spinner=False)
+def carregar_exportadores():
+    """Exportadores de rastreamento; o de memória alimenta o painel lateral."""
+    return ExportadorJsonl(), ExportadorMemoria()
+
+
+# Cliente do servico.py (banco e modelos carregados uma vez, compartilhados)
+@st.cache_resource(show_spinner=False)
+def carregar_cliente_servico():
+    """Cliente HTTP do serviço de consultas, com conexões reaproveitadas."""
+    return ClienteServico()
+
+
+@st.cache_data(ttl=10, show_spinner=False)
+def verificar_servico():
+    """Estado do serviço de consultas, ou None se ele não estiver no ar."""
+    return carregar_cliente_servico().saude()
+
+
 # Função para verificar documentos disponíveis
 def verificar_documentos():
     """Verifica quais documentos PDF estão disponíveis."""
@@ -189,9 +291,12 @@ def obter_info_sistema(db):
         # Tenta obter informações da coleção
         info = {}
 
-        # Tamanho do banco
-        if os.path.exists(f"{CAMINHO_DB}/chroma.sqlite3"):
-            tamanho_bytes = os.path.getsize(f"{CAMINHO_DB}/chroma.sqlite3")
+        # Tamanho do banco (do snapshot publicado)
+        from db import caminho_indice
+
+        arquivo_chroma = os.path.join(caminho_indice(CAMINHO_DB), "chroma.sqlite3")
+        if os.path.exists(arquivo_chroma):
+            tamanho_bytes = os.path.getsize(arquivo_chroma)
             info["tamanho_banco"] = f"{tamanho_bytes / (1024 * 1024):.1f} MB"
 
         # Documentos disponíveis
@@ -209,91 +314,242 @@ def obter_info_sistema(db):
 
 
 # Função para processar a pergunta
-def processar_pergunta(pergunta, db, k_docs=4, temperature=0.1):
-    """Processa uma pergunta usando o sistema RAG com parâmetros configuráveis."""
+def processar_pergunta(
+    pergunta,
+    colecoes,
+    k_docs=4,
+    temperature=0.1,
+    area_resposta=None,
+    rastreamento=None,
+    busca="vetorial",
+    reranquear=False,
+    filtro=None,
+):
+    """Processa uma pergunta usando o sistema RAG com parâmetros configuráveis.
+
+    `colecoes` são as coleções abertas consultadas (ver colecoes.py); os k
+    melhores trechos de todas vão para o prompt.
+
+    Se `area_resposta` (um `st.empty()`) for informada, os tokens são exibidos
+    nela conforme chegam. Retorna (resposta, fontes, tempo total, tempo até o
+    primeiro token). Com `rastreamento`, registra a duração de cada etapa.
+    `busca="hibrida"` combina a busca vetorial com o índice BM25 e
+    `reranquear` reordena mais candidatos com o cross-encoder local. `filtro`
+    (um FiltroBusca) restringe a busca a alguns documentos.
+    """
     try:
         start_time = time.time()
 
+        groq_model = modelo_chat()
+
+        # Perguntas iguais ou quase idênticas já respondidas não chamam o LLM
+        # (as versões das coleções entram na chave, como no servico.py)
+        cache = carregar_cache_respostas()
+        versoes = tuple((colecao.nome, colecao.versao) for colecao in colecoes)
+        reranqueador, cache_scores = carregar_reranqueamento()
+        if not reranquear:
+            reranqueador = None
+        parametros = (
+            k_docs,
+            temperature,
+            groq_model,
+            busca,
+            reranqueador is not None,
+            versoes,
+            filtro.chave() if filtro else None,
+        )
+        with etapa(rastreamento, "embedding"):
+            vetor_pergunta = colecoes[0].db.embeddings.embed_query(pergunta)
+        with etapa(rastreamento, "cache_respostas"):
+            em_cache = cache.buscar(pergunta, None, parametros, vetor_pergunta)
+        if em_cache is not None:
+            resposta, fontes = em_cache
+            if rastreamento is not None:
+                rastreamento.atributos["cache"] = True
+            processing_time = time.time() - start_time
+            return resposta, fontes, processing_time, processing_time
+
         # Mostrar spinner durante processamento
         with st.spinner("🔍 Buscando informações no banco de conhecimento..."):
-            # Buscar documentos similares
-            resultados = db.similarity_search_with_relevance_scores(pergunta, k=k_docs)
+            # Buscar documentos similares reaproveitando o embedding da pergunta
+            resultados = buscar_em_colecoes(
+                pergunta,
+                colecoes,
+                k_docs,
+                busca=busca,
+                vetor=vetor_pergunta,
+                reranqueador=reranqueador,
+                cache=cache_scores,
+                rastreamento=rastreamento,
+                filtro=filtro,
+            )
 
         if not resultados:
             return (
                 "Não encontrei informações relevantes para sua pergunta nos documentos disponíveis.",
                 [],
                 0.0,
+                0.0,
             )
 
         # Construir contexto
-        contexto = ""
-        fontes = []
-
-        for i, (doc, score) in enumerate(resultados):
-            contexto += f"\n📄 **Documento {i + 1}** (Similaridade: {score:.3f}):\n{doc.page_content}\n"
-            fontes.append(
-                {
-                    "conteudo": doc.page_content[:300] + "...",
-                    "fonte": doc.metadata.get("source", "Desconhecido"),
-                    "score": score,
-                    "pagina": doc.metadata.get("page", "N/A"),
-                    "chunk_id": i + 1,
-                }
-            )
+        contexto, fontes = montar_contexto(resultados, rastreamento)
 
         # Gerar resposta com LLM
         with st.spinner("🤖 Gerando resposta com IA..."):
-            prompt_template = """Você é um assistente inteligente especialista em Python que ajuda os usuários com suas perguntas com base nos documentos fornecidos.
-
-**PERGUNTA DO USUÁRIO:**
-{pergunta}
-
-**CONTEXTO DISPONÍVEL (Base de Conhecimento):**
-{base_conhecimento}
+            # Groq, OpenAI ou o local, com timeouts e fallback (LLM_BACKENDS)
+            try:
+                chain = carregar_chain(temperature)
+            except ValueError as erro:
+                return f"❌ Erro: {erro}", [], 0.0, 0.0
 
-**INSTRUÇÕES ESPECÍFICAS:**
-1. Responda APENAS com base nas informações fornecidas nos documentos acima
-2. Se a informação não estiver disponível, responda claramente: "Desculpe, não encontrei essa informação específica nos documentos disponíveis."
-3. Seja claro, direto e educativo na sua resposta
-4. Use exemplos práticos quando os documentos fornecerem
-5. Estruture sua resposta em parágrafos curtos e fáceis de ler
-6. Seja honesto sobre as limitações do conhecimento disponível
+            tempo_ate_llm = time.time() - start_time
 
-**RESPOSTA:**"""
+            if area_resposta is None:
+                resposta, first_token_time = gerar_resposta(
+                    chain, pergunta, contexto, rastreamento=rastreamento
+                )
 
-            prompt = ChatPromptTemplate.from_template(prompt_template)
+        if area_resposta is not None:
+            # Exibir os tokens conforme chegam
+            resposta, first_token_time = gerar_resposta(
+                chain,
+                pergunta,
+                contexto,
+                ao_receber_token=lambda texto: exibir_parcial(area_resposta, texto),
+                rastreamento=rastreamento,
+            )
 
-            # Configurar modelo com GROQ (gratuito e ultra-rápido)
-            groq_api_key = os.getenv("GROQ_API_KEY")
-            groq_model = os.getenv("GROQ_MODEL", "llama-3.1-8b-instant")
+        # o tempo até o primeiro token conta desde o início da pergunta
+        first_token_time += tempo_ate_llm
+        cache.guardar(pergunta, None, (resposta, fontes), parametros, vetor_pergunta)
 
-            if not groq_api_key:
-                return "❌ Erro: GROQ_API_KEY não configurada no arquivo .env", [], 0.0
+        processing_time = time.time() - start_time
+        return resposta, fontes, processing_time, first_token_time
 
-            chat = ChatGroq(
-                temperature=temperature,
-                model=groq_model,
-                api_key=groq_api_key,
-            )
-            chain = prompt | chat
-            response = chain.invoke(
-                {"pergunta": pergunta, "base_conhecimento": contexto}
-            )
+    except Exception as e:
+        return f"❌ Erro ao processar pergunta: {str(e)}", [], 0.0, 0.0
+
+
+def processar_pergunta_servico(
+    pergunta,
+    k_docs=4,
+    temperature=0.1,
+    area_resposta=None,
+    rastreamento=None,
+    busca="vetorial",
+    reranquear=False,
+    colecoes=None,
+    filtro=None,
+):
+    """Como `processar_pergunta`, mas quem responde é o servico.py.
+
+    `colecoes` são os nomes das coleções consultadas no serviço.
+    """
+    try:
+        start_time = time.time()
+        cliente = carregar_cliente_servico()
+        parametros = {
+            "k": k_docs,
+            "temperatura": temperature,
+            "busca": busca,
+            "reranquear": reranquear,
+            "colecoes": colecoes,
+            "filtro": filtro.como_dict() if filtro else None,
+        }
+
+        first_token_time = None
+        if area_resposta is None:
+            with st.spinner("🤖 Gerando resposta com IA..."):
+                resultado = cliente.perguntar(pergunta, **parametros)
+        else:
+            texto = ""
+            for evento in cliente.perguntar_streaming(pergunta, **parametros):
+                if evento["tipo"] != "token":
+                    resultado = evento
+                    continue
+                if first_token_time is None:
+                    first_token_time = time.time() - start_time
+                texto += evento["texto"]
+                exibir_parcial(area_resposta, texto)
+
+        # as etapas foram medidas no serviço
+        if rastreamento is not None:
+            for nome, duracao in resultado["etapas"].items():
+                rastreamento.registrar(nome, duracao / 1000)
+            rastreamento.atributos.update(resultado["atributos"])
 
         processing_time = time.time() - start_time
-        return response.content, fontes, processing_time
+        if first_token_time is None:
+            # sem streaming: desconta do total o que o serviço levou após o 1º token
+            first_token_time = processing_time - (
+                resultado["tempo_total"] - resultado["tempo_primeiro_token"]
+            )
+        return (
+            resultado["resposta"],
+            resultado["fontes"],
+            processing_time,
+            first_token_time,
+        )
 
     except Exception as e:
-        return f"❌ Erro ao processar pergunta: {str(e)}", [], 0.0
+        return f"❌ Erro ao processar pergunta: {str(e)}", [], 0.0, 0.0
 
 
-def verificar_banco_dados():
-    """Retorna (True, db) se o banco estiver carregado, caso contrário (False, None)."""
-    db = carregar_banco_dados()
-    if db is None:
+def exibir_parcial(area_resposta, texto_parcial):
+    """Mostra a resposta parcial (com cursor) enquanto os tokens chegam."""
+    area_resposta.markdown(
+        f"""
+    <div class="chat-message ai-message">
+        <strong>🤖 Assistente:</strong> {texto_parcial}▌
+    </div>
+    """,
+        unsafe_allow_html=True,
+    )
+
+
+def formatar_etapas(etapas, atributos):
+    """Linha com a duração de cada etapa da consulta e os tokens usados."""
+    partes = [
+        f"{rotulo} {etapas[nome]:.0f} ms"
+        for nome, rotulo in ETAPAS.items()
+        if nome in etapas
+    ]
+    if "tokens_entrada" in atributos:
+        aproximado = "~" if atributos.get("tokens_estimados") else ""
+        partes.append(
+            f"🔢 {aproximado}{atributos['tokens_entrada']} → "
+            f"{aproximado}{atributos['tokens_saida']} tokens"
+        )
+        if atributos.get("tokens_cache"):
+            partes.append(f"💾 {atributos['tokens_cache']} do cache de prompt")
+    return " · ".join(partes)
+
+
+def exibir_painel_etapas(resumo):
+    """Média e p95 de cada etapa nas consultas feitas neste processo."""
+    if not resumo:
+        st.caption("Nenhuma consulta registrada ainda.")
+        return
+    st.caption(f"{resumo['total']['consultas']} consulta(s) desde o início do app")
+    st.table(
+        [
+            {
+                "Etapa": ETAPAS.get(nome, "⏱️ Total" if nome == "total" else nome),
+                "Média (ms)": f"{estatisticas['media_ms']:.0f}",
+                "p95 (ms)": f"{estatisticas['p95_ms']:.0f}",
+            }
+            for nome, estatisticas in resumo.items()
+        ]
+    )
+
+
+def verificar_banco_dados(colecoes=None):
+    """Retorna (True, coleções abertas) se carregarem, senão (False, None)."""
+    abertas = carregar_colecoes(colecoes)
+    if abertas is None:
         return False, None
-    return True, db
+    return True, abertas
 
 
 # Função principal
@@ -324,28 +580,42 @@ def main():
 
         # Status do banco de dados
         st.header("🗄️ Banco de Dados")
-        if os.path.exists(CAMINHO_DB):
+        servico = verificar_servico()
+        if servico is not None:
+            st.success(f"✅ Serviço no ar ({servico['documentos']} chunks)")
+            url = carregar_cliente_servico().url
+            st.caption(f"🛰️ {url} · backend {servico['backend']}")
+        elif listar_colecoes():
             st.success("✅ Banco de dados encontrado")
-
-            # Tentar carregar e mostrar informações
-            try:
-                embeddings = OpenAIEmbeddings()
-                db = Chroma(persist_directory=CAMINHO_DB, embedding_function=embeddings)
-
-                # Contar documentos (se possível)
-                st.info("📊 Banco de dados carregado com sucesso")
-
-            except Exception as e:
-                st.error(f"❌ Erro ao carregar banco: {e}")
         else:
             st.error("❌ Banco de dados não encontrado")
             st.code("python db.py")
 
+        disponiveis = servico["colecoes"] if servico is not None else listar_colecoes()
+        colecoes = st.multiselect(
+            "📚 Coleções",
+            disponiveis,
+            default=disponiveis[:1],
+            help="Cada coleção é aberta na primeira pergunta; com várias, os"
+            " melhores trechos de todas são combinados",
+        )
+        # busca só nos PDFs escolhidos (pelo índice de fontes, antes do score)
+        documentos_filtro = st.multiselect(
+            "📄 Documentos",
+            listar_fontes(tuple(colecoes)),
+            help="Busca só nos documentos escolhidos; vazio busca em todos",
+        )
+        filtro = FiltroBusca(documentos_filtro) if documentos_filtro else None
+        if servico is None:
+            abertas = carregar_gerenciador_colecoes().abertas()
+            if abertas:
+                st.info(f"📊 Coleções carregadas: {', '.join(abertas)}")
+
         st.divider()
 
         # Informações do modelo
         st.header("🤖 Modelo de Chat")
-        groq_model = os.getenv("GROQ_MODEL", "llama-3.1-8b-instant")
+        groq_model = modelo_chat()
 
         st.success(f"✅ {groq_model}")
         st.write("🚀 Groq - Inferência Ultra-Rápida")
@@ -354,6 +624,38 @@ def main():
 
         if groq_api_key := os.getenv("GROQ_API_KEY"):
             st.caption(f"🔑 API Key: {groq_api_key[:10]}...")
+        st.caption(
+            "🔀 Backends: "
+            + (os.getenv("LLM_BACKENDS") or "groq, openai (os que têm chave)")
+        )
+
+        streaming = st.checkbox("⚡ Exibir resposta em tempo real", value=True)
+        busca = st.radio(
+            "🔎 Tipo de busca",
+            ["vetorial", "hibrida"],
+            format_func={
+                "vetorial": "Vetorial",
+                "hibrida": "Híbrida (BM25 + vetorial)",
+            }.get,
+            help="A híbrida também encontra nomes de funções e mensagens de erro",
+        )
+        if servico is not None:
+            com_reranqueador = servico.get("reranqueador") is not None
+        else:
+            com_reranqueador = carregar_reranqueamento()[0] is not None
+        reranquear = st.checkbox(
+            "🎯 Reranquear com cross-encoder",
+            value=com_reranqueador,
+            disabled=not com_reranqueador,
+            help="Busca mais candidatos e reordena com um modelo local na CPU"
+            " (configure RERANQUEADOR_MODELO)",
+        )
+
+        st.divider()
+
+        # Tempo médio por etapa (preenchido depois de processar a pergunta)
+        st.header("⏱️ Tempo por Etapa")
+        painel_etapas = st.empty()
 
         st.divider()
 
@@ -390,11 +692,16 @@ def main():
         """)
 
     # Área principal
+    conversas = carregar_conversas()
+    conversa_atual = id_conversa()
     st.header("💬 Faça sua Pergunta")
 
     # Input da pergunta
     col1, col2 = st.columns([4, 1])
 
+    # Área onde a resposta aparece token a token (abaixo do input)
+    area_resposta = st.empty()
+
     with col1:
         pergunta = st.text_input(
             "Digite sua pergunta sobre Python:",
@@ -409,33 +716,65 @@ def main():
             if not pergunta.strip():
                 st.warning("⚠️ Por favor, digite uma pergunta.")
             else:
-                # Verificar banco de dados
-                resultado, db = verificar_banco_dados()
+                # Com o servico.py no ar ele responde; senão, o banco local
+                servico = verificar_servico()
+                if servico is not None:
+                    resultado, abertas = True, None
+                else:
+                    resultado, abertas = verificar_banco_dados(colecoes)
                 if resultado:
                     # Processar pergunta
-                    resposta, fontes, processing_time = processar_pergunta(pergunta, db)
-
-                    # Salvar no histórico
-                    if "historico" not in st.session_state:
-                        st.session_state.historico = []
-
-                    st.session_state.historico.append(
-                        {
-                            "pergunta": pergunta,
-                            "resposta": resposta,
-                            "fontes": fontes,
-                            "timestamp": time.time(),
-                            "processing_time": processing_time,
-                        }
+                    rastreamento = Rastreamento(
+                        "pergunta",
+                        carregar_exportadores(),
+                        atributos={"modelo": modelo_chat(), "streaming": streaming},
+                    )
+                    opcoes = {
+                        "area_resposta": area_resposta if streaming else None,
+                        "busca": busca,
+                        "reranquear": reranquear,
+                        "rastreamento": rastreamento,
+                        "filtro": filtro,
+                    }
+                    if servico is not None:
+                        resposta, fontes, processing_time, first_token_time = (
+                            processar_pergunta_servico(
+                                pergunta, colecoes=colecoes, **opcoes
+                            )
+                        )
+                    else:
+                        resposta, fontes, processing_time, first_token_time = (
+                            processar_pergunta(pergunta, abertas, **opcoes)
+                        )
+                    rastreamento.finalizar()
+                    area_resposta.empty()
+
+                    # Salvar no histórico (as fontes só por id do chunk)
+                    conversas.adicionar(
+                        conversa_atual,
+                        pergunta,
+                        resposta,
+                        fontes,
+                        processing_time=processing_time,
+                        first_token_time=first_token_time,
+                        etapas=rastreamento.etapas_ms(),
+                        atributos_rastreamento=rastreamento.atributos,
                     )
 
-    # Exibir histórico
-    if "historico" in st.session_state and st.session_state.historico:
+    # Exibir histórico: só as páginas pedidas são lidas do armazém
+    total_turnos = conversas.contar(conversa_atual)
+    if total_turnos:
         st.divider()
         st.header("📜 Histórico de Conversas")
 
-        # Exibir em ordem reversa (mais recente primeiro)
-        for i, conversa in enumerate(reversed(st.session_state.historico)):
+        paginas = st.session_state.get("paginas_historico", 1)
+        turnos = conversas.pagina(conversa_atual, 0, paginas * TAMANHO_PAGINA)
+        trechos = conversas.trechos(
+            fonte["id"] for turno in turnos for fonte in turno["fontes"]
+        )
+
+        # Mais recente primeiro
+        for conversa in turnos:
             with st.container():
                 # Pergunta do usuário
                 st.markdown(
@@ -467,9 +806,10 @@ def main():
                                 f"""
                             <div style="border-left: 3px solid #2196f3; padding-left: 1rem; margin-bottom: 0.5rem;">
                                 <strong>Fonte {j + 1}:</strong> {fonte["fonte"]}
+                                {f'({fonte["colecao"]})' if fonte.get("colecao") else ""}
                                 <span class="score-badge">Score: {fonte["score"]:.3f}</span>
                                 <br>
-                                <em>{fonte["conteudo"]}</em>
+                                <em>{trechos.get(fonte["id"], "")}</em>
                             </div>
                             """,
                                 unsafe_allow_html=True,
@@ -477,14 +817,35 @@ def main():
 
                 # Tempo de processamento
                 if "processing_time" in conversa:
-                    st.caption(f"⚡ Processado em {conversa['processing_time']:.2f}s")
+                    legenda = f"⚡ Processado em {conversa['processing_time']:.2f}s"
+                    if conversa.get("first_token_time"):
+                        legenda += (
+                            f" · primeiro token em {conversa['first_token_time']:.2f}s"
+                        )
+                    st.caption(legenda)
+                if conversa.get("etapas"):
+                    st.caption(
+                        formatar_etapas(
+                            conversa["etapas"], conversa["atributos_rastreamento"]
+                        )
+                    )
 
                 st.divider()
 
+        if total_turnos > len(turnos):
+            restantes = total_turnos - len(turnos)
+            if st.button(f"⬇️ Mostrar conversas anteriores ({restantes})"):
+                st.session_state.paginas_historico = paginas + 1
+                st.rerun()
+
+    with painel_etapas.container():
+        exibir_painel_etapas(carregar_exportadores()[1].resumo())
+
     # Limpar histórico
-    if "historico" in st.session_state and st.session_state.historico:
+    if total_turnos:
         if st.button("🗑️ Limpar Histórico"):
-            st.session_state.historico = []
+            conversas.limpar(conversa_atual)
+            st.session_state.paginas_historico = 1
             st.rerun()
 
     # Footer
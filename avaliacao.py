@@ -0,0 +1,317 @@
+import argparse
+import itertools
+import json
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+import db
+from divisao_chunks import (
+    ESTRATEGIA_PADRAO,
+    PARAMETROS_ESTRATEGIAS,
+    dividir_documentos,
+    perguntas_das_secoes,
+)
+from indice_local import IndiceLocal
+from latencias import percentis
+from rag import buscar_varias
+
+# Configurações
+# variáveis do .env (e padrões) que a varredura de tamanho e sobreposição muda:
+# as duas primeiras de cada estratégia; "paginas" não tem sobreposição
+VARIAVEIS_CHUNKS = {
+    nome: parametros[:2]
+    for nome, parametros in PARAMETROS_ESTRATEGIAS.items()
+    if len(parametros) >= 2
+}
+KS = [2, 3, 4]
+LIMIARES = [0.0, 0.7]
+TAMANHO_LOTE = 32  # perguntas vetorizadas e buscadas de uma vez
+RECALL_MINIMO = 0.9
+
+
+def ler_perguntas(caminho):
+    """Perguntas rotuladas de um JSONL.
+
+    Cada linha traz `pergunta` e ao menos um rótulo do trecho esperado:
+    `chunk` (id), `fonte` (arquivo), `pagina` (como no metadado `page`, a
+    partir de 0) ou `trecho` (texto que o chunk deve conter).
+    """
+    with open(caminho, encoding="utf-8") as arquivo:
+        perguntas = [json.loads(linha) for linha in arquivo if linha.strip()]
+    for numero, pergunta in enumerate(perguntas, 1):
+        if not {"chunk", "fonte", "pagina", "trecho"} & set(pergunta):
+            raise ValueError(
+                f"Linha {numero} sem rótulo (chunk, fonte, pagina ou trecho)"
+            )
+    return perguntas
+
+
+def relevante(id_chunk, texto, metadados, rotulo):
+    """Se o chunk recuperado atende a todos os rótulos da pergunta."""
+    if "chunk" in rotulo and id_chunk != rotulo["chunk"]:
+        return False
+    if "fonte" in rotulo and not str(metadados.get("source", "")).endswith(
+        rotulo["fonte"]
+    ):
+        return False
+    if "pagina" in rotulo and metadados.get("page") != rotulo["pagina"]:
+        return False
+    if "trecho" in rotulo:
+        return " ".join(rotulo["trecho"].split()) in " ".join(texto.split())
+    return True
+
+
+def variaveis_chunks(estrategia):
+    """Nomes e padrões das variáveis de tamanho e sobreposição da estratégia."""
+    if estrategia not in VARIAVEIS_CHUNKS:
+        raise ValueError(
+            f"A estratégia {estrategia} não tem tamanho e sobreposição para "
+            f"variar (use {', '.join(VARIAVEIS_CHUNKS)})"
+        )
+    return VARIAVEIS_CHUNKS[estrategia]
+
+
+def configuracao_atual(estrategia):
+    """(tamanho, sobreposição) que o db.py usaria hoje com a estratégia."""
+    return tuple(
+        int(os.getenv(nome, padrao)) for nome, padrao in variaveis_chunks(estrategia)
+    )
+
+
+@contextmanager
+def configuracao_chunks(estrategia, tamanho, sobreposicao):
+    """Aplica o tamanho e a sobreposição da estratégia, como no .env do db.py."""
+    nomes = [nome for nome, _ in variaveis_chunks(estrategia)]
+    anteriores = {nome: os.environ.get(nome) for nome in nomes}
+    for nome, valor in zip(nomes, (tamanho, sobreposicao)):
+        os.environ[nome] = str(valor)
+    try:
+        yield
+    finally:
+        for nome, valor in anteriores.items():
+            if valor is None:
+                os.environ.pop(nome, None)
+            else:
+                os.environ[nome] = valor
+
+
+def indexar(documentos, embeddings, estrategia, tamanho, sobreposicao, pasta):
+    """Índice local (em memória, nunca salvo em `pasta`) de uma configuração.
+
+    Os ids são os do db.py, para que os rótulos `chunk` valham nos dois.
+    """
+    with configuracao_chunks(estrategia, tamanho, sobreposicao):
+        chunks = dividir_documentos(documentos, estrategia)
+    indice = IndiceLocal(pasta, embeddings)
+    if chunks:
+        indice.upsert_vetores(
+            db.gerar_ids_chunks(chunks),
+            embeddings.embed_documents([chunk.page_content for chunk in chunks]),
+            [chunk.metadata for chunk in chunks],
+            [chunk.page_content for chunk in chunks],
+        )
+    return indice, chunks
+
+
+def buscar_em_lotes(indice, perguntas, k, tamanho_lote=TAMANHO_LOTE):
+    """Os k melhores (posição, relevância) de cada pergunta, em lotes.
+
+    Cada lote passa pelo `rag.buscar_varias`: um embedding e uma busca para
+    todas as perguntas. Retorna também a latência de cada pergunta: o tempo do
+    lote (embedding + busca) dividido pelo seu tamanho.
+    """
+    posicoes = {id_chunk: i for i, id_chunk in enumerate(indice.ids)}
+    resultados, latencias = [], []
+    for inicio in range(0, len(perguntas), tamanho_lote):
+        lote = [p["pergunta"] for p in perguntas[inicio : inicio + tamanho_lote]]
+        comeco = time.perf_counter()
+        encontrados = buscar_varias(lote, indice, k)
+        latencias += [(time.perf_counter() - comeco) / len(lote)] * len(lote)
+        # as posições no índice são as dos chunks (ver indexar)
+        resultados += [
+            [(posicoes[doc.id], score) for doc, score in pares]
+            for pares in encontrados
+        ]
+    return resultados, latencias
+
+
+def metricas(perguntas, resultados, indice, chunks, k, limiar):
+    """recall@k, MRR e tokens de contexto com os k melhores acima do limiar."""
+    acertos, reciprocos, sem_resposta, tokens = 0, 0.0, 0, []
+    for pergunta, encontrados in zip(perguntas, resultados):
+        aceitos = [(i, score) for i, score in encontrados[:k] if score >= limiar]
+        if not aceitos:
+            sem_resposta += 1
+        tokens.append(sum(chunks[i].metadata["tokens"] for i, _ in aceitos))
+        for posicao, (i, _) in enumerate(aceitos, 1):
+            chunk = chunks[i]
+            if relevante(indice.ids[i], chunk.page_content, chunk.metadata, pergunta):
+                acertos += 1
+                reciprocos += 1 / posicao
+                break
+    total = len(perguntas) or 1
+    return {
+        "recall_k": acertos / total,
+        "mrr": reciprocos / total,
+        "sem_resposta": sem_resposta / total,
+        "tokens_contexto": float(np.mean(tokens)) if tokens else 0.0,
+    }
+
+
+def avaliar(
+    documentos,
+    perguntas,
+    embeddings,
+    estrategia=None,
+    tamanhos=None,
+    sobreposicoes=None,
+    ks=KS,
+    limiares=LIMIARES,
+    tamanho_lote=TAMANHO_LOTE,
+):
+    """Varre as combinações de parâmetros e devolve uma linha por combinação.
+
+    Sem `estrategia`, usa a do .env (CHUNKS_ESTRATEGIA); tamanhos e
+    sobreposições ficam na unidade dela (caracteres ou tokens) e, se omitidos,
+    são os configurados hoje. Os chunks são reindexados só quando tamanho ou
+    sobreposição mudam; k e limiar reaproveitam a mesma busca (feita uma vez
+    com o maior k).
+    """
+    estrategia = estrategia or os.getenv("CHUNKS_ESTRATEGIA", ESTRATEGIA_PADRAO)
+    tamanho_atual, sobreposicao_atual = configuracao_atual(estrategia)
+    linhas = []
+    for tamanho, sobreposicao in itertools.product(
+        tamanhos or [tamanho_atual], sobreposicoes or [sobreposicao_atual]
+    ):
+        if sobreposicao >= tamanho:
+            continue
+        with tempfile.TemporaryDirectory() as pasta:
+            indice, chunks = indexar(
+                documentos, embeddings, estrategia, tamanho, sobreposicao, pasta
+            )
+            resultados, latencias = buscar_em_lotes(
+                indice, perguntas, max(ks), tamanho_lote
+            )
+        latencia = percentis(latencias)
+        for k, limiar in itertools.product(ks, limiares):
+            linhas.append(
+                {
+                    "estrategia": estrategia,
+                    "tamanho": tamanho,
+                    "sobreposicao": sobreposicao,
+                    "k": k,
+                    "limiar": limiar,
+                    "chunks": len(chunks),
+                    **metricas(perguntas, resultados, indice, chunks, k, limiar),
+                    "latencia": latencia,
+                }
+            )
+    return linhas
+
+
+def mais_barata(linhas, recall_minimo=RECALL_MINIMO):
+    """A combinação com menos tokens de contexto que atinge o recall mínimo."""
+    aprovadas = [linha for linha in linhas if linha["recall_k"] >= recall_minimo]
+    if not aprovadas:
+        return None
+    return min(
+        aprovadas,
+        key=lambda linha: (
+            linha["tokens_contexto"],
+            linha["latencia"]["media_ms"],
+            -linha["mrr"],
+        ),
+    )
+
+
+def lista(tipo):
+    return lambda texto: [tipo(valor) for valor in texto.split(",")]
+
+
+if __name__ == "__main__":
+    from modelos_locais import EmbeddingsLocais
+
+    parser = argparse.ArgumentParser(
+        description="Avalia a busca (recall@k, MRR, latência) em perguntas rotuladas."
+    )
+    parser.add_argument(
+        "--perguntas",
+        help="JSONL com 'pergunta' e o chunk, fonte, página ou trecho esperado "
+        "(padrão: títulos do FAQ)",
+    )
+    parser.add_argument(
+        "--estrategia",
+        choices=list(VARIAVEIS_CHUNKS),
+        default=os.getenv("CHUNKS_ESTRATEGIA", ESTRATEGIA_PADRAO),
+        help="padrão: CHUNKS_ESTRATEGIA do .env",
+    )
+    parser.add_argument(
+        "--tamanhos",
+        type=lista(int),
+        help="em caracteres ou tokens, conforme a estratégia (padrão: o do .env)",
+    )
+    parser.add_argument("--sobreposicoes", type=lista(int))
+    parser.add_argument("--ks", type=lista(int), default=KS)
+    parser.add_argument("--limiares", type=lista(float), default=LIMIARES)
+    parser.add_argument("--lote", type=int, default=TAMANHO_LOTE)
+    parser.add_argument("--recall-minimo", type=float, default=RECALL_MINIMO)
+    parser.add_argument(
+        "--embeddings-reais",
+        action="store_true",
+        help="usa o modelo de embeddings do .env em vez dos embeddings locais",
+    )
+    parser.add_argument("--saida", help="arquivo JSON com todas as combinações")
+    args = parser.parse_args()
+
+    documentos = db.load_documents()
+    perguntas = (
+        ler_perguntas(args.perguntas)
+        if args.perguntas
+        else perguntas_das_secoes(documentos)
+    )
+    embeddings = db.criar_embeddings() if args.embeddings_reais else EmbeddingsLocais()
+
+    linhas = avaliar(
+        documentos,
+        perguntas,
+        embeddings,
+        args.estrategia,
+        args.tamanhos,
+        args.sobreposicoes,
+        args.ks,
+        args.limiares,
+        args.lote,
+    )
+    print(f"{len(perguntas)} perguntas, estratégia {args.estrategia}:")
+    for linha in linhas:
+        print(
+            f"  tamanho {linha['tamanho']:5d} | sobreposição "
+            f"{linha['sobreposicao']:4d} | k {linha['k']:2d} | "
+            f"limiar {linha['limiar']:.2f} | recall {linha['recall_k']:.0%} | "
+            f"MRR {linha['mrr']:.3f} | sem resposta {linha['sem_resposta']:.0%} | "
+            f"{linha['tokens_contexto']:.0f} tokens | "
+            f"média {linha['latencia']['media_ms']:.2f} ms | "
+            f"p95 {linha['latencia']['p95_ms']:.2f} ms"
+        )
+
+    escolhida = mais_barata(linhas, args.recall_minimo)
+    if escolhida is None:
+        print(f"❌ Nenhuma combinação atinge recall@k de {args.recall_minimo:.0%}")
+    else:
+        (nome_tamanho, _), (nome_sobreposicao, _) = variaveis_chunks(args.estrategia)
+        print(
+            f"✅ Mais barata com recall@k >= {args.recall_minimo:.0%}: "
+            f"CHUNKS_ESTRATEGIA={args.estrategia} "
+            f"{nome_tamanho}={escolhida['tamanho']} "
+            f"{nome_sobreposicao}={escolhida['sobreposicao']} "
+            f"BUSCA_K={escolhida['k']} "
+            f"BUSCA_RELEVANCIA_MINIMA={escolhida['limiar']}"
+        )
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as arquivo:
+            json.dump(linhas, arquivo, ensure_ascii=False, indent=2)
+        print(f"✅ Resultado salvo em {args.saida}")
@@ -0,0 +1,283 @@
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+import db
+import rag
+from cache_paginas import CachePaginas
+from latencias import percentis
+from modelos_locais import ChatLocal, EmbeddingsLocais
+from rastreamento import ExportadorMemoria, Rastreamento
+
+# Configurações
+PASTA_RESULTADOS = "benchmarks"
+TAMANHOS_CORPUS = [1, 5, 20]
+MODOS_CACHE_PAGINAS = ("frio", "quente")  # páginas extraídas antes da ingestão?
+
+PERGUNTAS = [
+    "O que é Python?",
+    "Como criar uma função em Python?",
+    "Qual a diferença entre lista e tupla?",
+    "O que é programação orientada a objetos?",
+    "Como instalar uma biblioteca com pip?",
+    "O que são dicionários em Python?",
+    "Como tratar exceções com try e except?",
+    "Para que serve o ambiente virtual?",
+    "Como ler um arquivo de texto?",
+    "O que é herança em Python?",
+]
+
+
+def pico_memoria_mb():
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa em KB, macOS em bytes
+    return pico / (1024 * 1024) if sys.platform == "darwin" else pico / 1024
+
+
+def montar_corpus(pasta, documentos):
+    """Copia os PDFs da pasta base até chegar a `documentos` arquivos.
+
+    Cada cópia ganha um comentário no fim com o seu número: o conteúdo (e o
+    hash) muda, e o cache de páginas não trata as cópias como o mesmo PDF.
+    """
+    pdfs = sorted(Path(db.PASTA_BASE).glob("[!.]*.pdf"))
+    if not pdfs:
+        raise FileNotFoundError(f"Nenhum PDF encontrado em {db.PASTA_BASE}/")
+    os.makedirs(pasta, exist_ok=True)
+    for i in range(documentos):
+        destino = os.path.join(pasta, f"documento_{i:05d}.pdf")
+        shutil.copy(pdfs[i % len(pdfs)], destino)
+        with open(destino, "ab") as arquivo:
+            arquivo.write(f"\n% benchmark {i}\n".encode("ascii"))
+
+
+def aquecer_cache_paginas(pasta):
+    """Extrai as páginas dos PDFs de `pasta` para o cache, antes da medição."""
+    cache = CachePaginas()
+    for caminho in sorted(Path(pasta).glob("*.pdf")):
+        cache.paginas(str(caminho))
+    cache.salvar_impressoes()
+
+
+def executar_cenario(documentos, parametros):
+    """Indexa um corpus de `documentos` PDFs e mede as consultas sobre ele."""
+    # os vetores locais não são calibrados para o score de relevância do Chroma
+    warnings.filterwarnings("ignore", message="Relevance scores must be between")
+    embeddings = EmbeddingsLocais(
+        latencia=parametros["latencia_embeddings"],
+        latencia_por_texto=parametros["latencia_por_texto"],
+    )
+    chat = ChatLocal(
+        tokens_resposta=parametros["tokens_resposta"],
+        latencia_primeiro_token=parametros["latencia_primeiro_token"],
+        latencia_por_token=parametros["latencia_por_token"],
+    )
+
+    cache_paginas = parametros.get("cache_paginas", "frio")
+    with tempfile.TemporaryDirectory() as pasta:
+        montar_corpus(os.path.join(pasta, "base"), documentos)
+
+        # as funções reais do db.py, apontando para o corpus e modelos locais
+        db.PASTA_BASE = os.path.join(pasta, "base")
+        db.CAMINHO_DB = os.path.join(pasta, "db")
+        db.criar_embeddings = lambda: embeddings
+        # cache de páginas do cenário, não o .cache/paginas do usuário
+        os.environ["CACHE_PAGINAS_PASTA"] = os.path.join(pasta, "paginas")
+        if cache_paginas == "quente":
+            aquecer_cache_paginas(db.PASTA_BASE)
+
+        inicio = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            db.atualizar_db(reconstruir=True, backend=parametros["backend"])
+        tempo_ingestao = time.perf_counter() - inicio
+        arquivos = db.carregar_manifesto()["arquivos"].values()
+        chunks = sum(len(arquivo["chunks"]) for arquivo in arquivos)
+
+        banco = db.abrir_banco(embeddings, backend=parametros["backend"])
+        chain = rag.criar_chain(chat=chat)
+        memoria = ExportadorMemoria(max_itens=None)
+
+        def consultar(pergunta):
+            inicio = time.perf_counter()
+            rastreamento = Rastreamento("benchmark", [memoria])
+            resultados = rag.buscar_contexto(
+                pergunta, banco, parametros["k"], rastreamento=rastreamento
+            )
+            contexto, _ = rag.montar_contexto(resultados, rastreamento)
+            _, tempo_primeiro_token = rag.gerar_resposta(
+                chain,
+                pergunta,
+                contexto,
+                ao_receber_token=lambda _: None,
+                rastreamento=rastreamento,
+            )
+            rastreamento.finalizar()
+            return time.perf_counter() - inicio, tempo_primeiro_token
+
+        perguntas = [
+            PERGUNTAS[i % len(PERGUNTAS)] for i in range(parametros["consultas"])
+        ]
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=parametros["concorrencia"]) as executor:
+            medidas = list(executor.map(consultar, perguntas))
+        tempo_consultas = time.perf_counter() - inicio
+
+    return {
+        "documentos": documentos,
+        "chunks": chunks,
+        "ingestao": {
+            "cache_paginas": cache_paginas,
+            "segundos": tempo_ingestao,
+            "chunks_por_segundo": chunks / tempo_ingestao if tempo_ingestao else 0.0,
+        },
+        "consultas": {
+            "total": len(medidas),
+            "qps": len(medidas) / tempo_consultas if tempo_consultas else 0.0,
+            "latencia": percentis([total for total, _ in medidas]),
+            "primeiro_token": percentis([primeiro for _, primeiro in medidas]),
+            "etapas": memoria.resumo(),
+        },
+        "pico_rss_mb": pico_memoria_mb(),
+    }
+
+
+def executar_isolado(documentos, parametros):
+    """Roda o cenário num processo novo, para isolar o pico de memória."""
+    contexto = multiprocessing.get_context("spawn")
+    with contexto.Pool(1) as pool:
+        return pool.apply(executar_cenario, (documentos, parametros))
+
+
+def commit_atual():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "desconhecido"
+
+
+def comparar(atual, anterior):
+    """Imprime a variação das métricas em relação a um resultado salvo."""
+    anteriores = {c["documentos"]: c for c in anterior["cenarios"]}
+    print(f"\nComparação com {anterior['commit']}:")
+    modos = [r["parametros"].get("cache_paginas", "?") for r in (anterior, atual)]
+    if modos[0] != modos[1]:
+        print(f"⚠️ Cache de páginas diferente: {modos[0]} -> {modos[1]}")
+    for cenario in atual["cenarios"]:
+        base = anteriores.get(cenario["documentos"])
+        if base is None:
+            continue
+        metricas = [
+            ("p50 (ms)", lambda c: c["consultas"]["latencia"]["p50_ms"]),
+            ("p95 (ms)", lambda c: c["consultas"]["latencia"]["p95_ms"]),
+            ("p99 (ms)", lambda c: c["consultas"]["latencia"]["p99_ms"]),
+            ("qps", lambda c: c["consultas"]["qps"]),
+            ("chunks/s", lambda c: c["ingestao"]["chunks_por_segundo"]),
+            ("pico RSS (MB)", lambda c: c["pico_rss_mb"]),
+        ]
+        print(f"  {cenario['documentos']} documentos:")
+        for nome, metrica in metricas:
+            valor, valor_base = metrica(cenario), metrica(base)
+            variacao = (valor - valor_base) / valor_base * 100 if valor_base else 0.0
+            print(
+                f"    {nome:>14}: {valor_base:10.2f} -> {valor:10.2f} "
+                f"({variacao:+.1f}%)"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark de latência e vazão do RAG com modelos locais."
+    )
+    parser.add_argument(
+        "--tamanhos",
+        default=",".join(map(str, TAMANHOS_CORPUS)),
+        help="quantidades de PDFs do corpus, separadas por vírgula",
+    )
+    parser.add_argument("--consultas", type=int, default=50)
+    parser.add_argument("--concorrencia", type=int, default=1)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--backend", choices=db.BACKENDS, default=db.BACKEND_PADRAO)
+    parser.add_argument("--latencia-embeddings", type=float, default=0.0)
+    parser.add_argument("--latencia-por-texto", type=float, default=0.0)
+    parser.add_argument("--latencia-primeiro-token", type=float, default=0.0)
+    parser.add_argument("--latencia-por-token", type=float, default=0.0)
+    parser.add_argument("--tokens-resposta", type=int, default=20)
+    parser.add_argument(
+        "--cache-paginas",
+        choices=MODOS_CACHE_PAGINAS,
+        default="frio",
+        help="frio: a ingestão extrai os PDFs com o pypdf; quente: as páginas "
+        "já estão no cache do cenário e a ingestão só as lê",
+    )
+    parser.add_argument("--saida", help="arquivo JSON do resultado")
+    parser.add_argument("--comparar", help="resultado JSON anterior para comparar")
+    args = parser.parse_args()
+
+    parametros = {
+        "consultas": args.consultas,
+        "concorrencia": args.concorrencia,
+        "k": args.k,
+        "backend": args.backend,
+        "latencia_embeddings": args.latencia_embeddings,
+        "latencia_por_texto": args.latencia_por_texto,
+        "latencia_primeiro_token": args.latencia_primeiro_token,
+        "latencia_por_token": args.latencia_por_token,
+        "tokens_resposta": args.tokens_resposta,
+        "cache_paginas": args.cache_paginas,
+    }
+    resultado = {
+        "commit": commit_atual(),
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "parametros": parametros,
+        "cenarios": [],
+    }
+
+    print(f"Cache de páginas: {args.cache_paginas}")
+    for documentos in map(int, args.tamanhos.split(",")):
+        print(f"⏳ Corpus com {documentos} documento(s)...")
+        cenario = executar_isolado(documentos, parametros)
+        resultado["cenarios"].append(cenario)
+        latencia = cenario["consultas"]["latencia"]
+        print(
+            f"   {cenario['chunks']} chunks | "
+            f"ingestão {cenario['ingestao']['chunks_por_segundo']:.0f} chunks/s "
+            f"(cache {cenario['ingestao']['cache_paginas']}) | "
+            f"p50 {latencia['p50_ms']:.1f} ms | p95 {latencia['p95_ms']:.1f} ms | "
+            f"p99 {latencia['p99_ms']:.1f} ms | "
+            f"{cenario['consultas']['qps']:.1f} qps | "
+            f"pico RSS {cenario['pico_rss_mb']:.0f} MB"
+        )
+
+    saida = args.saida or os.path.join(PASTA_RESULTADOS, f"{resultado['commit']}.json")
+    os.makedirs(os.path.dirname(saida) or ".", exist_ok=True)
+    with open(saida, "w", encoding="utf-8") as arquivo:
+        json.dump(resultado, arquivo, ensure_ascii=False, indent=2)
+    print(f"✅ Resultado salvo em {saida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as arquivo:
+            comparar(resultado, json.load(arquivo))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+# Configurações (podem ser sobrescritas pelo .env)
+CAMINHO_CACHE = ".cache/embeddings.sqlite3"
+MAX_ITENS_CACHE = 50000
+
+
+def criar_embeddings():
+    """Cria a função de embedding padrão do projeto, com cache em disco."""
+    # o cliente da OpenAI leva mais de 1s para importar: só quando for usado
+    from langchain_openai import OpenAIEmbeddings
+
+    return EmbeddingsComCache(OpenAIEmbeddings())
+
+
+def nome_modelo(embeddings):
+    """Identifica o modelo (e a dimensão, se reduzida) usado como chave do cache."""
+    modelo = getattr(embeddings, "model", None) or type(embeddings).__name__
+    dimensoes = getattr(embeddings, "dimensions", None)
+    return f"{modelo}:{dimensoes}" if dimensoes else modelo
+
+
+class EmbeddingsComCache(Embeddings):
+    """Embeddings com cache em SQLite, indexado por (modelo, hash do texto).
+
+    Os vetores são guardados como blobs float32 e as entradas menos usadas
+    recentemente são descartadas quando o cache passa de `max_itens`.
+    """
+
+    def __init__(self, embeddings, caminho=None, max_itens=None):
+        self.embeddings = embeddings
+        self.modelo = nome_modelo(embeddings)
+        self.caminho = caminho or os.getenv("CACHE_EMBEDDINGS_CAMINHO", CAMINHO_CACHE)
+        self.max_itens = max_itens or int(
+            os.getenv("CACHE_EMBEDDINGS_MAX_ITENS", MAX_ITENS_CACHE)
+        )
+        self._lock = threading.Lock()
+
+        pasta = os.path.dirname(self.caminho)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+        self._conexao = sqlite3.connect(self.caminho, check_same_thread=False)
+        self._conexao.execute("PRAGMA journal_mode=WAL")
+        self._conexao.execute(
+            """CREATE TABLE IF NOT EXISTS embeddings (
+                modelo TEXT NOT NULL,
+                hash BLOB NOT NULL,
+                vetor BLOB NOT NULL,
+                ultimo_acesso REAL NOT NULL,
+                PRIMARY KEY (modelo, hash)
+            ) WITHOUT ROWID"""
+        )
+        self._conexao.execute(
+            "CREATE INDEX IF NOT EXISTS idx_ultimo_acesso ON embeddings (ultimo_acesso)"
+        )
+        self._conexao.commit()
+
+    def embed_documents(self, texts):
+        texts = list(texts)
+        hashes = [hash_texto(texto) for texto in texts]
+        vetores = self._buscar(hashes)
+
+        # vetorizar (uma vez) apenas os textos que ainda não estão no cache
+        faltantes = {}
+        for texto, hash_ in zip(texts, hashes):
+            if hash_ not in vetores:
+                faltantes.setdefault(hash_, texto)
+        if faltantes:
+            novos = self.embeddings.embed_documents(list(faltantes.values()))
+            novos = {
+                hash_: np.asarray(vetor, dtype=np.float32)
+                for hash_, vetor in zip(faltantes, novos)
+            }
+            self._salvar(novos)
+            vetores.update(novos)
+
+        return [list(map(float, vetores[hash_])) for hash_ in hashes]
+
+    def embed_query(self, text):
+        hash_ = hash_texto(text)
+        vetor = self._buscar([hash_]).get(hash_)
+        if vetor is None:
+            vetor = np.asarray(self.embeddings.embed_query(text), dtype=np.float32)
+            self._salvar({hash_: vetor})
+        return list(map(float, vetor))
+
+    def limpar(self):
+        with self._lock:
+            self._conexao.execute(
+                "DELETE FROM embeddings WHERE modelo = ?", (self.modelo,)
+            )
+            self._conexao.commit()
+
+    def __len__(self):
+        with self._lock:
+            (total,) = self._conexao.execute(
+                "SELECT COUNT(*) FROM embeddings WHERE modelo = ?", (self.modelo,)
+            ).fetchone()
+        return total
+
+    def _buscar(self, hashes):
+        encontrados = {}
+        unicos = list(dict.fromkeys(hashes))
+        with self._lock:
+            # o SQLite limita a quantidade de parâmetros por consulta
+            for inicio in range(0, len(unicos), 500):
+                lote = unicos[inicio : inicio + 500]
+                marcadores = ",".join("?" * len(lote))
+                linhas = self._conexao.execute(
+                    f"SELECT hash, vetor FROM embeddings "
+                    f"WHERE modelo = ? AND hash IN ({marcadores})",
+                    [self.modelo, *lote],
+                ).fetchall()
+                for hash_, vetor in linhas:
+                    encontrados[hash_] = np.frombuffer(vetor, dtype=np.float32)
+            if encontrados:
+                agora = time.time()
+                self._conexao.executemany(
+                    "UPDATE embeddings SET ultimo_acesso = ? "
+                    "WHERE modelo = ? AND hash = ?",
+                    [(agora, self.modelo, hash_) for hash_ in encontrados],
+                )
+                self._conexao.commit()
+        return encontrados
+
+    def _salvar(self, vetores):
+        agora = time.time()
+        linhas = [
+            (self.modelo, hash_, vetor.tobytes(), agora)
+            for hash_, vetor in vetores.items()
+        ]
+        with self._lock:
+            self._conexao.executemany(
+                "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)", linhas
+            )
+            self._descartar_excedentes()
+            self._conexao.commit()
+
+    def _descartar_excedentes(self):
+        (total,) = self._conexao.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        excedente = total - self.max_itens
+        if excedente > 0:
+            self._conexao.execute(
+                "DELETE FROM embeddings WHERE (modelo, hash) IN ("
+                "SELECT modelo, hash FROM embeddings ORDER BY ultimo_acesso LIMIT ?)",
+                (excedente,),
+            )
+
+
+def hash_texto(texto):
+    return hashlib.sha256(texto.encode("utf-8")).digest()
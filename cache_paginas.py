@@ -0,0 +1,149 @@
+import hashlib
+import json
+import os
+from importlib.metadata import PackageNotFoundError, version
+
+from langchain_core.documents import Document
+
+# Configurações (podem ser sobrescritas pelo .env)
+PASTA_CACHE = ".cache/paginas"
+ARQUIVO_IMPRESSOES = "impressoes.json"  # {caminho: tamanho, mtime e hash}
+COMPRESSAO = "lz4"  # por buffer de cada lote: descomprimido só ao ler o lote
+PAGINAS_POR_LOTE = 64
+
+
+def hash_arquivo(caminho):
+    sha = hashlib.sha256()
+    with open(caminho, "rb") as arquivo:
+        for bloco in iter(lambda: arquivo.read(1024 * 1024), b""):
+            sha.update(bloco)
+    return sha.hexdigest()
+
+
+def versao_extrator():
+    """Versão do pypdf: outra versão pode extrair outro texto."""
+    try:
+        return f"pypdf-{version('pypdf')}"
+    except PackageNotFoundError:
+        return "pypdf"
+
+
+class CachePaginas:
+    """Páginas extraídas dos PDFs, guardadas por hash do conteúdo.
+
+    Cada PDF vira um arquivo Arrow IPC comprimido com LZ4, em lotes de
+    PAGINAS_POR_LOTE páginas (texto e metadados). Na leitura, o arquivo é
+    mapeado em memória e os lotes são descomprimidos um de cada vez: só um
+    lote por vez ocupa o heap além dos Documents. O hash de cada caminho fica
+    guardado com o tamanho e a data de modificação, então um PDF que não mudou
+    nem é relido para calcular o hash.
+    """
+
+    def __init__(self, pasta=None):
+        self.pasta = pasta or os.getenv("CACHE_PAGINAS_PASTA", PASTA_CACHE)
+        self.extrator = versao_extrator()
+        self._impressoes = None
+
+    def impressao(self, caminho):
+        """Hash do conteúdo do PDF, recalculado só se tamanho ou mtime mudaram."""
+        estado = os.stat(caminho)
+        chave = os.path.abspath(caminho)
+        impressoes = self._carregar_impressoes()
+        anterior = impressoes.get(chave)
+        if anterior and anterior[:2] == [estado.st_size, estado.st_mtime_ns]:
+            return anterior[2]
+        hash_ = hash_arquivo(caminho)
+        impressoes[chave] = [estado.st_size, estado.st_mtime_ns, hash_]
+        return hash_
+
+    def salvar_impressoes(self):
+        """Grava as impressões e apaga as páginas de PDFs que não existem mais."""
+        impressoes = {
+            caminho: impressao
+            for caminho, impressao in self._carregar_impressoes().items()
+            if os.path.exists(caminho)
+        }
+        os.makedirs(self.pasta, exist_ok=True)
+        caminho = os.path.join(self.pasta, ARQUIVO_IMPRESSOES)
+        with open(caminho + ".tmp", "w", encoding="utf-8") as arquivo:
+            json.dump(impressoes, arquivo)
+        os.replace(caminho + ".tmp", caminho)
+        self._impressoes = impressoes
+
+        usados = {self._nome(impressao[2]) for impressao in impressoes.values()}
+        for nome in os.listdir(self.pasta):
+            if nome.endswith(".arrow") and nome not in usados:
+                os.remove(os.path.join(self.pasta, nome))
+
+    def paginas(self, caminho, hash_=None):
+        """Páginas do PDF (como o PyPDFLoader): do cache ou extraídas agora."""
+        arquivo = os.path.join(self.pasta, self._nome(hash_ or self.impressao(caminho)))
+        if os.path.exists(arquivo):
+            try:
+                return self._ler(arquivo, caminho)
+            except (OSError, ValueError):
+                pass  # arquivo corrompido: extrai de novo
+        from langchain_community.document_loaders import PyPDFLoader
+
+        documentos = PyPDFLoader(caminho).load()
+        self._gravar(arquivo, documentos)
+        return documentos
+
+    def _nome(self, hash_):
+        return f"{hash_}-{self.extrator}.arrow"
+
+    def _carregar_impressoes(self):
+        if self._impressoes is None:
+            try:
+                caminho = os.path.join(self.pasta, ARQUIVO_IMPRESSOES)
+                with open(caminho, encoding="utf-8") as arquivo:
+                    self._impressoes = json.load(arquivo)
+            except (FileNotFoundError, json.JSONDecodeError):
+                self._impressoes = {}
+        return self._impressoes
+
+    def _gravar(self, arquivo, documentos):
+        import pyarrow as pa
+
+        # o caminho sai dos metadados: o mesmo PDF pode estar em outra pasta
+        tabela = pa.table(
+            {
+                "texto": [doc.page_content for doc in documentos],
+                "metadados": [
+                    json.dumps(
+                        {k: v for k, v in doc.metadata.items() if k != "source"},
+                        ensure_ascii=False,
+                        default=str,
+                    )
+                    for doc in documentos
+                ],
+            }
+        )
+        os.makedirs(self.pasta, exist_ok=True)
+        # vários processos podem extrair o mesmo PDF: troca atômica do arquivo
+        temporario = f"{arquivo}.{os.getpid()}.tmp"
+        opcoes = pa.ipc.IpcWriteOptions(compression=COMPRESSAO)
+        with pa.OSFile(temporario, "wb") as saida:
+            with pa.ipc.new_file(saida, tabela.schema, options=opcoes) as escritor:
+                escritor.write_table(tabela, max_chunksize=PAGINAS_POR_LOTE)
+        os.replace(temporario, arquivo)
+
+    def _ler(self, arquivo, caminho):
+        import pyarrow as pa
+
+        documentos = []
+        with pa.memory_map(arquivo) as entrada:
+            leitor = pa.ipc.open_file(entrada)
+            for i in range(leitor.num_record_batches):
+                lote = leitor.get_batch(i)
+                documentos.extend(
+                    Document(
+                        page_content=texto,
+                        metadata={"source": caminho, **json.loads(meta)},
+                    )
+                    for texto, meta in zip(
+                        lote.column("texto").to_pylist(),
+                        lote.column("metadados").to_pylist(),
+                    )
+                )
+        return documentos
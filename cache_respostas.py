@@ -0,0 +1,116 @@
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+# Configurações (podem ser sobrescritas pelo .env)
+LIMIAR_SIMILARIDADE = 0.95
+TTL_SEGUNDOS = 3600
+MAX_ITENS = 1000
+
+
+def normalizar_pergunta(pergunta):
+    """Normaliza caixa, acentos, pontuação e espaços para comparar perguntas."""
+    texto = unicodedata.normalize("NFKD", pergunta.casefold())
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    texto = re.sub(r"[^\w\s]", " ", texto)
+    return " ".join(texto.split())
+
+
+class CacheRespostas:
+    """Cache de respostas em memória com busca exata e por similaridade semântica.
+
+    Primeiro procura a pergunta normalizada; depois, a pergunta já respondida
+    cujo embedding tenha similaridade de cosseno >= `limiar`. Entradas expiram
+    após `ttl` segundos e o cache inteiro é descartado quando a versão do
+    índice muda (nova indexação).
+    """
+
+    def __init__(self, limiar=None, ttl=None, max_itens=None, relogio=time.monotonic):
+        self.limiar = limiar or float(
+            os.getenv("CACHE_RESPOSTAS_LIMIAR", LIMIAR_SIMILARIDADE)
+        )
+        self.ttl = ttl or float(os.getenv("CACHE_RESPOSTAS_TTL", TTL_SEGUNDOS))
+        self.max_itens = max_itens or int(
+            os.getenv("CACHE_RESPOSTAS_MAX_ITENS", MAX_ITENS)
+        )
+        self.relogio = relogio
+        self.versao = None
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def buscar(self, pergunta, versao, parametros=(), vetor=None):
+        """Retorna o valor guardado para a pergunta (ou uma quase idêntica) ou None."""
+        chave = (normalizar_pergunta(pergunta), parametros)
+        with self._lock:
+            self._validar(versao)
+
+            entrada = self._entradas.get(chave)
+            if entrada is None and vetor is not None:
+                entrada = self._mais_similar(parametros, vetor)
+            if entrada is None:
+                return None
+
+            self._entradas.move_to_end(entrada["chave"])
+            return entrada["valor"]
+
+    def guardar(self, pergunta, versao, valor, parametros=(), vetor=None):
+        chave = (normalizar_pergunta(pergunta), parametros)
+        if vetor is not None:
+            vetor = np.asarray(vetor, dtype=np.float32)
+            vetor = vetor / (np.linalg.norm(vetor) or 1.0)
+        with self._lock:
+            self._validar(versao)
+            self._entradas[chave] = {
+                "chave": chave,
+                "valor": valor,
+                "vetor": vetor,
+                "expira_em": self.relogio() + self.ttl,
+            }
+            self._entradas.move_to_end(chave)
+            while len(self._entradas) > self.max_itens:
+                self._entradas.popitem(last=False)
+
+    def limpar(self):
+        with self._lock:
+            self._entradas.clear()
+
+    def __len__(self):
+        return len(self._entradas)
+
+    def _validar(self, versao):
+        # nova indexação invalida todas as respostas anteriores
+        if versao != self.versao:
+            self._entradas.clear()
+            self.versao = versao
+            return
+
+        agora = self.relogio()
+        expiradas = [
+            chave
+            for chave, entrada in self._entradas.items()
+            if entrada["expira_em"] <= agora
+        ]
+        for chave in expiradas:
+            del self._entradas[chave]
+
+    def _mais_similar(self, parametros, vetor):
+        candidatas = [
+            entrada
+            for (_, parametros_entrada), entrada in self._entradas.items()
+            if parametros_entrada == parametros and entrada["vetor"] is not None
+        ]
+        if not candidatas:
+            return None
+
+        vetor = np.asarray(vetor, dtype=np.float32)
+        vetor = vetor / (np.linalg.norm(vetor) or 1.0)
+        similaridades = np.stack([entrada["vetor"] for entrada in candidatas]) @ vetor
+        melhor = int(np.argmax(similaridades))
+        if similaridades[melhor] < self.limiar:
+            return None
+        return candidatas[melhor]
@@ -0,0 +1,62 @@
+import json
+import os
+
+import requests
+
+# Configurações (podem ser sobrescritas pelo .env)
+URL_SERVICO = "http://127.0.0.1:8765"
+TEMPO_CONEXAO = 2  # segundos para desistir de um serviço fora do ar
+TEMPO_RESPOSTA = 300
+
+
+class ClienteServico:
+    """Cliente HTTP do servico.py, com uma sessão (conexões reaproveitadas)."""
+
+    def __init__(self, url=None):
+        self.url = (url or os.getenv("SERVICO_URL", URL_SERVICO)).rstrip("/")
+        self.sessao = requests.Session()
+
+    def saude(self):
+        """Estado do serviço, ou None se ele não estiver no ar."""
+        try:
+            resposta = self.sessao.get(f"{self.url}/health", timeout=TEMPO_CONEXAO)
+            resposta.raise_for_status()
+            return resposta.json()
+        except requests.RequestException:
+            return None
+
+    def perguntar(self, pergunta, **parametros):
+        """Resposta completa: dict com resposta, fontes, tempos e etapas."""
+        resposta = self.sessao.post(
+            f"{self.url}/ask",
+            json={"pergunta": pergunta, **parametros},
+            timeout=(TEMPO_CONEXAO, TEMPO_RESPOSTA),
+        )
+        return self._verificar(resposta).json()
+
+    def perguntar_streaming(self, pergunta, **parametros):
+        """Gera os eventos do /ask/stream: tokens e, por último, o de fim."""
+        with self.sessao.post(
+            f"{self.url}/ask/stream",
+            json={"pergunta": pergunta, **parametros},
+            timeout=(TEMPO_CONEXAO, TEMPO_RESPOSTA),
+            stream=True,
+        ) as resposta:
+            self._verificar(resposta)
+            for linha in resposta.iter_lines(decode_unicode=True):
+                if not linha or not linha.startswith("data: "):
+                    continue
+                evento = json.loads(linha[len("data: ") :])
+                if evento["tipo"] == "erro":
+                    raise RuntimeError(evento["erro"])
+                yield evento
+
+    @staticmethod
+    def _verificar(resposta):
+        if resposta.status_code >= 400:
+            try:
+                mensagem = resposta.json()["erro"]
+            except (ValueError, KeyError):
+                mensagem = resposta.text
+            raise RuntimeError(f"Serviço respondeu {resposta.status_code}: {mensagem}")
+        return resposta
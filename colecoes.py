@@ -0,0 +1,116 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from db import (
+    COLECAO_PADRAO,
+    abrir_banco,
+    backend_configurado,
+    caminho_indice,
+    caminhos_colecao,
+    carregar_indice_lexico,
+    contar_vetores,
+    datas_indexacao,
+    fechar_banco,
+    versao_indice,
+)
+
+# Configurações (podem ser sobrescritas pelo .env)
+MEMORIA_MAXIMA_MB = 2048
+
+
+class Colecao:
+    """Banco vetorial e índice BM25 abertos de uma coleção."""
+
+    def __init__(self, nome, caminho_db, embeddings=None):
+        self.nome = nome
+        self.caminho_db = caminho_db
+        # o snapshot publicado agora; o próximo abre uma nova Colecao
+        self.caminho_indice = caminho_indice(caminho_db)
+        self.versao = versao_indice(self.caminho_indice)
+        self.db = abrir_banco(embeddings, caminho_db=self.caminho_indice)
+        self.indice_lexico = carregar_indice_lexico(self.caminho_indice)
+        # para os filtros por data: {fonte: quando foi indexada}
+        self.datas_indexacao = datas_indexacao(self.caminho_indice)
+        self.memoria_bytes = tamanho_pasta(self.caminho_indice)
+        self.aberta_em = time.time()
+
+    def resumo(self):
+        return {
+            "nome": self.nome,
+            "backend": backend_configurado(self.caminho_indice),
+            "documentos": contar_vetores(self.db),
+            "indice_bm25": self.indice_lexico is not None,
+            "memoria_mb": round(self.memoria_bytes / (1024 * 1024), 1),
+        }
+
+
+def tamanho_pasta(caminho):
+    """Bytes dos arquivos do índice: a estimativa de memória da coleção."""
+    total = 0
+    for raiz, _, arquivos in os.walk(caminho):
+        total += sum(os.path.getsize(os.path.join(raiz, nome)) for nome in arquivos)
+    return total
+
+
+class GerenciadorColecoes:
+    """Abre cada coleção na primeira consulta e fecha as menos usadas.
+
+    Quando os índices abertos passam de COLECOES_MEMORIA_MB (medidos pelo
+    tamanho em disco), as coleções usadas há mais tempo são fechadas. Uma
+    coleção é reaberta sozinha quando `python db.py` publica um novo snapshot;
+    consultas em andamento terminam no anterior.
+    """
+
+    def __init__(self, embeddings=None, caminho_padrao=None, memoria_maxima_mb=None):
+        self.embeddings = embeddings
+        self.caminho_padrao = caminho_padrao
+        self.memoria_maxima_mb = memoria_maxima_mb or float(
+            os.getenv("COLECOES_MEMORIA_MB", MEMORIA_MAXIMA_MB)
+        )
+        self._abertas = OrderedDict()  # da usada há mais tempo para a mais recente
+        self._lock = threading.Lock()
+
+    def caminho(self, nome):
+        if nome == COLECAO_PADRAO and self.caminho_padrao:
+            return self.caminho_padrao
+        return caminhos_colecao(nome)[1]
+
+    def obter(self, nome=None):
+        """A coleção aberta (abre ou reabre se preciso). ValueError se não existe."""
+        nome = nome or COLECAO_PADRAO
+        caminho = self.caminho(nome)
+        if not os.path.isdir(caminho):
+            raise ValueError(f"Coleção não encontrada: {nome} (rode python db.py)")
+        versao = versao_indice(caminho)
+        with self._lock:
+            colecao = self._abertas.get(nome)
+            if colecao is None or colecao.versao != versao:
+                anterior = colecao
+                colecao = Colecao(nome, caminho, self.embeddings)
+                # um único cliente de embeddings para todas as coleções
+                self.embeddings = colecao.db.embeddings
+                self._abertas[nome] = colecao
+                if anterior is not None:
+                    fechar_banco(anterior.db)
+            self._abertas.move_to_end(nome)
+            self._liberar()
+            return colecao
+
+    def obter_varias(self, nomes):
+        return [self.obter(nome) for nome in dict.fromkeys(nomes or [None])]
+
+    def abertas(self):
+        with self._lock:
+            return list(self._abertas)
+
+    def memoria_bytes(self):
+        return sum(colecao.memoria_bytes for colecao in self._abertas.values())
+
+    def _liberar(self):
+        # consultas em andamento mantêm suas referências até terminar
+        limite = self.memoria_maxima_mb * 1024 * 1024
+        while len(self._abertas) > 1 and self.memoria_bytes() > limite:
+            _, colecao = self._abertas.popitem(last=False)
+            fechar_banco(colecao.db)
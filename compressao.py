@@ -0,0 +1,384 @@
+import argparse
+import json
+import math
+import os
+import re
+import time
+
+import numpy as np
+
+from latencias import percentis
+
+# Configurações (podem ser sobrescritas pelo .env)
+FATOR_CANDIDATOS = 10  # pré-seleção de k * fator, reordenada em precisão total
+AMOSTRA_TREINO = 20000  # vetores usados para ajustar a PCA e o k-means
+ITERACOES_KMEANS = 12
+CENTROIDES_PQ = 256  # um byte por subespaço
+LINHAS_POR_BLOCO = 65536
+VARIANTES_RELATORIO = ("dim-256", "pca-128", "pq-32")
+PREFIXO_ARQUIVO = "indice_local_"  # indice_local_<variante>.npz
+SEMENTE = 0
+
+
+class Truncamento:
+    """As primeiras `dimensoes` coordenadas de cada vetor, renormalizadas.
+
+    É o que os modelos text-embedding-3 fazem ao pedir menos dimensões, então
+    vale o mesmo que reindexar com vetores menores. Guardado em float16.
+    """
+
+    tipo = "dim"
+    nome = None  # ex.: "dim-256"; definido ao construir ou carregar
+
+    def __init__(self, dimensoes, codigos=None):
+        self.dimensoes = int(dimensoes)
+        self.codigos = codigos
+
+    def ajustar(self, amostra):
+        self.dimensoes = min(self.dimensoes, amostra.shape[1])
+        return self
+
+    def codificar(self, vetores):
+        return _normalizar(vetores[:, : self.dimensoes]).astype(np.float16)
+
+    def similaridades(self, consultas, posicoes=None):
+        codigos = self.codigos if posicoes is None else self.codigos[posicoes]
+        return _produto_em_blocos(self.codificar(consultas), codigos)
+
+    def arrays(self):
+        return {"codigos": self.codigos}
+
+    @classmethod
+    def de_arrays(cls, parametro, arrays):
+        return cls(arrays["codigos"].shape[1], arrays["codigos"])
+
+
+class PCA:
+    """Projeção nas `dimensoes` componentes principais, ajustada na indexação.
+
+    Cada vetor vira z = C(x - média), guardado em float16. Como x ≈ média + Cᵀz,
+    x · q ≈ média · q + z · Cq, e a primeira parcela é a mesma em todas as
+    linhas: a ordem sai só de z · Cq.
+    """
+
+    tipo = "pca"
+    nome = None
+
+    def __init__(self, dimensoes, media=None, componentes=None, codigos=None):
+        self.dimensoes = int(dimensoes)
+        self.media = media
+        self.componentes = componentes
+        self.codigos = codigos
+
+    def ajustar(self, amostra):
+        self.media = amostra.mean(axis=0)
+        _, _, direcoes = np.linalg.svd(amostra - self.media, full_matrices=False)
+        self.componentes = direcoes[: self.dimensoes].astype(np.float32)
+        self.dimensoes = len(self.componentes)
+        return self
+
+    def codificar(self, vetores):
+        return ((vetores - self.media) @ self.componentes.T).astype(np.float16)
+
+    def similaridades(self, consultas, posicoes=None):
+        codigos = self.codigos if posicoes is None else self.codigos[posicoes]
+        return _produto_em_blocos(consultas @ self.componentes.T, codigos)
+
+    def arrays(self):
+        return {
+            "media": self.media,
+            "componentes": self.componentes,
+            "codigos": self.codigos,
+        }
+
+    @classmethod
+    def de_arrays(cls, parametro, arrays):
+        return cls(
+            parametro, arrays["media"], arrays["componentes"], arrays["codigos"]
+        )
+
+
+class QuantizacaoProduto:
+    """Product quantization: `subespacos` partes, cada uma um byte (k-means).
+
+    A similaridade é somada de tabelas pré-calculadas por consulta (ADC):
+    consulta · centroide para cada parte e centroide.
+    """
+
+    tipo = "pq"
+    nome = None
+
+    def __init__(self, subespacos, centroides=None, codigos=None):
+        self.subespacos = int(subespacos)
+        self.centroides = centroides  # (subespaços, centroides, dimensão da parte)
+        self.codigos = codigos  # uint8 (linhas, subespaços)
+
+    def ajustar(self, amostra):
+        rng = np.random.default_rng(SEMENTE)
+        partes = self._partes(amostra)
+        total = min(CENTROIDES_PQ, len(amostra))
+        self.centroides = np.stack(
+            [_kmeans(parte, total, rng) for parte in partes]
+        ).astype(np.float32)
+        return self
+
+    def codificar(self, vetores):
+        codigos = np.empty((len(vetores), self.subespacos), dtype=np.uint8)
+        for j, parte in enumerate(self._partes(vetores)):
+            codigos[:, j] = _mais_proximos(parte, self.centroides[j])
+        return codigos
+
+    def similaridades(self, consultas, posicoes=None):
+        codigos = self.codigos if posicoes is None else self.codigos[posicoes]
+        # (consultas, linhas) somando uma tabela por subespaço
+        similaridades = np.zeros((len(consultas), len(codigos)), dtype=np.float32)
+        for j, parte in enumerate(self._partes(consultas)):
+            tabela = parte @ self.centroides[j].T  # (consultas, centroides)
+            similaridades += tabela[:, codigos[:, j]]
+        return similaridades
+
+    def _partes(self, vetores):
+        tamanho = math.ceil(vetores.shape[1] / self.subespacos)
+        falta = tamanho * self.subespacos - vetores.shape[1]
+        if falta:
+            vetores = np.pad(vetores, ((0, 0), (0, falta)))
+        return [
+            vetores[:, j * tamanho : (j + 1) * tamanho] for j in range(self.subespacos)
+        ]
+
+    def arrays(self):
+        return {"centroides": self.centroides, "codigos": self.codigos}
+
+    @classmethod
+    def de_arrays(cls, parametro, arrays):
+        return cls(parametro, arrays["centroides"], arrays["codigos"])
+
+
+TIPOS = {classe.tipo: classe for classe in (Truncamento, PCA, QuantizacaoProduto)}
+
+
+def ler_variante(nome):
+    """(classe, parâmetro) de "dim-256", "pca-128" ou "pq-32"."""
+    encontrado = re.fullmatch(r"(\w+)-(\d+)", nome or "")
+    if not encontrado or encontrado[1] not in TIPOS or int(encontrado[2]) < 1:
+        raise ValueError(
+            f"Variante inválida: {nome!r} (use dim-<dimensões>, pca-<dimensões> "
+            "ou pq-<subespaços>)"
+        )
+    return TIPOS[encontrado[1]], int(encontrado[2])
+
+
+def construir_variante(nome, indice):
+    """Ajusta a variante `nome` a uma amostra do índice e codifica todas as linhas.
+
+    `indice` é um IndiceLocal; os vetores vêm em precisão total (float32).
+    """
+    classe, parametro = ler_variante(nome)
+    total = len(indice)
+    if not total:
+        raise ValueError("Não há vetores no índice para ajustar a variante")
+    amostra_maxima = int(os.getenv("COMPRESSAO_AMOSTRA_TREINO", AMOSTRA_TREINO))
+    rng = np.random.default_rng(SEMENTE)
+    amostra = np.sort(rng.choice(total, min(total, amostra_maxima), replace=False))
+    variante = classe(parametro).ajustar(indice.vetores(amostra))
+    # em blocos: o índice mapeado em memória não é lido inteiro de uma vez
+    variante.codigos = np.concatenate(
+        [
+            variante.codificar(indice.vetores(np.arange(inicio, fim)))
+            for inicio, fim in _blocos(total)
+        ]
+    )
+    variante.nome = nome
+    return variante
+
+
+def salvar_variante(caminho, variante):
+    arquivo = os.path.join(caminho, f"{PREFIXO_ARQUIVO}{variante.nome}.npz")
+    with open(arquivo + ".tmp", "wb") as saida:
+        np.savez(saida, **variante.arrays())
+    os.replace(arquivo + ".tmp", arquivo)
+
+
+def carregar_variante(caminho, nome):
+    """Lê a variante salva na indexação; os códigos ficam inteiros na memória."""
+    classe, parametro = ler_variante(nome)
+    arquivo = os.path.join(caminho, f"{PREFIXO_ARQUIVO}{nome}.npz")
+    if not os.path.exists(arquivo):
+        raise ValueError(
+            f"Variante {nome} não encontrada em {caminho} "
+            f"(rode python db.py --comprimir {nome})"
+        )
+    with np.load(arquivo) as arrays:
+        variante = classe.de_arrays(parametro, dict(arrays))
+    variante.nome = nome
+    return variante
+
+
+def memoria_bytes(variante):
+    return sum(array.nbytes for array in variante.arrays().values())
+
+
+def fator_candidatos():
+    return int(os.getenv("COMPRESSAO_FATOR_CANDIDATOS", FATOR_CANDIDATOS))
+
+
+def comparar_variantes(indice, consultas, nomes, k=10, fator=None):
+    """Memória, latência e recall@k de cada variante contra a busca exata.
+
+    `consultas` são vetores; a resposta exata é o top-k em precisão total. O
+    recall é medido só com a pré-seleção (k candidatos) e com a reordenação
+    em precisão total (k * fator candidatos). Uma linha por variante, mais a
+    da busca completa.
+    """
+    fator = fator or fator_candidatos()
+    consultas = np.asarray(consultas, dtype=np.float32)
+    indice.usar_variante(None)
+    exatos, latencias = _buscar_uma_a_uma(indice, consultas, k)
+    completo = indice.memoria_vetores()
+    linhas = [
+        {
+            "variante": "completo",
+            "memoria_mb": completo / 2**20,
+            "bytes_por_vetor": completo / max(len(indice), 1),
+            "recall_sem_reordenar": 1.0,
+            "recall_k": 1.0,
+            "latencia": latencias,
+        }
+    ]
+    for nome in nomes:
+        variante = construir_variante(nome, indice)
+        indice.usar_variante(variante, fator=1)
+        aproximados, _ = _buscar_uma_a_uma(indice, consultas, k)
+        indice.usar_variante(variante, fator=fator)
+        reordenados, latencias = _buscar_uma_a_uma(indice, consultas, k)
+        memoria = memoria_bytes(variante)
+        linhas.append(
+            {
+                "variante": nome,
+                "memoria_mb": memoria / 2**20,
+                "bytes_por_vetor": memoria / max(len(indice), 1),
+                "recall_sem_reordenar": _recall(exatos, aproximados),
+                "recall_k": _recall(exatos, reordenados),
+                "latencia": latencias,
+            }
+        )
+    indice.usar_variante(None)
+    return linhas
+
+
+def _buscar_uma_a_uma(indice, consultas, k):
+    ids, latencias = [], []
+    for consulta in consultas:
+        inicio = time.perf_counter()
+        [encontrados] = indice.buscar_por_vetores([consulta], k)
+        latencias.append(time.perf_counter() - inicio)
+        ids.append({doc.id for doc, _ in encontrados})
+    return ids, percentis(latencias)
+
+
+def _recall(exatos, obtidos):
+    pares = [(e, o) for e, o in zip(exatos, obtidos) if e]
+    if not pares:
+        return 1.0
+    return float(np.mean([len(e & o) / len(e) for e, o in pares]))
+
+
+def _blocos(total):
+    for inicio in range(0, total, LINHAS_POR_BLOCO):
+        yield inicio, min(total, inicio + LINHAS_POR_BLOCO)
+
+
+def _normalizar(vetores):
+    normas = np.linalg.norm(vetores, axis=1, keepdims=True)
+    normas[normas == 0] = 1.0
+    return (vetores / normas).astype(np.float32)
+
+
+def _produto_em_blocos(consultas, codigos):
+    """consultas @ codigosᵀ em float32, convertendo os códigos aos poucos."""
+    consultas = np.asarray(consultas, dtype=np.float32)
+    similaridades = np.empty((len(consultas), len(codigos)), dtype=np.float32)
+    for inicio in range(0, len(codigos), LINHAS_POR_BLOCO):
+        bloco = codigos[inicio : inicio + LINHAS_POR_BLOCO].astype(np.float32)
+        similaridades[:, inicio : inicio + len(bloco)] = consultas @ bloco.T
+    return similaridades
+
+
+def _mais_proximos(vetores, centroides):
+    distancias = (
+        -2 * vetores @ centroides.T + (centroides**2).sum(axis=1)[None, :]
+    )
+    return distancias.argmin(axis=1)
+
+
+def _kmeans(vetores, total, rng):
+    iteracoes = int(os.getenv("COMPRESSAO_ITERACOES_KMEANS", ITERACOES_KMEANS))
+    centroides = vetores[rng.choice(len(vetores), total, replace=False)].copy()
+    for _ in range(iteracoes):
+        grupos = _mais_proximos(vetores, centroides)
+        contagens = np.bincount(grupos, minlength=total)
+        somas = np.zeros_like(centroides)
+        np.add.at(somas, grupos, vetores)
+        # grupos vazios mantêm o centroide anterior
+        cheios = contagens > 0
+        centroides[cheios] = somas[cheios] / contagens[cheios, None]
+    return centroides
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compara memória, latência e recall@k das variantes comprimidas."
+    )
+    parser.add_argument(
+        "--variantes",
+        type=lambda texto: [nome.strip() for nome in texto.split(",") if nome.strip()],
+        default=list(VARIANTES_RELATORIO),
+        help="ex.: dim-256,pca-128,pq-32",
+    )
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--fator", type=int, default=None, help="candidatos por k")
+    parser.add_argument(
+        "--consultas",
+        type=int,
+        default=200,
+        help="chunks do índice usados como consulta (sem --perguntas)",
+    )
+    parser.add_argument(
+        "--perguntas",
+        help="JSONL com 'pergunta', vetorizadas com o modelo de embeddings do .env",
+    )
+    parser.add_argument("--saida", help="arquivo JSON com o relatório")
+    args = parser.parse_args()
+    for nome in args.variantes:
+        ler_variante(nome)
+
+    import db
+    from indice_local import IndiceLocal
+
+    indice = db.abrir_banco()
+    if not isinstance(indice, IndiceLocal):
+        parser.error("as variantes usam o índice local (python db.py --backend local)")
+    if args.perguntas:
+        with open(args.perguntas, encoding="utf-8") as arquivo:
+            perguntas = [json.loads(linha)["pergunta"] for linha in arquivo if linha.strip()]
+        consultas = indice.embeddings.embed_documents(perguntas)
+    else:
+        rng = np.random.default_rng(SEMENTE)
+        total = min(len(indice), args.consultas)
+        consultas = indice.vetores(np.sort(rng.choice(len(indice), total, False)))
+
+    linhas = comparar_variantes(indice, consultas, args.variantes, args.k, args.fator)
+    print(f"{len(indice)} vetores, {len(consultas)} consultas, k={args.k}:")
+    for linha in linhas:
+        print(
+            f"  {linha['variante']:>10} | {linha['memoria_mb']:8.2f} MB | "
+            f"{linha['bytes_por_vetor']:7.1f} B/vetor | "
+            f"recall@k {linha['recall_k']:.1%} "
+            f"(sem reordenar {linha['recall_sem_reordenar']:.1%}) | "
+            f"p50 {linha['latencia']['p50_ms']:.2f} ms | "
+            f"p95 {linha['latencia']['p95_ms']:.2f} ms"
+        )
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as arquivo:
+            json.dump(linhas, arquivo, ensure_ascii=False, indent=2)
+        print(f"✅ Relatório salvo em {args.saida}")
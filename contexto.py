@@ -0,0 +1,149 @@
+import functools
+import os
+import re
+
+from langchain_core.documents import Document
+
+# Configurações (podem ser sobrescritas pelo .env)
+MAX_TOKENS_CONTEXTO = 3000
+LIMIAR_DUPLICATA = 0.9  # Jaccard de trigramas de palavras
+TOKENS_POR_TRECHO = 20  # cabeçalho "📄 **Documento i**:" de cada trecho, com folga
+MIN_TOKENS_TRECHO = 100  # trecho cortado menor que isso não entra
+
+
+@functools.lru_cache(maxsize=1)
+def _codificador():
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        # sem o tiktoken (ou sem rede para baixar o vocabulário) usa a estimativa
+        return None
+
+
+def contar_tokens(texto):
+    """Número de tokens do texto (cl100k_base, ou ~4 caracteres por token)."""
+    codificador = _codificador()
+    if codificador is None:
+        return (len(texto) + 3) // 4
+    return len(codificador.encode(texto, disallowed_special=()))
+
+
+def truncar_tokens(texto, max_tokens):
+    """Corta o texto nos primeiros `max_tokens` tokens."""
+    codificador = _codificador()
+    if codificador is None:
+        return texto[: max_tokens * 4]
+    tokens = codificador.encode(texto, disallowed_special=())
+    return codificador.decode(tokens[:max_tokens])
+
+
+def selecionar_trechos(
+    resultados, max_tokens=None, limiar_duplicata=LIMIAR_DUPLICATA
+):
+    """Prepara os resultados da busca para o prompt, sem texto repetido.
+
+    Chunks da mesma fonte e página que se sobrepõem ou se encostam (pelo
+    `start_index`) viram um trecho só; quase duplicatas são descartadas; e os
+    trechos entram em ordem de relevância até `max_tokens`. Retorna pares
+    (documento, score) como os da busca.
+    """
+    if max_tokens is None:
+        max_tokens = int(os.getenv("CONTEXTO_MAX_TOKENS", MAX_TOKENS_CONTEXTO))
+
+    trechos = sorted(unir_sobrepostos(resultados), key=lambda par: -par[1])
+    trechos = remover_duplicatas(trechos, limiar_duplicata)
+    if max_tokens <= 0:
+        return trechos
+
+    selecionados = []
+    usados = 0
+    for doc, score in trechos:
+        # a indexação já guarda os tokens de cada chunk (ver divisao_chunks.py)
+        tokens = doc.metadata.get("tokens") or contar_tokens(doc.page_content)
+        custo = tokens + TOKENS_POR_TRECHO
+        if usados + custo <= max_tokens:
+            selecionados.append((doc, score))
+            usados += custo
+            continue
+        # o primeiro que não cabe entra cortado, se sobrar espaço útil
+        restante = max_tokens - usados - TOKENS_POR_TRECHO
+        if restante >= MIN_TOKENS_TRECHO or not selecionados:
+            texto = truncar_tokens(doc.page_content, max(restante, 0))
+            cortado = Document(page_content=texto, metadata=doc.metadata, id=doc.id)
+            selecionados.append((cortado, score))
+        break
+    return selecionados
+
+
+def unir_sobrepostos(resultados):
+    """Une chunks sobrepostos/adjacentes da mesma fonte e página."""
+    grupos = {}
+    avulsos = []
+    for doc, score in resultados:
+        inicio = doc.metadata.get("start_index")
+        if inicio is None:
+            avulsos.append((doc, score))
+            continue
+        chave = (doc.metadata.get("source"), doc.metadata.get("page"))
+        grupos.setdefault(chave, []).append((inicio, doc, score))
+
+    unidos = []
+    for chunks in grupos.values():
+        chunks.sort(key=lambda item: item[0])
+        inicio, doc, score = chunks[0]
+        texto, fim, ids = doc.page_content, inicio + len(doc.page_content), [doc.id]
+        metadados = doc.metadata
+        for proximo_inicio, proximo, proximo_score in chunks[1:]:
+            proximo_fim = proximo_inicio + len(proximo.page_content)
+            # o splitter remove o espaço entre chunks vizinhos: 1 caractere de folga
+            if proximo_inicio > fim + 1:
+                unidos.append((_trecho(texto, metadados, inicio, ids), score))
+                texto, fim, ids = proximo.page_content, proximo_fim, [proximo.id]
+                inicio, metadados = proximo_inicio, proximo.metadata
+                score = proximo_score
+                continue
+            if proximo_fim > fim:
+                separador = " " if proximo_inicio > fim else ""
+                novo = proximo.page_content[max(fim - proximo_inicio, 0) :]
+                texto += separador + novo
+                fim = proximo_fim
+            ids.append(proximo.id)
+            score = max(score, proximo_score)
+        unidos.append((_trecho(texto, metadados, inicio, ids), score))
+    return unidos + avulsos
+
+
+def _trecho(texto, metadados, inicio, ids):
+    metadados = dict(metadados, start_index=inicio)
+    if len(ids) > 1:
+        metadados.pop("tokens", None)  # contados para um chunk, não para a união
+    id_trecho = ids[0] if len(ids) == 1 else "+".join(str(i) for i in ids)
+    return Document(page_content=texto, metadata=metadados, id=id_trecho)
+
+
+def remover_duplicatas(trechos, limiar=LIMIAR_DUPLICATA):
+    """Descarta trechos quase iguais a um mais relevante (já ordenados por score)."""
+    mantidos = []
+    assinaturas = []
+    for doc, score in trechos:
+        assinatura = trigramas(doc.page_content)
+        if any(jaccard(assinatura, outra) >= limiar for outra in assinaturas):
+            continue
+        mantidos.append((doc, score))
+        assinaturas.append(assinatura)
+    return mantidos
+
+
+def trigramas(texto):
+    palavras = re.findall(r"\w+", texto.casefold())
+    if len(palavras) < 3:
+        return {tuple(palavras)}
+    return set(zip(palavras, palavras[1:], palavras[2:]))
+
+
+def jaccard(a, b):
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
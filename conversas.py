@@ -0,0 +1,265 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+
+# Configurações (podem ser sobrescritas pelo .env)
+CAMINHO_CONVERSAS = ".cache/conversas.sqlite3"
+MAX_TURNOS = 200  # turnos guardados por conversa; os mais antigos são apagados
+TAMANHO_PAGINA = 10
+BACKENDS = ("sqlite", "memoria")
+
+# campos de uma fonte guardados no turno; o texto fica uma vez por chunk
+CAMPOS_FONTE = ("fonte", "pagina", "score", "colecao")
+
+
+def criar_armazem(backend=None, caminho=None, max_turnos=None):
+    """Armazém de conversas do .env (CONVERSAS_BACKEND, padrão sqlite)."""
+    backend = backend or os.getenv("CONVERSAS_BACKEND", "sqlite")
+    if backend == "memoria":
+        return ConversasMemoria(max_turnos)
+    if backend == "sqlite":
+        return ConversasSQLite(caminho, max_turnos)
+    raise ValueError(f"Backend de conversas desconhecido: {backend}")
+
+
+def separar_trechos(fontes):
+    """(referências das fontes, {id do chunk: texto}) de uma lista de fontes."""
+    referencias = []
+    trechos = {}
+    for fonte in fontes:
+        conteudo = fonte.get("conteudo", "")
+        id_trecho = str(
+            fonte.get("id") or hashlib.sha1(conteudo.encode("utf-8")).hexdigest()
+        )
+        trechos.setdefault(id_trecho, conteudo)
+        referencias.append(
+            {"id": id_trecho, **{campo: fonte.get(campo) for campo in CAMPOS_FONTE}}
+        )
+    return referencias, trechos
+
+
+class ConversasSQLite:
+    """Turnos das conversas em SQLite, limitados a `max_turnos` por conversa.
+
+    Cada turno guarda só as referências das fontes (id do chunk, arquivo,
+    página e score); o texto de cada chunk fica uma única vez na tabela
+    `trechos` e só é lido quando a fonte é exibida.
+    """
+
+    def __init__(self, caminho=None, max_turnos=None):
+        self.caminho = caminho or os.getenv("CONVERSAS_CAMINHO", CAMINHO_CONVERSAS)
+        self.max_turnos = max_turnos or int(
+            os.getenv("CONVERSAS_MAX_TURNOS", MAX_TURNOS)
+        )
+        self._lock = threading.Lock()
+
+        pasta = os.path.dirname(self.caminho)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+        self._conexao = sqlite3.connect(self.caminho, check_same_thread=False)
+        self._conexao.execute("PRAGMA journal_mode=WAL")
+        self._conexao.executescript(
+            """CREATE TABLE IF NOT EXISTS turnos (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                conversa TEXT NOT NULL,
+                criado_em REAL NOT NULL,
+                pergunta TEXT NOT NULL,
+                resposta TEXT NOT NULL,
+                fontes TEXT NOT NULL,
+                dados TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_conversa ON turnos (conversa, id);
+            CREATE TABLE IF NOT EXISTS trechos (
+                id TEXT PRIMARY KEY,
+                conteudo TEXT NOT NULL
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS citacoes (
+                trecho TEXT NOT NULL,
+                turno INTEGER NOT NULL,
+                PRIMARY KEY (trecho, turno)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_citacoes_turno ON citacoes (turno);"""
+        )
+        self._conexao.commit()
+
+    def adicionar(self, conversa, pergunta, resposta, fontes=(), **dados):
+        """Grava um turno e apaga os que passaram do limite. Retorna o id."""
+        referencias, trechos = separar_trechos(fontes)
+        with self._lock:
+            self._conexao.executemany(
+                "INSERT OR IGNORE INTO trechos (id, conteudo) VALUES (?, ?)",
+                trechos.items(),
+            )
+            cursor = self._conexao.execute(
+                "INSERT INTO turnos "
+                "(conversa, criado_em, pergunta, resposta, fontes, dados) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    conversa,
+                    dados.pop("timestamp", None) or time.time(),
+                    pergunta,
+                    resposta,
+                    json.dumps(referencias, ensure_ascii=False),
+                    json.dumps(dados, ensure_ascii=False),
+                ),
+            )
+            self._conexao.executemany(
+                "INSERT OR IGNORE INTO citacoes (trecho, turno) VALUES (?, ?)",
+                [(id_trecho, cursor.lastrowid) for id_trecho in trechos],
+            )
+            antigos = self._conexao.execute(
+                "SELECT id FROM turnos WHERE conversa = ? "
+                "ORDER BY id DESC LIMIT -1 OFFSET ?",
+                (conversa, self.max_turnos),
+            ).fetchall()
+            self._apagar_turnos([id_turno for (id_turno,) in antigos])
+            self._conexao.commit()
+        return cursor.lastrowid
+
+    def pagina(self, conversa, numero=0, tamanho=TAMANHO_PAGINA):
+        """Turnos da página `numero`, do mais recente para o mais antigo."""
+        with self._lock:
+            linhas = self._conexao.execute(
+                "SELECT id, criado_em, pergunta, resposta, fontes, dados "
+                "FROM turnos WHERE conversa = ? ORDER BY id DESC LIMIT ? OFFSET ?",
+                (conversa, tamanho, numero * tamanho),
+            ).fetchall()
+        return [
+            {
+                "id": id_turno,
+                "timestamp": criado_em,
+                "pergunta": pergunta,
+                "resposta": resposta,
+                "fontes": json.loads(fontes),
+                **json.loads(dados),
+            }
+            for id_turno, criado_em, pergunta, resposta, fontes, dados in linhas
+        ]
+
+    def trechos(self, ids):
+        """Texto dos chunks citados nas fontes, por id."""
+        ids = list(dict.fromkeys(ids))
+        encontrados = {}
+        with self._lock:
+            for inicio in range(0, len(ids), 500):
+                lote = ids[inicio : inicio + 500]
+                marcadores = ",".join("?" * len(lote))
+                encontrados.update(
+                    self._conexao.execute(
+                        f"SELECT id, conteudo FROM trechos WHERE id IN ({marcadores})",
+                        lote,
+                    ).fetchall()
+                )
+        return encontrados
+
+    def contar(self, conversa):
+        with self._lock:
+            (total,) = self._conexao.execute(
+                "SELECT COUNT(*) FROM turnos WHERE conversa = ?", (conversa,)
+            ).fetchone()
+        return total
+
+    def limpar(self, conversa):
+        with self._lock:
+            turnos = self._conexao.execute(
+                "SELECT id FROM turnos WHERE conversa = ?", (conversa,)
+            ).fetchall()
+            self._apagar_turnos([id_turno for (id_turno,) in turnos])
+            self._conexao.commit()
+
+    def __len__(self):
+        """Quantidade de textos de chunks guardados."""
+        with self._lock:
+            (total,) = self._conexao.execute("SELECT COUNT(*) FROM trechos").fetchone()
+        return total
+
+    def _apagar_turnos(self, ids):
+        # apaga os turnos e o texto dos chunks que nenhum outro turno cita
+        for inicio in range(0, len(ids), 500):
+            lote = ids[inicio : inicio + 500]
+            marcadores = ",".join("?" * len(lote))
+            trechos = self._conexao.execute(
+                f"SELECT DISTINCT trecho FROM citacoes WHERE turno IN ({marcadores})",
+                lote,
+            ).fetchall()
+            self._conexao.execute(
+                f"DELETE FROM citacoes WHERE turno IN ({marcadores})", lote
+            )
+            self._conexao.execute(
+                f"DELETE FROM turnos WHERE id IN ({marcadores})", lote
+            )
+            self._conexao.executemany(
+                "DELETE FROM trechos WHERE id = ? AND NOT EXISTS "
+                "(SELECT 1 FROM citacoes WHERE trecho = ?)",
+                [(id_trecho, id_trecho) for (id_trecho,) in trechos],
+            )
+
+
+class ConversasMemoria:
+    """Mesma interface do ConversasSQLite, na memória do processo."""
+
+    def __init__(self, max_turnos=None):
+        self.max_turnos = max_turnos or int(
+            os.getenv("CONVERSAS_MAX_TURNOS", MAX_TURNOS)
+        )
+        self._conversas = {}
+        self._trechos = {}
+        self._citacoes = Counter()  # turnos que citam cada chunk
+        self._proximo_id = 1
+        self._lock = threading.Lock()
+
+    def adicionar(self, conversa, pergunta, resposta, fontes=(), **dados):
+        referencias, trechos = separar_trechos(fontes)
+        with self._lock:
+            for id_trecho, conteudo in trechos.items():
+                self._trechos.setdefault(id_trecho, conteudo)
+                self._citacoes[id_trecho] += 1
+            id_turno = self._proximo_id
+            self._proximo_id += 1
+            turnos = self._conversas.setdefault(conversa, OrderedDict())
+            turnos[id_turno] = {
+                "id": id_turno,
+                "timestamp": dados.pop("timestamp", None) or time.time(),
+                "pergunta": pergunta,
+                "resposta": resposta,
+                "fontes": referencias,
+                **dados,
+            }
+            while len(turnos) > self.max_turnos:
+                self._esquecer(turnos.popitem(last=False)[1])
+        return id_turno
+
+    def pagina(self, conversa, numero=0, tamanho=TAMANHO_PAGINA):
+        with self._lock:
+            turnos = list(reversed(self._conversas.get(conversa, {}).values()))
+        return turnos[numero * tamanho : (numero + 1) * tamanho]
+
+    def trechos(self, ids):
+        with self._lock:
+            return {
+                id_trecho: self._trechos[id_trecho]
+                for id_trecho in ids
+                if id_trecho in self._trechos
+            }
+
+    def contar(self, conversa):
+        return len(self._conversas.get(conversa, {}))
+
+    def limpar(self, conversa):
+        with self._lock:
+            for turno in self._conversas.pop(conversa, {}).values():
+                self._esquecer(turno)
+
+    def __len__(self):
+        return len(self._trechos)
+
+    def _esquecer(self, turno):
+        for id_trecho in {fonte["id"] for fonte in turno["fontes"]}:
+            self._citacoes[id_trecho] -= 1
+            if self._citacoes[id_trecho] <= 0:
+                del self._citacoes[id_trecho]
+                del self._trechos[id_trecho]
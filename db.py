@@ -1,47 +1,699 @@
-from langchain_community.document_loaders import PyPDFDirectoryLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_chroma.vectorstores import Chroma
-from langchain_openai import OpenAIEmbeddings
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+from collections import deque
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from itertools import islice
+from pathlib import Path
+
 from dotenv import load_dotenv
 
+from cache_embeddings import criar_embeddings
+from cache_paginas import CachePaginas
+from compressao import PREFIXO_ARQUIVO, construir_variante, salvar_variante
+from divisao_chunks import (
+    ESTRATEGIAS,
+    assinatura_estrategia,
+    assinatura_gravada,
+    dividir_documentos,
+)
+from indice_local import ARQUIVO_METADADOS as ARQUIVO_METADADOS_LOCAL
+from indice_local import IndiceLocal
+from indice_lexico import ARQUIVO_VOCABULARIO, IndiceLexico
+
 load_dotenv()
 
 PASTA_BASE = "base"
+CAMINHO_DB = "db"
+PASTA_COLECOES = "colecoes"  # colecoes/<nome>/base (PDFs) e colecoes/<nome>/db
+COLECAO_PADRAO = "padrao"  # a pasta base/ com o índice em db/
+ARQUIVO_MANIFESTO = "manifesto.json"
+PASTA_SNAPSHOTS = "snapshots"  # db/snapshots/<versão>: um índice completo cada
+ARQUIVO_ATUAL = "ATUAL"  # nome do snapshot publicado
+SNAPSHOTS_MANTER = 2  # o publicado e o anterior, ainda usado por consultas
+# o db/ de antes dos snapshots, movido para snapshots/ depois do primeiro: o
+# nome vem antes de qualquer v<time_ns> e ele é apagado como um snapshot antigo
+SNAPSHOT_LEGADO = "v0"
+TAMANHO_LOTE = 100  # chunks por requisição de embedding
+MAX_REQUISICOES = 4  # requisições de embedding simultâneas
+BACKEND_PADRAO = "chroma"
+BACKENDS = ("chroma", "local", "local-int8")
+SEM_VARIANTE = "completo"  # busca só em precisão total, sem variante comprimida
 
 
-def create_db():
-    # carregar documentos
-    documents = load_documents()
-
-    # dividir os documentos em pedaços menores (chunks)
-    chunks = split_documents(documents)
-
-    # vetorização dos pedaços com embeddings
-    vetorizar_chunks(chunks)
+def create_db(incremental=True):
+    # carregar, dividir e vetorizar apenas os documentos novos ou alterados
+    atualizar_db(reconstruir=not incremental)
 
 
 def load_documents():
-    loader = PyPDFDirectoryLoader(PASTA_BASE)
-    documents = loader.load()
+    # páginas já extraídas vêm do cache, sem passar pelo pypdf (cache_paginas.py)
+    documents = []
+    for fonte, hash_ in listar_arquivos().items():
+        documents += carregar_pdf(fonte, hash_)
     return documents
 
 
 def split_documents(documents):
-    docs_separator = RecursiveCharacterTextSplitter(
-        chunk_size=2000,
-        chunk_overlap=500,
-        length_function=len,
-        add_start_index=True,
-    )
-    chunks = docs_separator.split_documents(documents)
+    # estratégia de cada arquivo (tokens, páginas ou seções): ver divisao_chunks.py
+    chunks = dividir_documentos(documents)
     print(len(chunks))
     return chunks
 
 
-def vetorizar_chunks(chunks):
+def caminhos_colecao(nome=None):
+    """(pasta dos PDFs, pasta do índice) da coleção; a padrão usa base/ e db/."""
+    if not nome or nome == COLECAO_PADRAO:
+        return PASTA_BASE, CAMINHO_DB
+    if not re.fullmatch(r"[\w-]+", nome):
+        raise ValueError(f"Nome de coleção inválido: {nome!r}")
+    pasta = os.path.join(os.getenv("COLECOES_PASTA", PASTA_COLECOES), nome)
+    return os.path.join(pasta, "base"), os.path.join(pasta, "db")
+
+
+def listar_colecoes():
+    """Coleções com índice: a padrão (db/) e as de COLECOES_PASTA."""
+    colecoes = [COLECAO_PADRAO] if os.path.exists(CAMINHO_DB) else []
+    pasta = Path(os.getenv("COLECOES_PASTA", PASTA_COLECOES))
+    if pasta.is_dir():
+        colecoes += sorted(
+            caminho.name
+            for caminho in pasta.iterdir()
+            if (caminho / "db").is_dir() and re.fullmatch(r"[\w-]+", caminho.name)
+        )
+    return colecoes
+
+
+def backend_configurado(caminho_db=None):
+    """Backend do banco vetorial: BANCO_VETORIAL no .env ou o da última indexação."""
+    backend = os.getenv("BANCO_VETORIAL")
+    if not backend:
+        manifesto = carregar_manifesto(caminho_db)
+        backend = manifesto.get("backend", BACKEND_PADRAO)
+    if backend not in BACKENDS:
+        raise ValueError(
+            f"Backend desconhecido: {backend} (use {', '.join(BACKENDS)})"
+        )
+    return backend
+
+
+def variante_configurada(caminho_db=None):
+    """Variante comprimida usada na busca: INDICE_VARIANTE no .env ou a primeira
+    gerada com `--comprimir`; None para buscar só em precisão total."""
+    variante = os.getenv("INDICE_VARIANTE")
+    if not variante:
+        variantes = carregar_manifesto(caminho_db).get("variantes") or [None]
+        variante = variantes[0]
+    return None if variante == SEM_VARIANTE else variante
+
+
+def abrir_banco(embeddings=None, backend=None, caminho_db=None, variante=None):
+    """Abre o banco vetorial (Chroma ou índice local em NumPy).
+
+    `variante` escolhe a versão comprimida do índice local (padrão: a de
+    `variante_configurada`; SEM_VARIANTE desliga).
+    """
+    caminho_db = caminho_indice(caminho_db)
+    backend = backend or backend_configurado(caminho_db)
+    embeddings = embeddings or criar_embeddings()
+    if backend == "chroma":
+        # importar o chromadb leva mais de 1s: o índice local não precisa dele
+        from langchain_chroma.vectorstores import Chroma
 
-    db = Chroma.from_documents(chunks, OpenAIEmbeddings(), persist_directory="db")
+        return Chroma(persist_directory=caminho_db, embedding_function=embeddings)
+    variante = variante or variante_configurada(caminho_db)
+    return IndiceLocal(
+        caminho_db,
+        embeddings,
+        quantizado=backend == "local-int8",
+        variante=None if variante == SEM_VARIANTE else variante,
+    )
+
+
+def vetorizar_chunks(chunks, ids=None, backend=None):
+    chunks = list(chunks)
+    db = abrir_banco(backend=backend)
+    vetorizar_em_lotes(db, zip(ids or gerar_ids_chunks(chunks), chunks))
     print("Salvando vetorização no disco...")
+    persistir(db)
+
+
+def atualizar_db(reconstruir=False, max_processos=None, backend=None, variantes=None):
+    """Sincroniza o banco vetorial com a pasta base, vetorizando apenas o que mudou.
+
+    O índice publicado não é alterado: as mudanças vão para uma cópia em
+    snapshots/, publicada no fim com a troca atômica do ponteiro ATUAL. Quem
+    está consultando segue no snapshot anterior até reabrir o banco.
+    `variantes` (ex.: ["pca-128"]) são as versões comprimidas do índice local
+    geradas junto; None mantém as da última indexação. Ver compressao.py.
+    """
+    origem = caminho_indice()
+    manifesto = carregar_manifesto()
+    backend = backend or backend_configurado()
+    alterado = not os.path.exists(os.path.join(origem, ARQUIVO_MANIFESTO))
+    anteriores = manifesto.get("variantes", [])
+    variantes = anteriores if variantes is None else list(variantes)
+    if variantes and backend == "chroma":
+        raise ValueError(
+            "As variantes comprimidas usam o índice local: use --backend local"
+        )
+    alterado = alterado or variantes != anteriores
+
+    # trocar de backend exige vetorizar tudo de novo no backend escolhido
+    backend_anterior = manifesto.get("backend", BACKEND_PADRAO)
+    if manifesto["arquivos"] and backend_anterior != backend:
+        print(f"Backend alterado: {backend_anterior} -> {backend}")
+        reconstruir = True
+    if reconstruir:
+        print("Reconstruindo o banco vetorial do zero...")
+        manifesto = {"arquivos": {}}
+
+    arquivos = listar_arquivos()
+    removidos = sorted(set(manifesto["arquivos"]) - set(arquivos))
+    # arquivos novos, alterados ou que mudaram de estratégia de divisão
+    alterados = [
+        fonte
+        for fonte, hash_atual in arquivos.items()
+        if manifesto["arquivos"].get(fonte, {}).get("hash") != hash_atual
+    ]
+    redivididos = [
+        fonte
+        for fonte in sorted(set(arquivos) - set(alterados))
+        if divisao_indexada(manifesto["arquivos"][fonte])
+        != assinatura_estrategia(fonte)
+    ]
+    if redivididos and not reconstruir:
+        print(
+            f"Aviso: a divisão em chunks mudou (CHUNKS_ESTRATEGIA e afins) para "
+            f"{len(redivididos)} arquivo(s) já indexado(s); eles serão redivididos "
+            "e vetorizados de novo (os chunks repetidos vêm do cache de embeddings)."
+        )
+    alterados += redivididos
+    sem_lexico = not os.path.exists(os.path.join(origem, ARQUIVO_VOCABULARIO))
+    if not (reconstruir or alterado or removidos or alterados or sem_lexico):
+        print("Banco atualizado: 0 chunks vetorizados.")
+        return
+
+    destino = criar_snapshot(CAMINHO_DB, None if reconstruir else origem, backend)
+    try:
+        total_novos = sincronizar_snapshot(
+            destino, manifesto, arquivos, alterados, backend, max_processos, variantes
+        )
+    except BaseException:
+        shutil.rmtree(destino, ignore_errors=True)
+        raise
+    publicar_snapshot(CAMINHO_DB, destino)
+    remover_snapshots_antigos(CAMINHO_DB)
+    print(
+        f"Banco atualizado: {total_novos} chunks vetorizados "
+        f"(snapshot {os.path.basename(destino)})."
+    )
+
+
+def sincronizar_snapshot(
+    destino,
+    manifesto,
+    arquivos,
+    alterados,
+    backend,
+    max_processos=None,
+    variantes=(),
+):
+    """Aplica ao snapshot `destino` as mudanças da pasta base; retorna os novos."""
+    db = abrir_banco(backend=backend, caminho_db=destino, variante=SEM_VARIANTE)
+    # banco criado antes do manifesto: não há como saber quais vetores já existem
+    if not manifesto["arquivos"] and contar_vetores(db) > 0:
+        print("Reconstruindo o banco vetorial do zero...")
+        db = limpar_banco(backend, destino)
+    manifesto["backend"] = backend
+
+    # remover vetores de arquivos que saíram da pasta base
+    for fonte in sorted(set(manifesto["arquivos"]) - set(arquivos)):
+        ids_removidos = list(manifesto["arquivos"].pop(fonte)["chunks"])
+        if ids_removidos:
+            db.delete(ids=ids_removidos)
+        print(f"Removido: {fonte} ({len(ids_removidos)} chunks)")
+
+    def chunks_novos():
+        # um arquivo por vez: só as páginas do PDF atual ficam em memória
+        for fonte, paginas in iterar_paginas(alterados, max_processos, arquivos):
+            anterior = manifesto["arquivos"].get(fonte)
+            chunks = split_documents(paginas)
+            ids = gerar_ids_chunks(chunks)
+            chunks_anteriores = anterior["chunks"] if anterior else {}
+            chunks_atuais = {
+                id_chunk: hash_metadados(chunk) for id_chunk, chunk in zip(ids, chunks)
+            }
+
+            # chunks que sumiram do arquivo alterado
+            obsoletos = [
+                id_chunk
+                for id_chunk in chunks_anteriores
+                if id_chunk not in chunks_atuais
+            ]
+            if obsoletos:
+                db.delete(ids=obsoletos)
+
+            # chunks com o mesmo texto só têm os metadados (start_index) atualizados
+            mantidos = [
+                (id_chunk, chunk)
+                for id_chunk, chunk in zip(ids, chunks)
+                if id_chunk in chunks_anteriores
+                and chunks_anteriores[id_chunk] != chunks_atuais[id_chunk]
+            ]
+            if mantidos:
+                atualizar_metadados(
+                    db,
+                    [id_chunk for id_chunk, _ in mantidos],
+                    [chunk.metadata for _, chunk in mantidos],
+                )
+
+            novos = [
+                (id_chunk, chunk)
+                for id_chunk, chunk in zip(ids, chunks)
+                if id_chunk not in chunks_anteriores
+            ]
+            manifesto["arquivos"][fonte] = {
+                "hash": arquivos[fonte],
+                "divisao": assinatura_estrategia(fonte),
+                "tokens": sum(chunk.metadata["tokens"] for chunk in chunks),
+                "indexado_em": time.time(),  # usado pelos filtros por data
+                "chunks": chunks_atuais,
+            }
+            print(
+                f"Atualizado: {fonte} ({len(novos)} novos, {len(obsoletos)} removidos)"
+            )
+            yield from novos
+
+    total_novos = vetorizar_em_lotes(db, chunks_novos())
+    persistir(db)
+
+    # índice BM25 (com fonte e página de cada chunk) e o manifesto por último
+    ids, textos, metadados = listar_chunks(db)
+    IndiceLexico.construir(zip(ids, textos), metadados).salvar(destino)
+    gerar_variantes(db, destino, variantes)
+    manifesto["variantes"] = list(variantes)
+    salvar_manifesto(manifesto, destino)
+    return total_novos
+
+
+def gerar_variantes(db, destino, variantes):
+    """Grava em `destino` as variantes comprimidas sobre os vetores atuais.
+
+    As copiadas do snapshot anterior são de outras linhas: saem todas.
+    """
+    for nome in os.listdir(destino):
+        if nome.startswith(PREFIXO_ARQUIVO) and nome.endswith(".npz"):
+            os.remove(os.path.join(destino, nome))
+    if not isinstance(db, IndiceLocal) or not len(db):
+        return
+    for nome in variantes:
+        inicio = time.time()
+        salvar_variante(destino, construir_variante(nome, db))
+        print(f"Variante {nome} gerada em {time.time() - inicio:.1f}s")
+
+
+def criar_snapshot(caminho_db, origem=None, backend=None):
+    """Pasta nova em `caminho_db`/snapshots com uma cópia do índice de `origem`."""
+    destino = os.path.join(caminho_db, PASTA_SNAPSHOTS, f"v{time.time_ns()}")
+    if origem is None or not os.path.isdir(origem):
+        os.makedirs(destino)
+        return destino
+    # o índice local só troca arquivos inteiros (os.replace): links bastam;
+    # o Chroma altera os arquivos no lugar e precisa de uma cópia
+    shutil.copytree(
+        origem,
+        destino,
+        ignore=shutil.ignore_patterns(PASTA_SNAPSHOTS, ARQUIVO_ATUAL, "*.tmp"),
+        copy_function=shutil.copy2 if backend == "chroma" else os.link,
+    )
+    return destino
+
+
+def publicar_snapshot(caminho_db, destino):
+    """Aponta ATUAL para o snapshot `destino` com uma única troca atômica."""
+    ponteiro = os.path.join(caminho_db, ARQUIVO_ATUAL)
+    with open(ponteiro + ".tmp", "w", encoding="utf-8") as arquivo:
+        arquivo.write(os.path.basename(destino))
+    os.replace(ponteiro + ".tmp", ponteiro)
+
+
+def caminho_indice(caminho_db=None):
+    """Pasta do snapshot publicado em `caminho_db`.
+
+    Sem o ponteiro ATUAL (índices de antes dos snapshots ou montados à mão), é
+    a própria `caminho_db`.
+    """
+    caminho_db = caminho_db or CAMINHO_DB
+    try:
+        with open(os.path.join(caminho_db, ARQUIVO_ATUAL), encoding="utf-8") as arquivo:
+            nome = arquivo.read().strip()
+    except FileNotFoundError:
+        return caminho_db
+    return os.path.join(caminho_db, PASTA_SNAPSHOTS, nome)
+
+
+def arquivar_indice_legado(caminho_db):
+    """Move o índice da raiz de `caminho_db` para snapshots/SNAPSHOT_LEGADO.
+
+    Índices de antes dos snapshots ficavam na raiz; o primeiro snapshot é uma
+    cópia deles e, depois de publicado, os arquivos da raiz não são mais lidos.
+    Retorna os nomes movidos.
+    """
+    if caminho_indice(caminho_db) == caminho_db:
+        return []  # nenhum snapshot publicado ainda
+    proprios = {PASTA_SNAPSHOTS, ARQUIVO_ATUAL, ARQUIVO_ATUAL + ".tmp"}
+    legados = sorted(set(os.listdir(caminho_db)) - proprios)
+    if not legados:
+        return []
+    destino = os.path.join(caminho_db, PASTA_SNAPSHOTS, SNAPSHOT_LEGADO)
+    os.makedirs(destino, exist_ok=True)
+    for nome in legados:
+        # os arquivos abertos por consultas em andamento continuam válidos
+        os.replace(os.path.join(caminho_db, nome), os.path.join(destino, nome))
+    return legados
+
+
+def remover_snapshots_antigos(caminho_db, manter=None):
+    """Apaga os snapshots anteriores ao publicado, menos os `manter` - 1 últimos.
+
+    Snapshots mais novos que o publicado podem ser uma indexação em andamento e
+    ficam. Um índice de antes dos snapshots, na raiz de `caminho_db`, conta como
+    o mais antigo (ver arquivar_indice_legado). Retorna os nomes apagados.
+    """
+    manter = max(1, manter or int(os.getenv("DB_SNAPSHOTS_MANTER", SNAPSHOTS_MANTER)))
+    arquivar_indice_legado(caminho_db)
+    pasta = os.path.join(caminho_db, PASTA_SNAPSHOTS)
+    atual = os.path.basename(caminho_indice(caminho_db))
+    anteriores = sorted(nome for nome in os.listdir(pasta) if nome < atual)
+    apagados = anteriores[: max(0, len(anteriores) - (manter - 1))]
+    for nome in apagados:
+        # um arquivo ainda aberto (ex.: no Windows) fica para a próxima vez
+        shutil.rmtree(os.path.join(pasta, nome), ignore_errors=True)
+    return apagados
+
+
+def iterar_paginas(fontes, max_processos=None, hashes=None):
+    """Lê os PDFs em um pool de processos e entrega (fonte, páginas) em ordem.
+
+    No máximo 2 arquivos por processo ficam lidos à espera de consumo, então a
+    memória não cresce com o tamanho da pasta base. `hashes` ({fonte: hash},
+    como o de `listar_arquivos`) evita recalcular a chave do cache de páginas.
+    """
+    fontes = list(fontes)
+    hashes = hashes or {}
+    max_processos = max_processos or min(os.cpu_count() or 1, len(fontes) or 1)
+    if max_processos <= 1:
+        for fonte in fontes:
+            yield fonte, carregar_pdf(fonte, hashes.get(fonte))
+        return
+
+    with ProcessPoolExecutor(max_workers=max_processos) as executor:
+        pendentes = deque()
+        restantes = iter(fontes)
+
+        def enviar(fonte):
+            futuro = executor.submit(carregar_pdf, fonte, hashes.get(fonte))
+            pendentes.append((fonte, futuro))
 
+        for fonte in islice(restantes, 2 * max_processos):
+            enviar(fonte)
+        while pendentes:
+            fonte, futuro = pendentes.popleft()
+            paginas = futuro.result()
+            for proxima in islice(restantes, 1):
+                enviar(proxima)
+            yield fonte, paginas
 
-create_db()
+
+def carregar_pdf(fonte, hash_=None):
+    """Páginas do PDF, do cache de páginas ou extraídas com o pypdf."""
+    return CachePaginas().paginas(fonte, hash_)
+
+
+def vetorizar_em_lotes(
+    db, pares, tamanho_lote=TAMANHO_LOTE, max_requisicoes=MAX_REQUISICOES
+):
+    """Vetoriza pares (id, chunk) em lotes fixos e requisições simultâneas limitadas.
+
+    Os lotes são gravados no banco assim que seus embeddings ficam prontos.
+    Retorna o total de chunks vetorizados.
+    """
+    total = 0
+    pendentes = set()
+
+    def gravar(concluidos):
+        gravados = 0
+        for futuro in concluidos:
+            lote, vetores = futuro.result()
+            gravar_vetores(
+                db,
+                [id_chunk for id_chunk, _ in lote],
+                vetores,
+                [chunk.metadata or None for _, chunk in lote],
+                [chunk.page_content for _, chunk in lote],
+            )
+            gravados += len(lote)
+        return gravados
+
+    with ThreadPoolExecutor(max_workers=max_requisicoes) as executor:
+        for lote in agrupar(pares, tamanho_lote):
+            if len(pendentes) >= max_requisicoes:
+                concluidos, pendentes = wait(pendentes, return_when=FIRST_COMPLETED)
+                total += gravar(concluidos)
+            pendentes.add(executor.submit(vetorizar_lote, db.embeddings, lote))
+        total += gravar(wait(pendentes).done)
+    return total
+
+
+def limpar_banco(backend, caminho_db=None):
+    """Abre o banco do backend escolhido vazio, descartando os vetores atuais."""
+    caminho_db = caminho_indice(caminho_db)
+    if backend == "chroma":
+        db = abrir_banco(backend=backend, caminho_db=caminho_db)
+        db.reset_collection()
+        return db
+    # o índice salvo pode ter outra quantização: começa de um índice vazio
+    caminho_metadados = os.path.join(caminho_db, ARQUIVO_METADADOS_LOCAL)
+    if os.path.exists(caminho_metadados):
+        os.remove(caminho_metadados)
+    return abrir_banco(backend=backend, caminho_db=caminho_db)
+
+
+def fechar_banco(db):
+    """Libera o banco para o coletor de lixo (consultas em andamento terminam)."""
+    if isinstance(db, IndiceLocal):
+        return
+    # o chromadb guarda um cliente por pasta enquanto o processo viver
+    from chromadb.api.shared_system_client import SharedSystemClient
+
+    SharedSystemClient._identifier_to_system.pop(db._client._identifier, None)
+
+
+def contar_vetores(db):
+    if isinstance(db, IndiceLocal):
+        return len(db)
+    return db._collection.count()
+
+
+def gravar_vetores(db, ids, vetores, metadados, textos):
+    if isinstance(db, IndiceLocal):
+        db.upsert_vetores(ids, vetores, metadados, textos)
+    else:
+        db._collection.upsert(
+            ids=ids, embeddings=vetores, metadatas=metadados, documents=textos
+        )
+
+
+def atualizar_metadados(db, ids, metadados):
+    if isinstance(db, IndiceLocal):
+        db.atualizar_metadados(ids, metadados)
+    else:
+        db._collection.update(ids=ids, metadatas=metadados)
+
+
+def listar_chunks(db):
+    """(ids, textos, metadados) de todos os chunks do banco, na mesma ordem."""
+    if isinstance(db, IndiceLocal):
+        db._consolidar()
+        return list(db.ids), list(db.textos), list(db.metadados)
+    dados = db.get(include=["documents", "metadatas"])
+    return dados["ids"], dados["documents"], dados["metadatas"]
+
+
+def carregar_indice_lexico(caminho_db=None):
+    """Índice BM25 gerado na última indexação, ou None se ainda não existe."""
+    return IndiceLexico.carregar(caminho_indice(caminho_db))
+
+
+def persistir(db):
+    # o Chroma grava a cada operação; o índice local só quando salvo
+    if isinstance(db, IndiceLocal):
+        db.salvar()
+
+
+def vetorizar_lote(embeddings, lote):
+    textos = [chunk.page_content for _, chunk in lote]
+    return lote, embeddings.embed_documents(textos)
+
+
+def agrupar(itens, tamanho):
+    itens = iter(itens)
+    while lote := list(islice(itens, tamanho)):
+        yield lote
+
+
+def listar_arquivos():
+    """Retorna {caminho: hash do conteúdo} dos PDFs da pasta base.
+
+    PDFs com o mesmo tamanho e data de modificação não são relidos: o hash vem
+    das impressões do cache de páginas.
+    """
+    cache = CachePaginas()
+    arquivos = {}
+    for caminho in sorted(Path(PASTA_BASE).glob("[!.]*.pdf")):
+        fonte = os.path.join(PASTA_BASE, caminho.name)
+        arquivos[fonte] = cache.impressao(fonte)
+    cache.salvar_impressoes()
+    return arquivos
+
+
+def gerar_ids_chunks(chunks):
+    """Gera ids estáveis a partir da fonte, página e texto de cada chunk."""
+    ids = []
+    vistos = {}
+    for chunk in chunks:
+        partes = [
+            str(chunk.metadata.get("source")),
+            str(chunk.metadata.get("page")),
+            chunk.page_content,
+        ]
+        chave = "\x00".join(partes)
+        id_chunk = hashlib.sha256(chave.encode("utf-8")).hexdigest()[:32]
+        # textos repetidos na mesma página recebem um sufixo de ocorrência
+        vistos[id_chunk] = vistos.get(id_chunk, 0) + 1
+        if vistos[id_chunk] > 1:
+            id_chunk = f"{id_chunk}-{vistos[id_chunk] - 1}"
+        ids.append(id_chunk)
+    return ids
+
+
+def hash_metadados(chunk):
+    dados = json.dumps(chunk.metadata, sort_keys=True, default=str)
+    return hashlib.sha256(dados.encode("utf-8")).hexdigest()[:16]
+
+
+def carregar_manifesto(caminho_db=None):
+    caminho = os.path.join(caminho_indice(caminho_db), ARQUIVO_MANIFESTO)
+    if not os.path.exists(caminho):
+        return {"arquivos": {}}
+    with open(caminho, encoding="utf-8") as arquivo:
+        return json.load(arquivo)
+
+
+def divisao_indexada(dados):
+    """Assinatura da divisão de um arquivo do manifesto (ver assinatura_gravada).
+
+    Manifestos de antes das estratégias não a guardam: os chunks deles vieram
+    da divisão por caracteres.
+    """
+    return assinatura_gravada(dados.get("divisao"))
+
+
+def datas_indexacao(caminho_db=None):
+    """{fonte: timestamp da última indexação} dos PDFs no índice publicado.
+
+    Arquivos indexados antes de o manifesto guardar a data ficam com None.
+    """
+    arquivos = carregar_manifesto(caminho_db)["arquivos"]
+    return {fonte: dados.get("indexado_em") for fonte, dados in arquivos.items()}
+
+
+def versao_indice(caminho_db=None):
+    """Retorna um identificador que muda a cada snapshot publicado."""
+    caminho = os.path.join(caminho_indice(caminho_db), ARQUIVO_MANIFESTO)
+    try:
+        return os.stat(caminho).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def salvar_manifesto(manifesto, caminho_db=None):
+    caminho_db = caminho_indice(caminho_db)
+    os.makedirs(caminho_db, exist_ok=True)
+    caminho = os.path.join(caminho_db, ARQUIVO_MANIFESTO)
+    temporario = caminho + ".tmp"
+    with open(temporario, "w", encoding="utf-8") as arquivo:
+        json.dump(manifesto, arquivo, ensure_ascii=False, indent=1)
+    os.replace(temporario, caminho)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Vetoriza os PDFs da pasta base.")
+    parser.add_argument(
+        "--completo",
+        action="store_true",
+        help="descarta o banco atual e vetoriza todos os documentos novamente",
+    )
+    parser.add_argument(
+        "--processos",
+        type=int,
+        default=None,
+        help="processos para ler os PDFs (padrão: número de núcleos)",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=BACKENDS,
+        help="banco vetorial (padrão: BANCO_VETORIAL no .env ou o atual)",
+    )
+    parser.add_argument(
+        "--colecao",
+        action="append",
+        help="coleção a indexar, de colecoes/<nome>/base (pode repetir; "
+        "padrão: a pasta base/)",
+    )
+    parser.add_argument(
+        "--divisao",
+        choices=["auto", *ESTRATEGIAS],
+        help="estratégia de divisão em chunks (auto, tokens, paginas, secoes ou "
+        "caracteres, o padrão); o mesmo que CHUNKS_ESTRATEGIA no .env. Trocar "
+        "redivide e vetoriza de novo os arquivos já indexados",
+    )
+    parser.add_argument(
+        "--comprimir",
+        type=lambda texto: [
+            nome.strip()
+            for nome in texto.split(",")
+            if nome.strip() and nome.strip() != SEM_VARIANTE
+        ],
+        help="variantes comprimidas do índice local, ex.: pca-128,pq-32,dim-256 "
+        f"(a primeira é usada na busca; {SEM_VARIANTE} remove todas)",
+    )
+    args = parser.parse_args()
+    if args.divisao:
+        os.environ["CHUNKS_ESTRATEGIA"] = args.divisao
+    padrao = PASTA_BASE, CAMINHO_DB
+    for colecao in args.colecao or [COLECAO_PADRAO]:
+        # caminhos_colecao parte das pastas da coleção padrão
+        PASTA_BASE, CAMINHO_DB = padrao
+        PASTA_BASE, CAMINHO_DB = caminhos_colecao(colecao)
+        if not os.path.isdir(PASTA_BASE):
+            print(f"Pasta {PASTA_BASE} não encontrada; coleção {colecao} ignorada.")
+            continue
+        if args.colecao:
+            print(f"Coleção {colecao}: {PASTA_BASE} -> {CAMINHO_DB}")
+        atualizar_db(
+            reconstruir=args.completo,
+            max_processos=args.processos,
+            backend=args.backend,
+            variantes=args.comprimir,
+        )
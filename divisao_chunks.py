@@ -0,0 +1,371 @@
+import argparse
+import bisect
+import fnmatch
+import json
+import math
+import os
+import re
+
+import numpy as np
+from langchain_core.documents import Document
+
+from contexto import contar_tokens
+
+# Configurações (podem ser sobrescritas pelo .env)
+# a divisão de antes das estratégias: trocar o padrão redividiria (e vetorizaria
+# de novo) todos os índices existentes; "auto" é opcional (CHUNKS_ESTRATEGIA)
+ESTRATEGIA_PADRAO = "caracteres"
+CARACTERES_CHUNK = 2000
+SOBREPOSICAO_CARACTERES = 500
+TOKENS_CHUNK = 400
+SOBREPOSICAO_TOKENS = 40
+TOKENS_PAGINA = 1000  # página (ou seção) inteira vira um chunk até esse tamanho
+MIN_SECOES = 3  # títulos numerados para o "auto" tratar o documento como FAQ
+PRECO_MILHAO_TOKENS = 0.02  # US$ por 1M de tokens (text-embedding-3-small)
+
+# "2.  PREÇO  DO  PYTHON": número seguido de ao menos duas palavras em maiúsculas
+TITULO = re.compile(r"(?:^|(?<=\s))\d{1,3}\.\s+(?=[A-ZÀ-Ý]+\s+[A-ZÀ-Ý]{2,})")
+PALAVRAS_TITULO = re.compile(r"(?:[^\sa-zà-ÿ]+\s+)+")
+
+
+def dividir_caracteres(paginas):
+    """Divisão antiga, em caracteres: 2000 com 500 de sobreposição por padrão."""
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    separador = RecursiveCharacterTextSplitter(
+        chunk_size=int(os.getenv("CHUNKS_CARACTERES", CARACTERES_CHUNK)),
+        chunk_overlap=int(
+            os.getenv("CHUNKS_SOBREPOSICAO_CARACTERES", SOBREPOSICAO_CARACTERES)
+        ),
+        length_function=len,
+        add_start_index=True,
+    )
+    return separador.split_documents(paginas)
+
+
+def dividir_tokens(paginas):
+    """Chunks de CHUNKS_TOKENS tokens, com CHUNKS_SOBREPOSICAO de sobreposição."""
+    separador = separador_tokens(
+        int(os.getenv("CHUNKS_TOKENS", TOKENS_CHUNK)),
+        int(os.getenv("CHUNKS_SOBREPOSICAO", SOBREPOSICAO_TOKENS)),
+    )
+    chunks = []
+    for pagina in paginas:
+        chunks += _chunks_da_pagina(pagina, separador.split_text(pagina.page_content))
+    return chunks
+
+
+def dividir_paginas(paginas):
+    """Uma página por chunk; páginas grandes em partes iguais, sem sobreposição."""
+    maximo = int(os.getenv("CHUNKS_TOKENS_PAGINA", TOKENS_PAGINA))
+    chunks = []
+    for pagina in paginas:
+        tokens = contar_tokens(pagina.page_content)
+        if tokens <= maximo:
+            textos = [pagina.page_content] if pagina.page_content.strip() else []
+        else:
+            partes = math.ceil(tokens / maximo)
+            separador = separador_tokens(math.ceil(1.1 * tokens / partes), 0)
+            textos = separador.split_text(pagina.page_content)
+        chunks += _chunks_da_pagina(pagina, textos)
+    return chunks
+
+
+def dividir_secoes(paginas):
+    """Um chunk por pergunta/título numerado (ex.: "3.  PODE ME DAR MAIS ...").
+
+    As seções podem atravessar páginas; cada chunk fica com a página onde
+    começa e o título da seção em `secao`. Seções maiores que
+    CHUNKS_TOKENS_PAGINA são divididas por tokens.
+    """
+    texto, inicios_paginas = _juntar_paginas(paginas)
+    maximo = int(os.getenv("CHUNKS_TOKENS_PAGINA", TOKENS_PAGINA))
+    separador = separador_tokens(
+        int(os.getenv("CHUNKS_TOKENS", TOKENS_CHUNK)),
+        int(os.getenv("CHUNKS_SOBREPOSICAO", SOBREPOSICAO_TOKENS)),
+    )
+    chunks = []
+    for inicio, fim, titulo in secoes(texto):
+        secao = texto[inicio:fim]
+        if not secao.strip():
+            continue
+        partes = [secao]
+        if contar_tokens(secao) > maximo:
+            partes = separador.split_text(secao)
+        for posicao, parte in _posicoes(secao, partes):
+            global_ = inicio + posicao
+            indice = bisect.bisect_right(inicios_paginas, global_) - 1
+            metadados = dict(
+                paginas[indice].metadata, start_index=global_ - inicios_paginas[indice]
+            )
+            if titulo:
+                metadados["secao"] = titulo
+            chunks.append(Document(page_content=parte, metadata=metadados))
+    return chunks
+
+
+ESTRATEGIAS = {
+    "caracteres": dividir_caracteres,
+    "tokens": dividir_tokens,
+    "paginas": dividir_paginas,
+    "secoes": dividir_secoes,
+}
+
+# variáveis do .env (e padrões) que cada estratégia lê: só elas entram na
+# assinatura, e mudar as de outra estratégia não redivide o arquivo
+PARAMETROS_ESTRATEGIAS = {
+    "caracteres": (
+        ("CHUNKS_CARACTERES", CARACTERES_CHUNK),
+        ("CHUNKS_SOBREPOSICAO_CARACTERES", SOBREPOSICAO_CARACTERES),
+    ),
+    "tokens": (
+        ("CHUNKS_TOKENS", TOKENS_CHUNK),
+        ("CHUNKS_SOBREPOSICAO", SOBREPOSICAO_TOKENS),
+    ),
+    "paginas": (("CHUNKS_TOKENS_PAGINA", TOKENS_PAGINA),),
+}
+# seções longas são divididas por tokens; o "auto" escolhe secoes ou tokens
+PARAMETROS_ESTRATEGIAS["secoes"] = (
+    PARAMETROS_ESTRATEGIAS["tokens"] + PARAMETROS_ESTRATEGIAS["paginas"]
+)
+PARAMETROS_ESTRATEGIAS["auto"] = PARAMETROS_ESTRATEGIAS["secoes"]
+# as assinaturas antigas levavam estas três, qualquer que fosse a estratégia
+PARAMETROS_ASSINATURA_ANTIGA = (
+    "CHUNKS_TOKENS",
+    "CHUNKS_SOBREPOSICAO",
+    "CHUNKS_TOKENS_PAGINA",
+)
+
+
+def secoes(texto):
+    """Trechos (início, fim, título) entre títulos numerados.
+
+    O texto antes do primeiro título vira um trecho sem título.
+    """
+    inicios = [m.start() for m in TITULO.finditer(texto)]
+    limites = [0, *inicios] if not inicios or inicios[0] > 0 else inicios
+    resultado = []
+    for inicio, fim in zip(limites, [*limites[1:], len(texto)]):
+        titulo = None
+        if inicio in inicios:
+            palavras = PALAVRAS_TITULO.match(texto, inicio)
+            fim_titulo = palavras.end() if palavras else fim
+            titulo = " ".join(texto[inicio:fim_titulo].split())
+            titulo = titulo.split("?")[0] + "?" if "?" in titulo else titulo
+        resultado.append((inicio, fim, titulo))
+    return resultado
+
+
+def estrategia_configurada(fonte):
+    """Nome da estratégia do arquivo: CHUNKS_ESTRATEGIAS ou CHUNKS_ESTRATEGIA.
+
+    CHUNKS_ESTRATEGIAS associa padrões de nome a estratégias, por exemplo
+    "FAQ*.pdf=secoes,manual*.pdf=paginas".
+    """
+    nome = os.path.basename(fonte or "")
+    for regra in os.getenv("CHUNKS_ESTRATEGIAS", "").split(","):
+        padrao, _, estrategia = regra.partition("=")
+        if estrategia and fnmatch.fnmatch(nome, padrao.strip()):
+            return estrategia.strip()
+    return os.getenv("CHUNKS_ESTRATEGIA", ESTRATEGIA_PADRAO)
+
+
+def assinatura_estrategia(fonte, estrategia=None):
+    """Estratégia e tamanhos usados: se mudar, o arquivo precisa ser redividido."""
+    nome = estrategia or estrategia_configurada(fonte)
+    return "/".join(
+        [
+            nome,
+            *(
+                os.getenv(variavel, str(padrao))
+                for variavel, padrao in PARAMETROS_ESTRATEGIAS.get(nome, ())
+            ),
+        ]
+    )
+
+
+def assinatura_gravada(assinatura):
+    """A assinatura guardada num manifesto, no formato de `assinatura_estrategia`.
+
+    Manifestos de antes das estratégias não a guardam: os chunks vieram da
+    divisão por caracteres, com os tamanhos padrão. As assinaturas antigas
+    levavam os parâmetros de tokens e de páginas em todas as estratégias (e a
+    divisão por caracteres usava sempre os padrões); só os que a estratégia lê
+    são mantidos.
+    """
+    nome, *valores = (assinatura or "caracteres").split("/")
+    parametros = PARAMETROS_ESTRATEGIAS.get(nome, ())
+    if assinatura and len(valores) == len(parametros):
+        return assinatura
+    if valores and len(valores) != len(PARAMETROS_ASSINATURA_ANTIGA):
+        return assinatura  # formato desconhecido: o arquivo será redividido
+    antigos = dict(zip(PARAMETROS_ASSINATURA_ANTIGA, valores))
+    return "/".join(
+        [nome, *(antigos.get(variavel, str(padrao)) for variavel, padrao in parametros)]
+    )
+
+
+def resolver_estrategia(nome, paginas):
+    """O "auto" vira "secoes" em documentos com títulos numerados, senão "tokens"."""
+    if nome == "auto":
+        texto, _ = _juntar_paginas(paginas)
+        return "secoes" if len(TITULO.findall(texto)) >= MIN_SECOES else "tokens"
+    if nome not in ESTRATEGIAS:
+        disponiveis = ", ".join(["auto", *ESTRATEGIAS])
+        raise ValueError(f"Estratégia desconhecida: {nome} (use {disponiveis})")
+    return nome
+
+
+def dividir_documentos(documentos, estrategia=None):
+    """Divide as páginas em chunks, com a estratégia de cada arquivo.
+
+    Cada chunk guarda `tokens` (contados como no contexto do prompt) e a
+    `estrategia` usada.
+    """
+    por_fonte = {}
+    for pagina in documentos:
+        por_fonte.setdefault(pagina.metadata.get("source"), []).append(pagina)
+
+    chunks = []
+    for fonte, paginas in por_fonte.items():
+        nome = resolver_estrategia(
+            estrategia or estrategia_configurada(fonte), paginas
+        )
+        for chunk in ESTRATEGIAS[nome](paginas):
+            chunk.metadata["tokens"] = contar_tokens(chunk.page_content)
+            chunk.metadata["estrategia"] = nome
+            chunks.append(chunk)
+    return chunks
+
+
+def separador_tokens(tokens, sobreposicao):
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    return RecursiveCharacterTextSplitter(
+        chunk_size=tokens, chunk_overlap=sobreposicao, length_function=contar_tokens
+    )
+
+
+def _posicoes(texto, partes):
+    # o add_start_index do splitter mede a sobreposição em caracteres, não tokens
+    posicao = -1
+    for parte in partes:
+        encontrada = texto.find(parte, posicao + 1)
+        posicao = encontrada if encontrada >= 0 else texto.find(parte)
+        yield posicao, parte
+
+
+def _chunks_da_pagina(pagina, textos):
+    return [
+        Document(page_content=texto, metadata=dict(pagina.metadata, start_index=inicio))
+        for inicio, texto in _posicoes(pagina.page_content, textos)
+    ]
+
+
+def _juntar_paginas(paginas):
+    inicios = []
+    tamanho = 0
+    for pagina in paginas:
+        inicios.append(tamanho)
+        tamanho += len(pagina.page_content) + 1
+    return "\n".join(pagina.page_content for pagina in paginas), inicios
+
+
+def perguntas_das_secoes(documentos):
+    """Perguntas de avaliação: o título de cada seção e o início da resposta."""
+    perguntas = []
+    por_fonte = {}
+    for pagina in documentos:
+        por_fonte.setdefault(pagina.metadata.get("source"), []).append(pagina)
+    for paginas in por_fonte.values():
+        texto, _ = _juntar_paginas(paginas)
+        for inicio, fim, titulo in secoes(texto):
+            if titulo is None:
+                continue
+            resposta = texto[inicio:fim].split()[len(titulo.split()) :]
+            if len(resposta) >= 8:
+                pergunta = re.sub(r"^\d+\.\s*", "", titulo).capitalize()
+                trecho = " ".join(resposta[:8])
+                perguntas.append({"pergunta": pergunta, "trecho": trecho})
+    return perguntas
+
+
+def comparar_estrategias(documentos, perguntas, embeddings, k=4, estrategias=None):
+    """Chunks, tokens, custo de embedding e acerto@k de cada estratégia.
+
+    Uma pergunta acerta quando algum dos k chunks recuperados contém o seu
+    `trecho` (comparado sem diferenças de espaço).
+    """
+    preco = float(os.getenv("PRECO_EMBEDDING_MILHAO_TOKENS", PRECO_MILHAO_TOKENS))
+    vetores_perguntas = np.asarray(
+        embeddings.embed_documents([p["pergunta"] for p in perguntas]), dtype=np.float32
+    )
+    relatorio = []
+    for nome in estrategias or ESTRATEGIAS:
+        chunks = dividir_documentos(documentos, nome)
+        tokens = [chunk.metadata["tokens"] for chunk in chunks]
+        vetores = np.asarray(
+            embeddings.embed_documents([c.page_content for c in chunks]),
+            dtype=np.float32,
+        )
+        vetores /= np.linalg.norm(vetores, axis=1, keepdims=True) + 1e-12
+        textos = [" ".join(chunk.page_content.split()) for chunk in chunks]
+        acertos = 0
+        for pergunta, vetor in zip(perguntas, vetores_perguntas):
+            melhores = np.argsort(-(vetores @ vetor), kind="stable")[:k]
+            trecho = " ".join(pergunta["trecho"].split())
+            acertos += any(trecho in textos[i] for i in melhores)
+        relatorio.append(
+            {
+                "estrategia": nome,
+                "chunks": len(chunks),
+                "tokens": int(sum(tokens)),
+                "tokens_por_chunk": float(np.mean(tokens)) if tokens else 0.0,
+                "custo_embedding_usd": sum(tokens) / 1_000_000 * preco,
+                "acerto_k": acertos / len(perguntas) if perguntas else 0.0,
+            }
+        )
+    return relatorio
+
+
+if __name__ == "__main__":
+    import db
+    from modelos_locais import EmbeddingsLocais
+
+    parser = argparse.ArgumentParser(
+        description="Compara as estratégias de divisão em chunks sobre a pasta base."
+    )
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument(
+        "--perguntas",
+        help="JSONL com 'pergunta' e 'trecho' esperado (padrão: títulos do FAQ)",
+    )
+    parser.add_argument(
+        "--embeddings-reais",
+        action="store_true",
+        help="usa o modelo de embeddings do .env em vez dos embeddings locais",
+    )
+    parser.add_argument("--saida", help="arquivo JSON do relatório")
+    args = parser.parse_args()
+
+    documentos = db.load_documents()
+    if args.perguntas:
+        with open(args.perguntas, encoding="utf-8") as arquivo:
+            perguntas = [json.loads(linha) for linha in arquivo if linha.strip()]
+    else:
+        perguntas = perguntas_das_secoes(documentos)
+    embeddings = db.criar_embeddings() if args.embeddings_reais else EmbeddingsLocais()
+
+    relatorio = comparar_estrategias(documentos, perguntas, embeddings, args.k)
+    print(f"{len(perguntas)} perguntas, acerto@{args.k}:")
+    for linha in relatorio:
+        print(
+            f"  {linha['estrategia']:>10}: {linha['chunks']:5d} chunks | "
+            f"{linha['tokens']:7d} tokens ({linha['tokens_por_chunk']:.0f}/chunk) | "
+            f"US$ {linha['custo_embedding_usd']:.5f} | "
+            f"acerto {linha['acerto_k']:.0%}"
+        )
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as arquivo:
+            json.dump(relatorio, arquivo, ensure_ascii=False, indent=2)
+        print(f"✅ Relatório salvo em {args.saida}")
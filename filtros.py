@@ -0,0 +1,273 @@
+import os
+import warnings
+from datetime import datetime
+
+import numpy as np
+
+SEM_PAGINA = -1  # linhas sem o metadado `page`
+
+
+class FiltroBusca:
+    """Restringe a busca a alguns PDFs, a um intervalo de páginas e de datas.
+
+    `fontes` aceita o caminho ou só o nome do PDF. As páginas seguem o
+    metadado `page` (do PyPDFLoader, a partir de 0), com os dois limites
+    incluídos. As datas (timestamps) são as da última indexação de cada
+    arquivo, guardadas no manifesto: `resolver` troca nomes e datas pelos
+    caminhos das fontes do índice antes da consulta.
+    """
+
+    def __init__(
+        self,
+        fontes=None,
+        pagina_inicial=None,
+        pagina_final=None,
+        indexado_desde=None,
+        indexado_ate=None,
+    ):
+        self.fontes = None if fontes is None else tuple(sorted(set(fontes)))
+        self.pagina_inicial = pagina_inicial
+        self.pagina_final = pagina_final
+        self.indexado_desde = indexado_desde
+        self.indexado_ate = indexado_ate
+
+    def __bool__(self):
+        return any(valor is not None for valor in self.chave())
+
+    def __repr__(self):
+        return f"FiltroBusca{self.chave()}"
+
+    def chave(self):
+        """Tupla que identifica o filtro (entra na chave do cache de respostas)."""
+        return (
+            self.fontes,
+            self.pagina_inicial,
+            self.pagina_final,
+            self.indexado_desde,
+            self.indexado_ate,
+        )
+
+    @property
+    def por_pagina(self):
+        return self.pagina_inicial is not None or self.pagina_final is not None
+
+    @property
+    def por_data(self):
+        return self.indexado_desde is not None or self.indexado_ate is not None
+
+    @property
+    def nenhuma_fonte(self):
+        """Nenhum arquivo passa pelo filtro: a busca nem precisa ser feita."""
+        return self.fontes == ()
+
+    def resolver(self, datas_indexacao):
+        """O filtro com os caminhos das fontes do índice que passam nele.
+
+        `datas_indexacao` é {fonte: timestamp da indexação ou None}, como o de
+        `db.datas_indexacao`. Sem ele (índices sem manifesto), só os nomes são
+        comparados, na hora da busca. Arquivos sem data nunca passam num filtro
+        por data, e num índice sem manifesto nenhum tem data: o filtro por data
+        não deixa passar nada, com um aviso.
+        """
+        if self.por_data and not datas_indexacao:
+            warnings.warn(
+                "Índice sem datas de indexação (sem manifesto): nenhum arquivo "
+                "passa no filtro por data; reindexe com python db.py",
+                stacklevel=2,
+            )
+            return FiltroBusca((), self.pagina_inicial, self.pagina_final)
+        if (self.fontes is None and not self.por_data) or not datas_indexacao:
+            return self
+        fontes = [
+            fonte
+            for fonte, indexado_em in datas_indexacao.items()
+            if self._na_janela(indexado_em)
+        ]
+        if self.fontes is not None:
+            fontes = casar_fontes(self.fontes, fontes)
+        return FiltroBusca(fontes, self.pagina_inicial, self.pagina_final)
+
+    def com_fontes_do_indice(self, fontes):
+        """O filtro com os nomes trocados pelas `fontes` gravadas que casam com eles.
+
+        Para índices sem manifesto, em que `resolver` não tem a lista de fontes:
+        o `where` do Chroma só compara `source` por igualdade, e "a.pdf"
+        precisa virar "base/a.pdf".
+        """
+        if self.fontes is None:
+            return self
+        return FiltroBusca(
+            casar_fontes(self.fontes, fontes),
+            self.pagina_inicial,
+            self.pagina_final,
+            self.indexado_desde,
+            self.indexado_ate,
+        )
+
+    def _na_janela(self, indexado_em):
+        if not self.por_data:
+            return True
+        if indexado_em is None:
+            return False  # indexado antes de o manifesto guardar a data
+        if self.indexado_desde is not None and indexado_em < self.indexado_desde:
+            return False
+        return self.indexado_ate is None or indexado_em <= self.indexado_ate
+
+    def where_chroma(self):
+        """Cláusula `where` do Chroma, que filtra pelo índice de metadados dele."""
+        condicoes = []
+        if self.fontes is not None:
+            condicoes.append({"source": {"$in": list(self.fontes)}})
+        if self.pagina_inicial is not None:
+            condicoes.append({"page": {"$gte": self.pagina_inicial}})
+        if self.pagina_final is not None:
+            condicoes.append({"page": {"$lte": self.pagina_final}})
+        if len(condicoes) > 1:
+            return {"$and": condicoes}
+        return condicoes[0] if condicoes else None
+
+    def como_dict(self):
+        """Campos do filtro para o JSON do servico.py (só os preenchidos)."""
+        campos = dict(
+            zip(
+                (
+                    "fontes",
+                    "pagina_inicial",
+                    "pagina_final",
+                    "indexado_desde",
+                    "indexado_ate",
+                ),
+                self.chave(),
+            )
+        )
+        return {nome: valor for nome, valor in campos.items() if valor is not None}
+
+    @classmethod
+    def de_dict(cls, dados):
+        """Lê o filtro do JSON de uma requisição; None se não há filtro."""
+        if not dados:
+            return None
+        fontes = dados.get("fontes")
+        if isinstance(fontes, str):
+            fontes = [fonte.strip() for fonte in fontes.split(",") if fonte.strip()]
+        filtro = cls(
+            fontes,
+            _inteiro(dados.get("pagina_inicial")),
+            _inteiro(dados.get("pagina_final")),
+            ler_data(dados.get("indexado_desde")),
+            ler_data(dados.get("indexado_ate")),
+        )
+        return filtro or None
+
+
+def casar_fontes(nomes, fontes):
+    """As `fontes` iguais a um dos `nomes` ou com o mesmo nome de arquivo."""
+    nomes = set(nomes)
+    return [
+        fonte
+        for fonte in fontes
+        if fonte in nomes or os.path.basename(fonte) in nomes
+    ]
+
+
+def ler_paginas(texto):
+    """(inicial, final) de "3-10", "3-", "-10" ou "3"; o limite omitido é None."""
+    inicial, separador, final = texto.partition("-")
+    inicial = int(inicial) if inicial.strip() else None
+    if not separador:
+        return inicial, inicial
+    return inicial, int(final) if final.strip() else None
+
+
+def _inteiro(valor):
+    return None if valor is None else int(valor)
+
+
+def ler_data(valor):
+    """Timestamp de uma data ISO ("2025-03-01", "2025-03-01T12:00") ou número."""
+    if valor is None or isinstance(valor, (int, float)):
+        return valor
+    try:
+        return float(valor)
+    except ValueError:
+        return datetime.fromisoformat(valor).timestamp()
+
+
+class IndiceMetadados:
+    """Posições das linhas de um índice por fonte e por página, pré-calculadas.
+
+    As linhas de cada fonte e a ordem das páginas ficam em arrays ordenados,
+    então um filtro vira fatias por busca binária e a busca filtrada custa
+    proporcional ao subconjunto, não ao índice inteiro.
+    """
+
+    def __init__(self, nomes, codigos, paginas):
+        self.nomes = list(nomes)  # fontes distintas
+        self.codigos = np.asarray(codigos, dtype=np.int32)  # fonte de cada linha
+        self.paginas = np.asarray(paginas, dtype=np.int32)
+        self._ordem_fontes = np.argsort(self.codigos, kind="stable")
+        self._limites_fontes = np.searchsorted(
+            self.codigos[self._ordem_fontes], np.arange(len(self.nomes) + 1)
+        )
+        self._ordem_paginas = np.argsort(self.paginas, kind="stable")
+        self._paginas_ordenadas = self.paginas[self._ordem_paginas]
+        self._codigo = {nome: i for i, nome in enumerate(self.nomes)}
+
+    def __len__(self):
+        return len(self.codigos)
+
+    @classmethod
+    def construir(cls, metadados):
+        """Cria o índice a partir dos metadados de cada linha, na ordem do índice."""
+        codigo = {}
+        codigos = []
+        paginas = []
+        for meta in metadados:
+            meta = meta or {}
+            codigos.append(codigo.setdefault(str(meta.get("source")), len(codigo)))
+            pagina = meta.get("page")
+            paginas.append(SEM_PAGINA if pagina is None else int(pagina))
+        return cls(list(codigo), codigos, paginas)
+
+    def posicoes(self, filtro):
+        """Posições (crescentes) que passam no filtro, ou None se ele não restringe.
+
+        O filtro deve ter passado por `FiltroBusca.resolver`; as datas não são
+        vistas aqui.
+        """
+        if filtro is None or (filtro.fontes is None and not filtro.por_pagina):
+            return None
+        if filtro.fontes is None:
+            return np.sort(self._ordem_paginas[self._fatia_paginas(filtro)])
+
+        partes = [self._linhas_da_fonte(codigo) for codigo in self._codigos(filtro)]
+        posicoes = np.sort(np.concatenate(partes)) if partes else np.empty(0, int)
+        if filtro.por_pagina:
+            paginas = self.paginas[posicoes]
+            inicial = filtro.pagina_inicial
+            final = filtro.pagina_final
+            dentro = paginas != SEM_PAGINA
+            if inicial is not None:
+                dentro &= paginas >= inicial
+            if final is not None:
+                dentro &= paginas <= final
+            posicoes = posicoes[dentro]
+        return posicoes
+
+    def _codigos(self, filtro):
+        # só o nome do arquivo casa com todas as pastas que têm esse PDF
+        return sorted(
+            self._codigo[fonte] for fonte in casar_fontes(filtro.fontes, self.nomes)
+        )
+
+    def _linhas_da_fonte(self, codigo):
+        inicio, fim = self._limites_fontes[codigo], self._limites_fontes[codigo + 1]
+        return self._ordem_fontes[inicio:fim]
+
+    def _fatia_paginas(self, filtro):
+        inicial = max(filtro.pagina_inicial or 0, 0)
+        inicio = np.searchsorted(self._paginas_ordenadas, inicial, side="left")
+        if filtro.pagina_final is None:
+            return slice(inicio, len(self._paginas_ordenadas))
+        fim = np.searchsorted(self._paginas_ordenadas, filtro.pagina_final, "right")
+        return slice(inicio, fim)
@@ -0,0 +1,229 @@
+import json
+import math
+import os
+import re
+import unicodedata
+from collections import Counter
+
+import numpy as np
+
+from filtros import IndiceMetadados
+
+ARQUIVO_POSTINGS = "indice_lexico.npz"
+ARQUIVO_VOCABULARIO = "indice_lexico.json"
+K1 = 1.2
+B = 0.75
+TAMANHO_MAXIMO_TERMO = 64
+
+# palavras frequentes demais para ajudar a encontrar um trecho
+PALAVRAS_VAZIAS = set(
+    """a ao aos as com como da das de do dos e em entre eu isso na nas no nos o
+    os ou para pela pelo por qual quais que se sem ser sua seu tem um uma uns
+    umas""".split()
+)
+
+
+def tokenizar(texto):
+    """Termos do texto: minúsculas, sem acentos e sem palavras vazias.
+
+    Nomes com ponto ou sublinhado (`os.path.join`, `__init__`) viram o termo
+    inteiro e também cada parte, para casar tanto o nome exato quanto as partes.
+    """
+    texto = unicodedata.normalize("NFKD", texto.casefold())
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    termos = []
+    for palavra in re.findall(r"\w+(?:\.\w+)*", texto):
+        partes = [p for p in re.split(r"[._]+", palavra) if p]
+        if partes != [palavra]:
+            termos.append(palavra)
+        termos.extend(p for p in partes if p not in PALAVRAS_VAZIAS)
+    return [termo[:TAMANHO_MAXIMO_TERMO] for termo in termos]
+
+
+class IndiceLexico:
+    """Índice invertido BM25 com postings compactos em arrays NumPy.
+
+    Para cada termo, os documentos (int32) e frequências (uint16) ficam em
+    fatias contíguas de dois arrays, localizadas por `inicios`; os
+    comprimentos dos documentos são pré-calculados. `metadados` (fonte e
+    página de cada documento) permite buscas filtradas; ver filtros.py.
+    """
+
+    def __init__(
+        self,
+        ids,
+        vocabulario,
+        inicios,
+        documentos,
+        frequencias,
+        comprimentos,
+        metadados=None,
+    ):
+        self.ids = ids
+        self.vocabulario = vocabulario
+        self.inicios = inicios
+        self.documentos = documentos
+        self.frequencias = frequencias
+        self.comprimentos = comprimentos
+        self.metadados = metadados
+        media = float(comprimentos.mean()) if len(comprimentos) else 1.0
+        # parte do denominador do BM25 que só depende do documento
+        self.normalizacao = K1 * (1 - B + B * comprimentos / (media or 1.0))
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def construir(cls, pares, metadados=None):
+        """Cria o índice a partir de pares (id, texto) e dos metadados de cada um."""
+        ids = []
+        comprimentos = []
+        postings = {}
+        for posicao, (id_documento, texto) in enumerate(pares):
+            termos = tokenizar(texto)
+            ids.append(id_documento)
+            comprimentos.append(len(termos))
+            for termo, frequencia in Counter(termos).items():
+                postings.setdefault(termo, []).append((posicao, frequencia))
+
+        termos = sorted(postings)
+        inicios = np.zeros(len(termos) + 1, dtype=np.int64)
+        inicios[1:] = np.cumsum([len(postings[termo]) for termo in termos])
+        documentos = np.empty(inicios[-1], dtype=np.int32)
+        frequencias = np.empty(inicios[-1], dtype=np.uint16)
+        for i, termo in enumerate(termos):
+            lista = np.asarray(postings[termo])
+            documentos[inicios[i] : inicios[i + 1]] = lista[:, 0]
+            frequencias[inicios[i] : inicios[i + 1]] = np.minimum(lista[:, 1], 65535)
+
+        return cls(
+            ids,
+            {termo: i for i, termo in enumerate(termos)},
+            inicios,
+            documentos,
+            frequencias,
+            np.asarray(comprimentos, dtype=np.int32),
+            None if metadados is None else IndiceMetadados.construir(metadados),
+        )
+
+    def salvar(self, caminho):
+        os.makedirs(caminho, exist_ok=True)
+        arquivo_postings = os.path.join(caminho, ARQUIVO_POSTINGS)
+        arrays = {}
+        dados = {"ids": self.ids}
+        if self.metadados is not None:
+            arrays = {
+                "codigos_fonte": self.metadados.codigos,
+                "paginas": self.metadados.paginas,
+            }
+            dados["fontes"] = self.metadados.nomes
+        with open(arquivo_postings + ".tmp", "wb") as arquivo:
+            np.savez(
+                arquivo,
+                inicios=self.inicios,
+                documentos=self.documentos,
+                frequencias=self.frequencias,
+                comprimentos=self.comprimentos,
+                **arrays,
+            )
+        arquivo_vocabulario = os.path.join(caminho, ARQUIVO_VOCABULARIO)
+        with open(arquivo_vocabulario + ".tmp", "w", encoding="utf-8") as arquivo:
+            dados["termos"] = sorted(self.vocabulario, key=self.vocabulario.get)
+            json.dump(dados, arquivo, ensure_ascii=False)
+        os.replace(arquivo_postings + ".tmp", arquivo_postings)
+        os.replace(arquivo_vocabulario + ".tmp", arquivo_vocabulario)
+
+    @classmethod
+    def carregar(cls, caminho):
+        """Lê o índice salvo em `caminho`, ou None se ainda não foi construído."""
+        arquivo_vocabulario = os.path.join(caminho, ARQUIVO_VOCABULARIO)
+        if not os.path.exists(arquivo_vocabulario):
+            return None
+        with open(arquivo_vocabulario, encoding="utf-8") as arquivo:
+            dados = json.load(arquivo)
+        with np.load(os.path.join(caminho, ARQUIVO_POSTINGS)) as arrays:
+            metadados = None
+            # índices de antes dos filtros não têm fonte e página
+            if "fontes" in dados:
+                metadados = IndiceMetadados(
+                    dados["fontes"], arrays["codigos_fonte"], arrays["paginas"]
+                )
+            return cls(
+                dados["ids"],
+                {termo: i for i, termo in enumerate(dados["termos"])},
+                arrays["inicios"],
+                arrays["documentos"],
+                arrays["frequencias"],
+                arrays["comprimentos"],
+                metadados,
+            )
+
+    def buscar(self, consulta, k=4, filtro=None):
+        """Retorna [(id, score BM25)] dos k documentos com maior score.
+
+        Com `filtro` (já resolvido, ver filtros.py), só os documentos que passam
+        nele são pontuados; sem os metadados no índice, não há resultados.
+        """
+        total = len(self.ids)
+        posicoes = None
+        if filtro:
+            if self.metadados is None:
+                return []
+            posicoes = self.metadados.posicoes(filtro)
+        # filtrado, o buffer de scores tem só as posições que passam no filtro
+        scores = np.zeros(total if posicoes is None else len(posicoes), np.float32)
+        for termo in set(tokenizar(consulta)):
+            indice = self.vocabulario.get(termo)
+            if indice is None:
+                continue
+            inicio, fim = self.inicios[indice], self.inicios[indice + 1]
+            documentos = self.documentos[inicio:fim]
+            frequencias = self.frequencias[inicio:fim].astype(np.float32)
+            # o idf continua sendo o da coleção inteira
+            com_termo = fim - inicio
+            idf = math.log(1 + (total - com_termo + 0.5) / (com_termo + 0.5))
+            alvos = documentos
+            if posicoes is not None:
+                alvos, dentro = _intersecao(posicoes, documentos)
+                documentos, frequencias = documentos[dentro], frequencias[dentro]
+            # cada documento aparece uma vez por termo: soma direta é segura
+            scores[alvos] += (
+                idf
+                * frequencias
+                * (K1 + 1)
+                / (frequencias + self.normalizacao[documentos])
+            )
+
+        candidatos = np.flatnonzero(scores)
+        k = min(k, len(candidatos))
+        if k == 0:
+            return []
+        melhores = candidatos[np.argpartition(-scores[candidatos], k - 1)[:k]]
+        melhores = melhores[np.argsort(-scores[melhores], kind="stable")]
+        linhas = melhores if posicoes is None else posicoes[melhores]
+        return [(self.ids[i], float(s)) for i, s in zip(linhas, scores[melhores])]
+
+
+def _intersecao(posicoes, documentos):
+    """Índices em `posicoes` e em `documentos` (ambos crescentes) dos comuns.
+
+    A busca binária é feita com a lista menor dentro da maior.
+    """
+    if len(documentos) <= len(posicoes):
+        locais = np.searchsorted(posicoes, documentos)
+        dentro = locais < len(posicoes)
+        dentro[dentro] = posicoes[locais[dentro]] == documentos[dentro]
+        return locais[dentro], np.flatnonzero(dentro)
+    nas_postings = np.searchsorted(documentos, posicoes)
+    dentro = nas_postings < len(documentos)
+    dentro[dentro] = documentos[nas_postings[dentro]] == posicoes[dentro]
+    return np.flatnonzero(dentro), nas_postings[dentro]
+
+
+def fundir_rrf(listas, k_rrf=60):
+    """Reciprocal-rank fusion: {id: soma de 1/(k_rrf + posição)} das listas de ids."""
+    scores = {}
+    for lista in listas:
+        for posicao, id_documento in enumerate(lista, start=1):
+            scores[id_documento] = scores.get(id_documento, 0.0) + 1 / (k_rrf + posicao)
+    return scores
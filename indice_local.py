@@ -0,0 +1,382 @@
+import json
+import math
+import os
+import uuid
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+from compressao import carregar_variante, fator_candidatos
+from filtros import IndiceMetadados
+
+ARQUIVO_METADADOS = "indice_local.json"
+ARQUIVO_VETORES = "indice_local.npy"
+ARQUIVO_ESCALAS = "indice_local_escalas.npy"
+LINHAS_POR_BLOCO = 65536  # linhas multiplicadas de uma vez na busca
+
+
+class IndiceLocal(VectorStore):
+    """Banco vetorial em processo: matriz NumPy mapeada em memória + JSON.
+
+    Os vetores são normalizados e a busca é um produto escalar vetorizado. Com
+    `quantizado`, cada vetor é guardado em int8 com uma escala por linha
+    (cerca de 4x menos memória que float32). Os scores seguem os do Chroma
+    (distância L2 ao quadrado), então limites de relevância continuam valendo.
+    Alterações ficam em memória até `salvar()`.
+
+    Com uma `variante` comprimida (ver compressao.py), só os códigos dela ficam
+    na memória: eles pré-selecionam k * COMPRESSAO_FATOR_CANDIDATOS linhas, e
+    só essas são lidas da matriz em disco e reordenadas em precisão total.
+    """
+
+    def __init__(self, caminho, embeddings, quantizado=None, variante=None):
+        self.caminho = caminho
+        self._embeddings = embeddings
+        self.ids, self.textos, self.metadados = [], [], []
+        self.dimensao = None
+        self._matriz = None
+        self._escalas = None
+        self._novos = []
+        self._removidas = set()
+        self._posicoes = {}
+        self._indice_metadados = None
+        self.variante = None
+        self.fator_candidatos = None
+
+        metadados_salvos = self._carregar()
+        if quantizado is None:
+            quantizado = metadados_salvos.get("quantizado", False)
+        if metadados_salvos and quantizado != metadados_salvos.get("quantizado"):
+            raise ValueError(
+                f"O índice salvo em {caminho} usa outra quantização; reconstrua-o"
+            )
+        self.quantizado = quantizado
+        if variante and self.ids:
+            self.usar_variante(carregar_variante(caminho, variante))
+
+    @property
+    def embeddings(self):
+        return self._embeddings
+
+    def __len__(self):
+        return len(self._posicoes)
+
+    # Persistência
+
+    def _carregar(self):
+        caminho_metadados = os.path.join(self.caminho, ARQUIVO_METADADOS)
+        if not os.path.exists(caminho_metadados):
+            return {}
+        with open(caminho_metadados, encoding="utf-8") as arquivo:
+            dados = json.load(arquivo)
+
+        self.ids = dados["ids"]
+        self.textos = dados["textos"]
+        self.metadados = dados["metadados"]
+        self.dimensao = dados["dimensao"]
+        self._posicoes = {id_vetor: i for i, id_vetor in enumerate(self.ids)}
+        self._indice_metadados = None
+        if self.ids:
+            self._matriz = np.load(
+                os.path.join(self.caminho, ARQUIVO_VETORES), mmap_mode="r"
+            )
+            if dados["quantizado"]:
+                self._escalas = np.load(os.path.join(self.caminho, ARQUIVO_ESCALAS))
+            if len(self._matriz) != len(self.ids):
+                raise ValueError(f"Índice em {self.caminho} está inconsistente")
+        return dados
+
+    def salvar(self):
+        """Grava matriz e metadados no disco, cada arquivo trocado atomicamente."""
+        self._consolidar()
+        os.makedirs(self.caminho, exist_ok=True)
+        if self._matriz is not None:
+            self._gravar_array(ARQUIVO_VETORES, self._matriz)
+        if self._escalas is not None:
+            self._gravar_array(ARQUIVO_ESCALAS, self._escalas)
+
+        dados = {
+            "dimensao": self.dimensao,
+            "quantizado": self.quantizado,
+            "ids": self.ids,
+            "textos": self.textos,
+            "metadados": self.metadados,
+        }
+        caminho = os.path.join(self.caminho, ARQUIVO_METADADOS)
+        with open(caminho + ".tmp", "w", encoding="utf-8") as arquivo:
+            json.dump(dados, arquivo, ensure_ascii=False)
+        os.replace(caminho + ".tmp", caminho)
+
+        # volta a ler do disco: a matriz em memória é liberada
+        self._carregar()
+
+    def _gravar_array(self, nome, array):
+        caminho = os.path.join(self.caminho, nome)
+        with open(caminho + ".tmp", "wb") as arquivo:
+            np.save(arquivo, array)
+        os.replace(caminho + ".tmp", caminho)
+
+    # Escrita
+
+    def upsert_vetores(self, ids, vetores, metadados=None, textos=None):
+        """Insere ou substitui vetores já calculados."""
+        vetores = np.asarray(vetores, dtype=np.float32)
+        if self.dimensao is None:
+            self.dimensao = vetores.shape[1]
+        elif vetores.shape[1] != self.dimensao:
+            raise ValueError(
+                f"Dimensão {vetores.shape[1]} diferente da do índice "
+                f"({self.dimensao})"
+            )
+        metadados = metadados or [None] * len(ids)
+        textos = textos or [""] * len(ids)
+
+        self.delete(ids=[id_vetor for id_vetor in ids if id_vetor in self._posicoes])
+        for id_vetor, texto, meta in zip(ids, textos, metadados):
+            self._posicoes[id_vetor] = len(self.ids)
+            self.ids.append(id_vetor)
+            self.textos.append(texto)
+            self.metadados.append(meta or {})
+        self._novos.append(self._codificar(normalizar(vetores)))
+
+    def atualizar_metadados(self, ids, metadados):
+        for id_vetor, meta in zip(ids, metadados):
+            self.metadados[self._posicoes[id_vetor]] = meta or {}
+        self._indice_metadados = None
+
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        texts = list(texts)
+        ids = list(ids) if ids else [uuid.uuid4().hex for _ in texts]
+        vetores = self._embeddings.embed_documents(texts)
+        self.upsert_vetores(ids, vetores, metadatas, texts)
+        return ids
+
+    def delete(self, ids=None, **kwargs):
+        for id_vetor in ids or []:
+            posicao = self._posicoes.pop(id_vetor, None)
+            if posicao is not None:
+                self._removidas.add(posicao)
+
+    def reset_collection(self):
+        self.ids, self.textos, self.metadados = [], [], []
+        self.dimensao = None
+        self._matriz = self._escalas = None
+        self._novos = []
+        self._removidas = set()
+        self._posicoes = {}
+        self._indice_metadados = None
+
+    def _codificar(self, vetores):
+        if not self.quantizado:
+            return vetores, None
+        escalas = np.abs(vetores).max(axis=1) / 127
+        escalas[escalas == 0] = 1.0
+        quantizados = np.round(vetores / escalas[:, None]).astype(np.int8)
+        return quantizados, escalas.astype(np.float32)
+
+    def _consolidar(self):
+        """Junta os vetores novos à matriz e descarta as linhas removidas."""
+        if not self._novos and not self._removidas:
+            return
+        blocos = [] if self._matriz is None else [(self._matriz, self._escalas)]
+        blocos += self._novos
+        matriz = np.concatenate([bloco for bloco, _ in blocos])
+        escalas = None
+        if self.quantizado:
+            escalas = np.concatenate([escala for _, escala in blocos])
+
+        if self._removidas:
+            manter = np.ones(len(self.ids), dtype=bool)
+            manter[list(self._removidas)] = False
+            matriz = matriz[manter]
+            escalas = escalas[manter] if escalas is not None else None
+            self.ids = [i for i, m in zip(self.ids, manter) if m]
+            self.textos = [t for t, m in zip(self.textos, manter) if m]
+            self.metadados = [d for d, m in zip(self.metadados, manter) if m]
+            self._posicoes = {id_vetor: i for i, id_vetor in enumerate(self.ids)}
+
+        self._matriz, self._escalas = (matriz, escalas) if len(matriz) else (None, None)
+        self._novos = []
+        self._removidas = set()
+        self._indice_metadados = None
+        # os códigos da variante são das linhas antigas; o db.py a reconstrói
+        self.variante = None
+
+    # Busca
+
+    def usar_variante(self, variante, fator=None):
+        """Passa a buscar com a `variante` comprimida (None: só precisão total)."""
+        if variante is not None and len(variante.codigos) != len(self.ids):
+            raise ValueError(
+                f"Variante {variante.nome} em {self.caminho} está inconsistente"
+            )
+        self.variante = variante
+        self.fator_candidatos = fator
+
+    def vetores(self, posicoes=None):
+        """Vetores unitários em float32 (desquantizados no int8) das `posicoes`."""
+        self._consolidar()
+        matriz = self._matriz if posicoes is None else self._matriz[posicoes]
+        vetores = np.asarray(matriz, dtype=np.float32)
+        if self._escalas is not None:
+            escalas = self._escalas if posicoes is None else self._escalas[posicoes]
+            vetores = vetores * escalas[:, None]
+        return vetores
+
+    def memoria_vetores(self):
+        """Bytes da matriz em precisão total (mais as escalas do int8)."""
+        self._consolidar()
+        if self._matriz is None:
+            return 0
+        escalas = 0 if self._escalas is None else self._escalas.nbytes
+        return self._matriz.nbytes + escalas
+
+    def similaridades(self, vetor):
+        """Similaridade de cosseno entre `vetor` e todas as linhas do índice."""
+        return self.similaridades_lote([vetor])[0]
+
+    def similaridades_lote(self, vetores, posicoes=None):
+        """Similaridades de várias consultas de uma vez: (consultas, linhas).
+
+        Com `posicoes`, só essas linhas são lidas e comparadas, nessa ordem.
+        """
+        self._consolidar()
+        consultas = normalizar(np.asarray(vetores, dtype=np.float32))
+        if self._matriz is None:
+            return np.zeros((len(consultas), 0), dtype=np.float32)
+        total = len(self._matriz) if posicoes is None else len(posicoes)
+        similaridades = np.empty((len(consultas), total), dtype=np.float32)
+        # em blocos: o int8 (ou o mmap) não é convertido inteiro de uma vez
+        for inicio in range(0, total, LINHAS_POR_BLOCO):
+            if posicoes is None:
+                bloco = self._matriz[inicio : inicio + LINHAS_POR_BLOCO]
+            else:
+                bloco = self._matriz[posicoes[inicio : inicio + LINHAS_POR_BLOCO]]
+            similaridades[:, inicio : inicio + len(bloco)] = consultas @ bloco.T
+        if self._escalas is not None:
+            escalas = self._escalas if posicoes is None else self._escalas[posicoes]
+            similaridades *= escalas
+        return similaridades
+
+    def indice_metadados(self):
+        """Linhas por fonte e página, montado na primeira busca com filtro."""
+        self._consolidar()
+        if self._indice_metadados is None:
+            self._indice_metadados = IndiceMetadados.construir(self.metadados)
+        return self._indice_metadados
+
+    def buscar_por_vetores(self, vetores, k=4, filtro=None):
+        """(documento, distância) dos k mais próximos de cada vetor, de uma vez.
+
+        Um produto de matrizes para todas as consultas e um top-k por linha.
+        Com `filtro` (ver filtros.py), só as linhas que passam nele são lidas.
+        """
+        posicoes = self.indice_metadados().posicoes(filtro) if filtro else None
+        if self.variante is not None:
+            posicoes, similaridades = self._pre_selecionar(vetores, k, posicoes)
+        else:
+            similaridades = self.similaridades_lote(vetores, posicoes)
+        k = min(k, similaridades.shape[1])
+        if k <= 0:
+            return [[] for _ in range(len(vetores))]
+        melhores = np.argpartition(-similaridades, k - 1, axis=1)[:, :k]
+        ordem = np.argsort(
+            -np.take_along_axis(similaridades, melhores, axis=1), axis=1, kind="stable"
+        )
+        melhores = np.take_along_axis(melhores, ordem, axis=1)
+        # distância L2 ao quadrado entre vetores unitários
+        distancias = np.maximum(
+            0.0, 2 - 2 * np.take_along_axis(similaridades, melhores, axis=1)
+        )
+        if posicoes is not None:
+            melhores = posicoes[melhores]
+        return [
+            [
+                (
+                    Document(
+                        id=self.ids[i],
+                        page_content=self.textos[i],
+                        metadata=self.metadados[i],
+                    ),
+                    float(distancia),
+                )
+                for i, distancia in zip(linha, distancias_linha)
+            ]
+            for linha, distancias_linha in zip(melhores, distancias)
+        ]
+
+    def _pre_selecionar(self, vetores, k, posicoes=None):
+        """(linhas, similaridades) dos candidatos da variante, em precisão total.
+
+        Cada consulta recebe os k * fator melhores pela variante; as colunas
+        dos candidatos das outras consultas ficam com -inf.
+        """
+        consultas = normalizar(np.asarray(vetores, dtype=np.float32))
+        aproximadas = self.variante.similaridades(consultas, posicoes)
+        fator = self.fator_candidatos or fator_candidatos()
+        candidatos = min(k * fator, aproximadas.shape[1])
+        if candidatos <= 0:
+            return posicoes, np.zeros((len(consultas), 0), dtype=np.float32)
+        melhores = np.argpartition(-aproximadas, candidatos - 1, axis=1)
+        melhores = melhores[:, :candidatos]
+        if posicoes is not None:
+            melhores = posicoes[melhores]
+        linhas = np.unique(melhores)
+        exatas = self.similaridades_lote(vetores, linhas)
+        colunas = np.searchsorted(linhas, melhores)
+        similaridades = np.full_like(exatas, -np.inf)
+        np.put_along_axis(
+            similaridades, colunas, np.take_along_axis(exatas, colunas, axis=1), axis=1
+        )
+        return linhas, similaridades
+
+    def similarity_search_by_vector_with_relevance_scores(
+        self, embedding, k=4, **kwargs
+    ):
+        """(documento, distância) dos k vetores mais próximos, como no Chroma."""
+        return self.buscar_por_vetores([embedding], k)[0]
+
+    def get_by_ids(self, ids):
+        return [
+            Document(
+                id=id_vetor,
+                page_content=self.textos[self._posicoes[id_vetor]],
+                metadata=self.metadados[self._posicoes[id_vetor]],
+            )
+            for id_vetor in ids
+            if id_vetor in self._posicoes
+        ]
+
+    def similarity_search_with_score(self, query, k=4, **kwargs):
+        vetor = self._embeddings.embed_query(query)
+        return self.similarity_search_by_vector_with_relevance_scores(vetor, k)
+
+    def similarity_search_by_vector(self, embedding, k=4, **kwargs):
+        return [
+            doc
+            for doc, _ in self.similarity_search_by_vector_with_relevance_scores(
+                embedding, k
+            )
+        ]
+
+    def similarity_search(self, query, k=4, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k)]
+
+    def _select_relevance_score_fn(self):
+        return lambda distancia: 1.0 - distancia / math.sqrt(2)
+
+    @classmethod
+    def from_texts(
+        cls, texts, embedding, metadatas=None, ids=None, caminho="db", **kwargs
+    ):
+        indice = cls(caminho, embedding, **kwargs)
+        indice.add_texts(texts, metadatas, ids)
+        indice.salvar()
+        return indice
+
+
+def normalizar(vetores):
+    normas = np.linalg.norm(vetores, axis=1, keepdims=True)
+    normas[normas == 0] = 1.0
+    return (vetores / normas).astype(np.float32)
@@ -0,0 +1,15 @@
+import numpy as np
+
+
+def percentis(latencias):
+    """Resumo de latências em milissegundos (p50, p95, p99, média)."""
+    if not latencias:
+        return {"p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0, "media_ms": 0.0}
+    valores = np.asarray(latencias) * 1000
+    p50, p95, p99 = np.percentile(valores, [50, 95, 99])
+    return {
+        "p50_ms": float(p50),
+        "p95_ms": float(p95),
+        "p99_ms": float(p99),
+        "media_ms": float(valores.mean()),
+    }
@@ -0,0 +1,269 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+
+from dotenv import load_dotenv
+
+from cache_embeddings import criar_embeddings
+from db import abrir_banco
+from rag import buscar_varias, criar_chain, montar_contexto
+from roteador_llm import eh_limite_de_taxa
+
+load_dotenv()
+
+CAMINHO_DB = "db"
+CONCORRENCIA = 8
+TAMANHO_LOTE_BUSCA = 32  # perguntas vetorizadas e buscadas juntas
+MAX_TENTATIVAS = 5
+RESPOSTA_SEM_CONTEXTO = (
+    "Não encontrei informações relevantes para sua pergunta "
+    "nos documentos disponíveis."
+)
+
+
+class LimiteTaxa:
+    """Limita as chamadas a um provedor a `por_minuto` requisições (balde de fichas).
+
+    Com `por_minuto` vazio ou zero não há limite.
+    """
+
+    def __init__(self, por_minuto=None, relogio=time.monotonic):
+        self.por_segundo = (por_minuto or 0) / 60
+        self.capacidade = max(1.0, self.por_segundo)
+        self.fichas = self.capacidade
+        self.relogio = relogio
+        self.ultima_reposicao = relogio()
+        self._lock = asyncio.Lock()
+
+    async def aguardar(self):
+        if not self.por_segundo:
+            return
+        async with self._lock:
+            while True:
+                agora = self.relogio()
+                self.fichas = min(
+                    self.capacidade,
+                    self.fichas + (agora - self.ultima_reposicao) * self.por_segundo,
+                )
+                self.ultima_reposicao = agora
+                if self.fichas >= 1:
+                    self.fichas -= 1
+                    return
+                await asyncio.sleep((1 - self.fichas) / self.por_segundo)
+
+
+async def com_tentativas(chamada, limite, max_tentativas=MAX_TENTATIVAS, espera=1.0):
+    """Executa `chamada()` respeitando o limite de taxa e repetindo em caso de 429."""
+    for tentativa in range(max_tentativas):
+        await limite.aguardar()
+        try:
+            return await chamada()
+        except Exception as erro:
+            if not eh_limite_de_taxa(erro) or tentativa == max_tentativas - 1:
+                raise
+            # espera exponencial com variação aleatória entre as tarefas
+            await asyncio.sleep(espera * 2**tentativa * (1 + random.random()))
+
+
+def ler_perguntas(caminho):
+    """Lê perguntas de um JSONL.
+
+    Cada linha precisa de um texto em `pergunta` ou `question`; no formato do
+    requests.jsonl usa-se `title` e `body`. O id vem de `id`, `request_id` ou
+    do número da linha.
+    """
+    with open(caminho, encoding="utf-8") as arquivo:
+        for numero, linha in enumerate(arquivo, start=1):
+            if not linha.strip():
+                continue
+            dados = json.loads(linha)
+            pergunta = dados.get("pergunta") or dados.get("question")
+            if not pergunta:
+                partes = [dados.get("title"), dados.get("body")]
+                pergunta = "\n\n".join(parte for parte in partes if parte)
+            id_pergunta = dados.get("id") or dados.get("request_id") or str(numero)
+            yield {"id": str(id_pergunta), "pergunta": pergunta}
+
+
+def ids_respondidos(caminho):
+    """Ids que já têm resposta sem erro no arquivo de saída (para retomar o lote)."""
+    if not os.path.exists(caminho):
+        return set()
+    respondidos = set()
+    with open(caminho, encoding="utf-8") as arquivo:
+        for linha in arquivo:
+            try:
+                registro = json.loads(linha)
+            except json.JSONDecodeError:
+                # última linha incompleta de uma execução interrompida
+                continue
+            if "erro" not in registro:
+                respondidos.add(registro["id"])
+    return respondidos
+
+
+class BuscaEmLote:
+    """Contexto de um grupo de perguntas, com um embedding e uma busca só.
+
+    A busca é feita quando a primeira pergunta do grupo pede o seu resultado;
+    as demais aguardam a mesma tarefa.
+    """
+
+    def __init__(self, perguntas, db, k_docs, limite):
+        self.perguntas = perguntas
+        self.db = db
+        self.k_docs = k_docs
+        self.limite = limite
+        self._tarefa = None
+
+    async def resultados(self, posicao):
+        if self._tarefa is None:
+            self._tarefa = asyncio.ensure_future(
+                com_tentativas(
+                    lambda: asyncio.to_thread(
+                        buscar_varias, self.perguntas, self.db, self.k_docs
+                    ),
+                    self.limite,
+                )
+            )
+        return (await self._tarefa)[posicao]
+
+
+async def responder(item, busca, posicao, chain, limites, semaforo):
+    async with semaforo:
+        inicio = time.perf_counter()
+        registro = {"id": item["id"], "pergunta": item["pergunta"]}
+        try:
+            resultados = await busca.resultados(posicao)
+            tempo_busca = time.perf_counter() - inicio
+
+            contexto, fontes = montar_contexto(resultados)
+            if resultados:
+                resposta = await com_tentativas(
+                    lambda: chain.ainvoke(
+                        {"pergunta": item["pergunta"], "base_conhecimento": contexto}
+                    ),
+                    limites["chat"],
+                )
+                resposta = resposta.content
+            else:
+                resposta = RESPOSTA_SEM_CONTEXTO
+
+            registro["resposta"] = resposta
+            registro["fontes"] = fontes
+            registro["latencia"] = {
+                "busca": tempo_busca,
+                "geracao": time.perf_counter() - inicio - tempo_busca,
+                "total": time.perf_counter() - inicio,
+            }
+        except Exception as erro:
+            registro["erro"] = f"{type(erro).__name__}: {erro}"
+            registro["latencia"] = {"total": time.perf_counter() - inicio}
+        return registro
+
+
+async def processar_lote(
+    entrada,
+    saida,
+    db,
+    chain,
+    concorrencia=CONCORRENCIA,
+    k_docs=4,
+    rpm_embeddings=None,
+    rpm_chat=None,
+    tamanho_lote_busca=TAMANHO_LOTE_BUSCA,
+):
+    """Responde as perguntas de `entrada`, gravando cada resposta em `saida`.
+
+    Perguntas já respondidas em `saida` são puladas, então uma execução
+    interrompida pode ser retomada rodando o mesmo comando. O contexto é
+    buscado em grupos de `tamanho_lote_busca` perguntas (ver `BuscaEmLote`).
+    Retorna (respondidas, com erro).
+    """
+    respondidos = ids_respondidos(saida)
+    pendentes = [
+        item for item in ler_perguntas(entrada) if item["id"] not in respondidos
+    ]
+    if respondidos:
+        print(
+            f"Retomando: {len(respondidos)} já respondidas, "
+            f"{len(pendentes)} pendentes"
+        )
+
+    semaforo = asyncio.Semaphore(concorrencia)
+    limites = {"embeddings": LimiteTaxa(rpm_embeddings), "chat": LimiteTaxa(rpm_chat)}
+    tarefas = []
+    for inicio in range(0, len(pendentes), tamanho_lote_busca):
+        grupo = pendentes[inicio : inicio + tamanho_lote_busca]
+        busca = BuscaEmLote(
+            [item["pergunta"] for item in grupo], db, k_docs, limites["embeddings"]
+        )
+        tarefas += [
+            asyncio.create_task(
+                responder(item, busca, posicao, chain, limites, semaforo)
+            )
+            for posicao, item in enumerate(grupo)
+        ]
+
+    respondidas = erros = 0
+    # não colar a primeira resposta nova numa linha cortada pela interrupção
+    if os.path.exists(saida) and os.path.getsize(saida) > 0:
+        with open(saida, "rb+") as arquivo:
+            arquivo.seek(-1, os.SEEK_END)
+            if arquivo.read(1) != b"\n":
+                arquivo.write(b"\n")
+
+    with open(saida, "a", encoding="utf-8") as arquivo:
+        for tarefa in asyncio.as_completed(tarefas):
+            registro = await tarefa
+            arquivo.write(json.dumps(registro, ensure_ascii=False) + "\n")
+            arquivo.flush()
+            if "erro" in registro:
+                erros += 1
+            else:
+                respondidas += 1
+            print(f"[{respondidas + erros}/{len(tarefas)}] {registro['id']}")
+    return respondidas, erros
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Responde em lote as perguntas de um arquivo JSONL."
+    )
+    parser.add_argument("entrada", help="JSONL com as perguntas")
+    parser.add_argument("saida", help="JSONL onde as respostas são gravadas")
+    parser.add_argument("--concorrencia", type=int, default=CONCORRENCIA)
+    parser.add_argument("--k", type=int, default=4, help="documentos por pergunta")
+    parser.add_argument("--temperatura", type=float, default=0.1)
+    parser.add_argument(
+        "--rpm-embeddings", type=int, help="limite de requisições/minuto (OpenAI)"
+    )
+    parser.add_argument(
+        "--rpm-chat", type=int, help="limite de requisições/minuto (Groq)"
+    )
+    parser.add_argument(
+        "--lote-busca",
+        type=int,
+        default=TAMANHO_LOTE_BUSCA,
+        help="perguntas vetorizadas e buscadas em uma requisição",
+    )
+    args = parser.parse_args()
+
+    db = abrir_banco(criar_embeddings(), caminho_db=CAMINHO_DB)
+    respondidas, erros = asyncio.run(
+        processar_lote(
+            args.entrada,
+            args.saida,
+            db,
+            criar_chain(args.temperatura),
+            concorrencia=args.concorrencia,
+            k_docs=args.k,
+            rpm_embeddings=args.rpm_embeddings,
+            rpm_chat=args.rpm_chat,
+            tamanho_lote_busca=args.lote_busca,
+        )
+    )
+    print(f"Concluído: {respondidas} respondidas, {erros} com erro.")
@@ -1,52 +1,284 @@
-from langchain_chroma.vectorstores import Chroma 
-from langchain_openai import OpenAIEmbeddings 
+import argparse
+import os
+import time
 from dotenv import load_dotenv 
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
+from cliente_servico import ClienteServico
+from contexto import selecionar_trechos
+from filtros import FiltroBusca, ler_data, ler_paginas
+from prompts import TEMPLATES, template_prompt
+from rag import (
+    BUSCAS,
+    buscar_contexto,
+    buscar_em_colecoes,
+    buscar_hibrido,
+    buscar_reranqueado,
+)
+from reranqueamento import carregar_reranqueador
 load_dotenv()
 
 CAMINHO_DB = "db"
+K_DOCS = 3  # trechos enviados ao prompt (BUSCA_K no .env)
+RELEVANCIA_MINIMA = 0.7  # abaixo disso não há resposta (BUSCA_RELEVANCIA_MINIMA)
 
-prompt_template = """ 
-Você é um assistente inteligente que ajuda os usuários com suas perguntas com base em documentos fornecidos:
-{pergunta}
+def perguntar(
+    streaming=True,
+    busca="vetorial",
+    usar_servico=True,
+    reranquear=False,
+    colecoes=None,
+    filtro=None,
+):
+    pergunta = input("Digite sua pergunta: ")
+    inicio = time.time()
+    # valores escolhidos com python avaliacao.py
+    k_docs = int(os.getenv("BUSCA_K", K_DOCS))
+    relevancia_minima = float(os.getenv("BUSCA_RELEVANCIA_MINIMA", RELEVANCIA_MINIMA))
 
-Utilize as informações do documentos para responder à pergunta acima. Forneça respostas detalhadas e precisas:
+    # com o servico.py no ar, banco e modelos já estão carregados
+    cliente = ClienteServico() if usar_servico else None
+    if cliente is not None and cliente.saude() is not None:
+        perguntar_ao_servico(
+            cliente, pergunta, inicio, streaming, busca, reranquear, colecoes, filtro
+        )
+        return
 
-{base_conhecimento}
+    # só agora: os bancos vetoriais importam o langchain inteiro (~0.7s)
+    from cache_embeddings import criar_embeddings
+    from colecoes import GerenciadorColecoes
+    from db import abrir_banco, carregar_indice_lexico, datas_indexacao
 
-"""
+    # carregar o banco de dados vetorizado
+    func_embedding = criar_embeddings()
 
-def perguntar():
-    pergunta = input("Digite sua pergunta: ")
+    reranqueador = carregar_reranqueador() if reranquear else None
+    if reranquear and reranqueador is None:
+        print("RERANQUEADOR_MODELO não configurado; seguindo sem reranqueamento.")
 
-    # carregar o banco de dados vetorizado
-    func_embedding = OpenAIEmbeddings()
+    if colecoes:
+        # cada coleção em colecoes/<nome>/db; os k melhores de todas vão ao prompt
+        gerenciador = GerenciadorColecoes(func_embedding, caminho_padrao=CAMINHO_DB)
+        resultados = buscar_em_colecoes(
+            pergunta,
+            gerenciador.obter_varias(colecoes),
+            k_docs=k_docs,
+            busca=busca,
+            relevancia_minima=relevancia_minima,
+            reranqueador=reranqueador,
+            filtro=filtro,
+        )
+        perguntar_ao_modelo(pergunta, resultados, inicio, streaming)
+        return
+
+    db = abrir_banco(func_embedding, caminho_db=CAMINHO_DB)
+    # nomes de arquivo e datas viram os caminhos das fontes indexadas
+    if filtro:
+        filtro = filtro.resolver(datas_indexacao(CAMINHO_DB))
 
-    db = Chroma(persist_directory=CAMINHO_DB, embedding_function=func_embedding)
+    indice_lexico = carregar_indice_lexico(CAMINHO_DB) if busca == "hibrida" else None
+    if busca == "hibrida" and indice_lexico is None:
+        print("Índice BM25 não encontrado (rode python db.py); usando a vetorial.")
 
-    # comparar a pergunta do usuário (embedding) com os documentos no banco de dados
-    resultados = db.similarity_search_with_relevance_scores(pergunta, k=3)
+    if reranqueador is not None:
+        # 50 candidatos reordenados pelo cross-encoder; os k melhores vão ao prompt
+        resultados = buscar_reranqueado(
+            pergunta,
+            db,
+            reranqueador,
+            k_docs=k_docs,
+            indice_lexico=indice_lexico,
+            relevancia_minima=relevancia_minima,
+            filtro=filtro,
+        )
+        sem_resposta = len(resultados) == 0
+    elif indice_lexico is not None:
+        # vetorial + BM25: trechos que citam os termos exatos passam abaixo do limite
+        resultados = buscar_hibrido(
+            pergunta,
+            db,
+            indice_lexico,
+            k_docs,
+            relevancia_minima=relevancia_minima,
+            filtro=filtro,
+        )
+        sem_resposta = len(resultados) == 0
+    else:
+        # comparar a pergunta do usuário (embedding) com os documentos no banco de dados
+        resultados = buscar_contexto(pergunta, db, k_docs, filtro=filtro)
+        sem_resposta = len(resultados) == 0 or resultados[0][1] < relevancia_minima
 
-    if len(resultados) == 0 or resultados[0][1] < 0.7:
+    if sem_resposta:
+        print("Desculpe, não sei a resposta para essa pergunta.")
+        return
+
+    perguntar_ao_modelo(pergunta, resultados, inicio, streaming)
+
+
+def perguntar_ao_modelo(pergunta, resultados, inicio, streaming):
+    if not resultados:
         print("Desculpe, não sei a resposta para essa pergunta.")
         return
 
     
+    # sem o texto repetido entre chunks vizinhos e dentro do limite de tokens
     textos_resultado = []
-    for resultado in resultados:
+    for resultado in selecionar_trechos(resultados):
         texto = resultado[0].page_content
         textos_resultado.append(texto)
 
     base_conhecimento = "\n\n----\n\n".join(textos_resultado)
 
 
-    prompt = ChatPromptTemplate.from_template(prompt_template)
-    prompt = prompt.invoke({"pergunta": pergunta, "base_conhecimento": base_conhecimento})
+    prompt = template_prompt("terminal").invoke(
+        {"pergunta": pergunta, "base_conhecimento": base_conhecimento}
+    )
     #print(prompt)
 
-    modelo = ChatOpenAI()
-    texto_resposta = modelo.invoke(prompt)
-    print("Resposta da ia:" , texto_resposta.content)
-perguntar()   
+    # Groq, OpenAI ou o local, com timeouts e fallback (LLM_BACKENDS no .env)
+    from roteador_llm import criar_roteador
+
+    modelo = criar_roteador()
+    if not streaming:
+        texto_resposta = modelo.invoke(prompt)
+        print("Resposta da ia:" , texto_resposta.content)
+        imprimir_tokens(texto_resposta, pergunta, base_conhecimento)
+        return
+
+    # imprimir os tokens conforme chegam
+    print("Resposta da ia: ", end="", flush=True)
+    tempo_primeiro_token = None
+    mensagem = None
+    for pedaco in modelo.stream(prompt):
+        if tempo_primeiro_token is None:
+            tempo_primeiro_token = time.time() - inicio
+        mensagem = pedaco if mensagem is None else mensagem + pedaco
+        print(pedaco.content, end="", flush=True)
+    print()
+    tempo_total = time.time() - inicio
+    print(f"Primeiro token em {tempo_primeiro_token or 0:.2f}s, total {tempo_total:.2f}s")
+    imprimir_tokens(mensagem, pergunta, base_conhecimento)
+
+
+def imprimir_tokens(mensagem, pergunta, base_conhecimento):
+    """Tokens do prompt e quantos deles vieram do cache de prompt do provedor."""
+    template = TEMPLATES["terminal"]
+    uso = getattr(mensagem, "usage_metadata", None)
+    if not uso:
+        estimados = template.contar_tokens(pergunta, base_conhecimento)
+        print(f"Prompt: ~{estimados} tokens (estimados)")
+        return
+    em_cache = (uso.get("input_token_details") or {}).get("cache_read", 0)
+    print(
+        f"Prompt: {uso['input_tokens']} tokens, {em_cache} do cache do provedor "
+        f"(prefixo fixo: {template.tokens_prefixo(base_conhecimento)})"
+    )
+
+
+def perguntar_ao_servico(
+    cliente, pergunta, inicio, streaming, busca, reranquear, colecoes=None, filtro=None
+):
+    parametros = {
+        "k": int(os.getenv("BUSCA_K", K_DOCS)),
+        "relevancia_minima": float(
+            os.getenv("BUSCA_RELEVANCIA_MINIMA", RELEVANCIA_MINIMA)
+        ),
+        "busca": busca,
+        "reranquear": reranquear,
+        "colecoes": colecoes,
+        "filtro": filtro.como_dict() if filtro else None,
+    }
+    if not streaming:
+        resultado = cliente.perguntar(pergunta, **parametros)
+        if resultado["sem_contexto"]:
+            print("Desculpe, não sei a resposta para essa pergunta.")
+        else:
+            print("Resposta da ia:", resultado["resposta"])
+        return
+
+    tempo_primeiro_token = None
+    for evento in cliente.perguntar_streaming(pergunta, **parametros):
+        if evento["tipo"] == "token":
+            if tempo_primeiro_token is None:
+                tempo_primeiro_token = time.time() - inicio
+                print("Resposta da ia: ", end="", flush=True)
+            print(evento["texto"], end="", flush=True)
+        elif evento["sem_contexto"]:
+            print("Desculpe, não sei a resposta para essa pergunta.")
+            return
+    print()
+    tempo_total = time.time() - inicio
+    print(f"Primeiro token em {tempo_primeiro_token or 0:.2f}s, total {tempo_total:.2f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pergunte aos documentos da base.")
+    parser.add_argument(
+        "--sem-streaming",
+        action="store_true",
+        help="espera a resposta completa em vez de imprimir os tokens conforme chegam",
+    )
+    parser.add_argument(
+        "--busca",
+        choices=BUSCAS,
+        default="vetorial",
+        help="hibrida combina a busca vetorial com BM25 (nomes exatos, erros)",
+    )
+    parser.add_argument(
+        "--sem-servico",
+        action="store_true",
+        help="não usa o servico.py, mesmo que esteja no ar",
+    )
+    parser.add_argument(
+        "--reranquear",
+        action="store_true",
+        help="reordena 50 candidatos com o cross-encoder de RERANQUEADOR_MODELO",
+    )
+    parser.add_argument(
+        "--colecao",
+        action="append",
+        help="coleção consultada (repita para buscar em várias; padrão: base/)",
+    )
+    parser.add_argument(
+        "--fonte",
+        action="append",
+        help="busca só neste PDF (nome ou caminho; pode repetir)",
+    )
+    parser.add_argument(
+        "--paginas",
+        type=ler_paginas,
+        help="intervalo de páginas, como no metadado page: 3-10, 3- ou -10",
+    )
+    parser.add_argument(
+        "--indexado-desde",
+        type=ler_data,
+        help="só PDFs indexados a partir desta data (ex.: 2025-03-01)",
+    )
+    parser.add_argument(
+        "--indexado-ate",
+        type=ler_data,
+        help="só PDFs indexados até esta data",
+    )
+    parser.add_argument(
+        "--profile-startup",
+        action="store_true",
+        help="mostra o tempo de importação do main.py e os pacotes mais lentos",
+    )
+    args = parser.parse_args()
+    if args.profile_startup:
+        from perfil_inicio import relatorio
+
+        raise SystemExit(relatorio(["main"]))
+    perguntar(
+        streaming=not args.sem_streaming,
+        busca=args.busca,
+        usar_servico=not args.sem_servico,
+        reranquear=args.reranquear,
+        colecoes=args.colecao,
+        filtro=FiltroBusca(
+            args.fonte,
+            *(args.paginas or (None, None)),
+            args.indexado_desde,
+            args.indexado_ate,
+        )
+        or None,
+    )
 
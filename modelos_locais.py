@@ -0,0 +1,121 @@
+import hashlib
+import re
+import time
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from indice_lexico import tokenizar
+
+
+class EmbeddingsLocais(Embeddings):
+    """Embeddings determinísticos e offline, para testes e benchmarks.
+
+    Usa hashing de palavras (textos com palavras em comum ficam próximos) e
+    simula a latência do provedor com `latencia` segundos por requisição mais
+    `latencia_por_texto` por texto enviado.
+    """
+
+    def __init__(self, dimensao=256, latencia=0.0, latencia_por_texto=0.0):
+        self.dimensao = dimensao
+        self.latencia = latencia
+        self.latencia_por_texto = latencia_por_texto
+        self.model = f"local-{dimensao}"
+        self.requisicoes = 0
+
+    def embed_documents(self, texts):
+        texts = list(texts)
+        self.requisicoes += 1
+        time.sleep(self.latencia + self.latencia_por_texto * len(texts))
+        return [self._vetorizar(texto) for texto in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+    def _vetorizar(self, texto):
+        vetor = np.zeros(self.dimensao, dtype=np.float32)
+        for palavra in re.findall(r"\w+", texto.casefold()):
+            digest = hashlib.blake2b(palavra.encode("utf-8"), digest_size=8).digest()
+            indice = int.from_bytes(digest[:4], "little") % self.dimensao
+            sinal = 1.0 if digest[4] & 1 else -1.0
+            vetor[indice] += sinal
+        norma = np.linalg.norm(vetor)
+        if not norma:
+            vetor[0], norma = 1.0, 1.0
+        return (vetor / norma).tolist()
+
+
+class ChatLocal(BaseChatModel):
+    """Modelo de chat determinístico e offline, com latência simulada.
+
+    A resposta tem `tokens_resposta` tokens derivados do prompt; o primeiro
+    chega após `latencia_primeiro_token` segundos e os demais a cada
+    `latencia_por_token`.
+    """
+
+    tokens_resposta: int = 20
+    latencia_primeiro_token: float = 0.0
+    latencia_por_token: float = 0.0
+
+    @property
+    def _llm_type(self):
+        return "chat-local"
+
+    def _tokens(self, messages):
+        prompt = "\n".join(str(mensagem.content) for mensagem in messages)
+        semente = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        palavras = ["Resposta", "local", f"({len(prompt)} caracteres de prompt):"]
+        palavras += [semente[i % 60 : i % 60 + 4] for i in range(self.tokens_resposta)]
+        palavras = palavras[: self.tokens_resposta]
+        return [
+            palavra if i == 0 else f" {palavra}" for i, palavra in enumerate(palavras)
+        ]
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        tokens = self._tokens(messages)
+        time.sleep(
+            self.latencia_primeiro_token
+            + self.latencia_por_token * max(len(tokens) - 1, 0)
+        )
+        mensagem = AIMessage(content="".join(tokens))
+        return ChatResult(generations=[ChatGeneration(message=mensagem)])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        for i, token in enumerate(self._tokens(messages)):
+            espera = self.latencia_primeiro_token if i == 0 else self.latencia_por_token
+            time.sleep(espera)
+            pedaco = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=pedaco)
+            yield pedaco
+
+
+class ReranqueadorLocal:
+    """Reranqueador determinístico e offline, para testes e benchmarks.
+
+    O logit cresce com a fração dos termos da pergunta presentes no texto;
+    `latencia_por_par` simula o custo do cross-encoder.
+    """
+
+    def __init__(self, tamanho_lote=16, latencia_por_par=0.0):
+        self.nome = "local"
+        self.tamanho_lote = tamanho_lote
+        self.latencia_por_par = latencia_por_par
+        self.lotes = 0
+        self.pares = 0
+
+    def pontuar(self, pergunta, textos):
+        termos = set(tokenizar(pergunta))
+        scores = []
+        for inicio in range(0, len(textos), self.tamanho_lote):
+            lote = textos[inicio : inicio + self.tamanho_lote]
+            self.lotes += 1
+            self.pares += len(lote)
+            time.sleep(self.latencia_por_par * len(lote))
+            for texto in lote:
+                comuns = termos & set(tokenizar(texto))
+                scores.append(8 * len(comuns) / (len(termos) or 1) - 4)
+        return np.asarray(scores, dtype=np.float32)
@@ -0,0 +1,117 @@
+import argparse
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+
+# Configurações (podem ser sobrescritas pelo .env)
+ORCAMENTO_MS = 1000
+MODULOS = ("main", "app")
+REPETICOES = 3
+
+# pacotes que só devem ser importados na primeira consulta, não na partida
+PESADOS = (
+    "chromadb",
+    "langchain_chroma",
+    "langchain_community",
+    "langchain_groq",
+    "langchain_openai",
+    "langchain_text_splitters",
+    "langsmith",
+    "onnxruntime",
+    "openai",
+)
+
+# "import time:  self [us] | cumulative | imported package" do python -X importtime
+LINHA = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)")
+
+
+def medir_importacao(modulo):
+    """Importa `modulo` em um processo novo com `-X importtime`.
+
+    Retorna (ms da importação, [(nome, próprio µs, acumulado µs), ...]) com só
+    os módulos importados por ele.
+    """
+    processo = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {modulo}"],
+        capture_output=True,
+        text=True,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    if processo.returncode != 0:
+        raise RuntimeError(f"Falha ao importar {modulo}:\n{processo.stderr[-2000:]}")
+
+    # a saída vem em pós-ordem: os módulos importados aparecem antes de quem os
+    # importou, então os de `modulo` vão do último nível 0 anterior até ele
+    linhas = []
+    for linha in processo.stderr.splitlines():
+        encontrado = LINHA.match(linha)
+        if encontrado is None:
+            continue
+        proprio, acumulado, recuo, nome = encontrado.groups()
+        if not recuo:
+            if nome == modulo:
+                return int(acumulado) / 1000, linhas
+            linhas = []
+        else:
+            linhas.append((nome, int(proprio), int(acumulado)))
+    raise RuntimeError(f"{modulo} não aparece na saída do -X importtime")
+
+
+def perfil(modulo, top=10, repeticoes=REPETICOES):
+    """Tempo de importação (a melhor de `repeticoes`) e os pacotes mais lentos."""
+    ms, linhas = min(
+        (medir_importacao(modulo) for _ in range(repeticoes)), key=lambda m: m[0]
+    )
+    por_pacote = defaultdict(int)
+    for nome, proprio, _ in linhas:
+        por_pacote[nome.split(".")[0]] += proprio
+    pacotes = sorted(por_pacote.items(), key=lambda par: -par[1])
+    return {
+        "modulo": modulo,
+        "ms": round(ms, 1),
+        "pacotes": [(nome, round(us / 1000, 1)) for nome, us in pacotes[:top]],
+        "pesados": sorted(set(por_pacote) & set(PESADOS)),
+    }
+
+
+def relatorio(modulos=MODULOS, orcamento_ms=None, top=10, repeticoes=REPETICOES):
+    """Imprime o perfil de cada módulo; retorna 1 se algum estourar o orçamento."""
+    if orcamento_ms is None:
+        orcamento_ms = float(os.getenv("INICIO_ORCAMENTO_MS", ORCAMENTO_MS))
+    falhou = False
+    for modulo in modulos:
+        resultado = perfil(modulo, top, repeticoes)
+        dentro = resultado["ms"] <= orcamento_ms and not resultado["pesados"]
+        falhou = falhou or not dentro
+        print(
+            f"{'✅' if dentro else '❌'} import {modulo}: {resultado['ms']:.0f} ms "
+            f"(orçamento {orcamento_ms:.0f} ms)"
+        )
+        for nome, ms in resultado["pacotes"]:
+            print(f"   {ms:8.1f} ms  {nome}")
+        if resultado["pesados"]:
+            print(f"   importados na partida: {', '.join(resultado['pesados'])}")
+    return 1 if falhou else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Mede o tempo de partida (imports) do app.py e do main.py."
+    )
+    parser.add_argument("modulos", nargs="*", default=list(MODULOS))
+    parser.add_argument(
+        "--orcamento-ms",
+        type=float,
+        help=f"tempo máximo de importação (padrão: INICIO_ORCAMENTO_MS ou "
+        f"{ORCAMENTO_MS})",
+    )
+    parser.add_argument("--top", type=int, default=10, help="pacotes mostrados")
+    parser.add_argument("--repeticoes", type=int, default=REPETICOES)
+    args = parser.parse_args(argv)
+    return relatorio(args.modulos, args.orcamento_ms, args.top, args.repeticoes)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,147 @@
+import functools
+import os
+import threading
+from collections import OrderedDict
+
+from contexto import contar_tokens
+
+# Configurações (podem ser sobrescritas pelo .env)
+MAX_CONTEXTOS = 256  # blocos de contexto renderizados guardados
+
+
+class TemplatePrompt:
+    """Prompt com as instruções fixas primeiro e as partes variáveis depois.
+
+    As instruções vão numa mensagem de sistema idêntica em toda chamada, e é
+    esse prefixo que o cache de prompt do provedor (OpenAI, Groq) reaproveita.
+    Em seguida vêm o contexto e, por último, a pergunta: perguntas sobre os
+    mesmos trechos repetem também o contexto no prefixo.
+    """
+
+    def __init__(self, instrucoes, mensagem):
+        self.instrucoes = instrucoes
+        self.mensagem = mensagem  # com {base_conhecimento} e {pergunta}
+
+    @functools.cached_property
+    def chat(self):
+        """O ChatPromptTemplate, montado uma vez por processo."""
+        # o langchain importa boa parte do pacote ao montar o template (~0.7s)
+        from langchain_core.messages import SystemMessage
+        from langchain_core.prompts import ChatPromptTemplate
+
+        # a mensagem pronta não é formatada de novo a cada chamada
+        return ChatPromptTemplate.from_messages(
+            [SystemMessage(content=self.instrucoes), ("human", self.mensagem)]
+        )
+
+    @functools.cached_property
+    def tokens_instrucoes(self):
+        return contar_tokens(self.instrucoes)
+
+    def tokens_prefixo(self, contexto):
+        """Tokens do início que se repete entre perguntas: instruções + contexto."""
+        return self.tokens_instrucoes + tokens_contexto(contexto)
+
+    def contar_tokens(self, pergunta, contexto):
+        """Estimativa dos tokens de entrada, sem renderizar o prompt inteiro."""
+        variavel = self.mensagem.format(pergunta=pergunta, base_conhecimento="")
+        return self.tokens_prefixo(contexto) + contar_tokens(variavel)
+
+
+TEMPLATES = {
+    # app.py, servico.py, lote.py e benchmark.py
+    "rag": TemplatePrompt(
+        """Você é um assistente inteligente especialista em Python que ajuda os usuários com suas perguntas com base nos documentos fornecidos.
+
+**INSTRUÇÕES ESPECÍFICAS:**
+1. Responda APENAS com base nas informações fornecidas nos documentos do contexto
+2. Se a informação não estiver disponível, responda claramente: "Desculpe, não encontrei essa informação específica nos documentos disponíveis."
+3. Seja claro, direto e educativo na sua resposta
+4. Use exemplos práticos quando os documentos fornecerem
+5. Estruture sua resposta em parágrafos curtos e fáceis de ler
+6. Seja honesto sobre as limitações do conhecimento disponível""",
+        """**CONTEXTO DISPONÍVEL (Base de Conhecimento):**
+{base_conhecimento}
+
+**PERGUNTA DO USUÁRIO:**
+{pergunta}
+
+**RESPOSTA:**""",
+    ),
+    # main.py
+    "terminal": TemplatePrompt(
+        """Você é um assistente inteligente que ajuda os usuários com suas perguntas com base em documentos fornecidos.
+
+Utilize as informações dos documentos para responder à pergunta. Forneça respostas detalhadas e precisas.""",
+        """{base_conhecimento}
+
+Pergunta: {pergunta}""",
+    ),
+}
+
+
+def template_prompt(nome="rag"):
+    """O ChatPromptTemplate compilado do template `nome` de TEMPLATES."""
+    return TEMPLATES[nome].chat
+
+
+@functools.lru_cache(maxsize=MAX_CONTEXTOS)
+def tokens_contexto(contexto):
+    """Tokens de um bloco de contexto; os blocos repetidos não são recontados."""
+    return contar_tokens(contexto)
+
+
+class CacheContextos:
+    """Blocos de contexto já renderizados, por conjunto de trechos (ids).
+
+    A chave é a sequência de ids dos trechos, com o tamanho de cada texto
+    (um trecho cortado no limite de tokens muda de tamanho). Os blocos não
+    levam o score, que muda a cada pergunta: os mesmos trechos geram sempre
+    o mesmo texto, e o prefixo do prompt fica igual para o cache do provedor.
+    """
+
+    def __init__(self, max_itens=None):
+        self.max_itens = max_itens or int(
+            os.getenv("CACHE_CONTEXTOS_MAX_ITENS", MAX_CONTEXTOS)
+        )
+        self.acertos = 0
+        self.consultas = 0
+        self._blocos = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obter(self, trechos):
+        """(contexto, veio do cache) para os pares (documento, score) dados."""
+        chave = tuple((doc.id, len(doc.page_content)) for doc, _ in trechos)
+        if any(id_trecho is None for id_trecho, _ in chave):
+            return renderizar_contexto(trechos), False
+        with self._lock:
+            self.consultas += 1
+            contexto = self._blocos.get(chave)
+            if contexto is not None:
+                self.acertos += 1
+                self._blocos.move_to_end(chave)
+                return contexto, True
+
+        contexto = renderizar_contexto(trechos)
+        with self._lock:
+            self._blocos[chave] = contexto
+            while len(self._blocos) > self.max_itens:
+                self._blocos.popitem(last=False)
+        return contexto, False
+
+    def limpar(self):
+        with self._lock:
+            self._blocos.clear()
+
+
+@functools.cache
+def cache_contextos():
+    """O cache de contextos compartilhado pelo processo."""
+    return CacheContextos()
+
+
+def renderizar_contexto(trechos):
+    return "".join(
+        f"\n📄 **Documento {i + 1}**:\n{doc.page_content}\n"
+        for i, (doc, _) in enumerate(trechos)
+    )
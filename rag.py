@@ -0,0 +1,363 @@
+import os
+import time
+
+from langchain_core.documents import Document
+
+from contexto import contar_tokens, selecionar_trechos
+from indice_lexico import fundir_rrf
+from prompts import TEMPLATES, cache_contextos, template_prompt
+from rastreamento import etapa
+from reranqueamento import CANDIDATOS, reranquear
+
+# Configurações
+GROQ_MODEL_PADRAO = "llama-3.1-8b-instant"
+BUSCAS = ("vetorial", "hibrida")
+K_RRF = 60  # constante da reciprocal-rank fusion
+
+def modelo_chat():
+    """Nome do modelo Groq configurado no .env."""
+    return os.getenv("GROQ_MODEL", GROQ_MODEL_PADRAO)
+
+
+def buscar_contexto(
+    pergunta, db, k_docs=4, vetor=None, rastreamento=None, filtro=None
+):
+    """Busca os k documentos mais similares à pergunta, com score de relevância.
+
+    `vetor` reaproveita um embedding da pergunta já calculado; `filtro` (um
+    FiltroBusca já resolvido, ver filtros.py) restringe os candidatos.
+    """
+    if vetor is None:
+        with etapa(rastreamento, "embedding"):
+            vetor = db.embeddings.embed_query(pergunta)
+    return buscar_varias([pergunta], db, k_docs, [vetor], rastreamento, filtro)[0]
+
+
+def buscar_varias(
+    perguntas, db, k_docs=4, vetores=None, rastreamento=None, filtro=None
+):
+    """Busca várias perguntas de uma vez: os k melhores (documento, relevância) de
+    cada uma, na ordem de `perguntas`.
+
+    Os embeddings saem de uma chamada só (uma consulta ao cache e uma requisição
+    ao provedor para os que faltam) e a busca é uma operação de matriz para
+    todas as perguntas. `vetores` reaproveita embeddings já calculados.
+    """
+    perguntas = list(perguntas)
+    if not perguntas:
+        return []
+    if vetores is None:
+        with etapa(rastreamento, "embedding", perguntas=len(perguntas)):
+            vetores = db.embeddings.embed_documents(perguntas)
+    with etapa(rastreamento, "busca_vetorial", k=k_docs, perguntas=len(perguntas)):
+        resultados = buscar_por_vetores(db, vetores, k_docs, filtro)
+    # a busca por vetor devolve distâncias; converte como a busca por texto faz
+    relevancia = db._select_relevance_score_fn()
+    return [
+        [(doc, relevancia(distancia)) for doc, distancia in encontrados]
+        for encontrados in resultados
+    ]
+
+
+def buscar_por_vetores(db, vetores, k, filtro=None):
+    """(documento, distância) dos k mais próximos de cada vetor, numa consulta só.
+
+    Com `filtro`, só os chunks que passam nele são comparados: o índice local
+    usa as posições pré-calculadas por fonte e página, o Chroma o `where`.
+    """
+    if filtro is not None and filtro.nenhuma_fonte:
+        return [[] for _ in vetores]
+    if hasattr(db, "buscar_por_vetores"):
+        return db.buscar_por_vetores(vetores, k, filtro=filtro)
+    if filtro is not None and filtro.fontes is not None:
+        # o `where` compara `source` por igualdade: "a.pdf" vira "base/a.pdf"
+        filtro = filtro.com_fontes_do_indice(fontes_chroma(db))
+        if filtro.nenhuma_fonte:
+            return [[] for _ in vetores]
+    # Chroma: a coleção aceita várias consultas em uma chamada
+    resposta = db._collection.query(
+        query_embeddings=[list(map(float, vetor)) for vetor in vetores],
+        n_results=k,
+        where=filtro.where_chroma() if filtro else None,
+        include=["documents", "metadatas", "distances"],
+    )
+    return [
+        [
+            (Document(id=i, page_content=texto, metadata=meta or {}), distancia)
+            for i, texto, meta, distancia in zip(*colunas)
+            if texto is not None
+        ]
+        for colunas in zip(
+            resposta["ids"],
+            resposta["documents"],
+            resposta["metadatas"],
+            resposta["distances"],
+        )
+    ]
+
+
+def fontes_chroma(db):
+    """Fontes distintas gravadas no Chroma, lidas uma vez por banco aberto."""
+    fontes = getattr(db, "_fontes_filtro", None)
+    if fontes is None:
+        metadados = db._collection.get(include=["metadatas"])["metadatas"]
+        fontes = sorted({str((meta or {}).get("source")) for meta in metadados})
+        db._fontes_filtro = fontes
+    return fontes
+
+
+def buscar_hibrido(
+    pergunta,
+    db,
+    indice_lexico,
+    k_docs=4,
+    relevancia_minima=None,
+    vetor=None,
+    rastreamento=None,
+    filtro=None,
+):
+    """Funde a busca vetorial e a BM25 com reciprocal-rank fusion.
+
+    Retorna os k melhores (documento, score), com o score RRF normalizado
+    (1.0 = primeiro nas duas buscas). Com `relevancia_minima`, resultados
+    vetoriais abaixo dela ficam de fora; os que casam termos da pergunta não.
+    `filtro` vale para as duas buscas.
+    """
+    candidatos = max(4 * k_docs, 20)
+    vetoriais = buscar_contexto(pergunta, db, candidatos, vetor, rastreamento, filtro)
+    if relevancia_minima is not None:
+        vetoriais = [(doc, s) for doc, s in vetoriais if s >= relevancia_minima]
+    with etapa(rastreamento, "busca_lexica"):
+        lexicos = (
+            indice_lexico.buscar(pergunta, candidatos, filtro) if indice_lexico else []
+        )
+
+    scores = fundir_rrf(
+        [[doc.id for doc, _ in vetoriais], [id_chunk for id_chunk, _ in lexicos]],
+        K_RRF,
+    )
+    melhores = sorted(scores, key=scores.get, reverse=True)[:k_docs]
+    documentos = {doc.id: doc for doc, _ in vetoriais}
+    faltantes = [id_chunk for id_chunk in melhores if id_chunk not in documentos]
+    if faltantes:
+        documentos.update({doc.id: doc for doc in db.get_by_ids(faltantes)})
+
+    maximo = 2 / (K_RRF + 1)
+    return [
+        (documentos[id_chunk], scores[id_chunk] / maximo)
+        for id_chunk in melhores
+        if id_chunk in documentos
+    ]
+
+
+def buscar_reranqueado(
+    pergunta,
+    db,
+    reranqueador,
+    k_docs=4,
+    candidatos=CANDIDATOS,
+    indice_lexico=None,
+    relevancia_minima=None,
+    vetor=None,
+    cache=None,
+    rastreamento=None,
+    filtro=None,
+):
+    """Busca em duas etapas: `candidatos` trechos e o cross-encoder escolhe k.
+
+    A primeira etapa é a híbrida quando há `indice_lexico`, senão a vetorial;
+    `relevancia_minima` e `filtro` valem para ela. Ver reranqueamento.py.
+    """
+    if indice_lexico is not None:
+        resultados = buscar_hibrido(
+            pergunta,
+            db,
+            indice_lexico,
+            candidatos,
+            relevancia_minima=relevancia_minima,
+            vetor=vetor,
+            rastreamento=rastreamento,
+            filtro=filtro,
+        )
+    else:
+        resultados = buscar_contexto(
+            pergunta, db, candidatos, vetor, rastreamento, filtro
+        )
+        if relevancia_minima is not None:
+            resultados = [r for r in resultados if r[1] >= relevancia_minima]
+    return reranquear(
+        pergunta, resultados, reranqueador, k_docs, cache, rastreamento
+    )
+
+
+def buscar_em_colecoes(
+    pergunta,
+    colecoes,
+    k_docs=4,
+    busca="vetorial",
+    relevancia_minima=None,
+    vetor=None,
+    reranqueador=None,
+    cache=None,
+    rastreamento=None,
+    filtro=None,
+):
+    """Busca em uma ou mais coleções e junta os k melhores pelo score.
+
+    `colecoes` são objetos com `nome`, `db`, `indice_lexico` e
+    `datas_indexacao` (ver colecoes.py). O embedding da pergunta é calculado
+    uma vez para todas. Com `reranqueador`, os candidatos de todas as coleções
+    são reordenados juntos. Cada documento leva o nome da sua coleção em
+    `metadata["colecao"]`. `filtro` (ver filtros.py) é resolvido por coleção.
+    """
+    if vetor is None:
+        with etapa(rastreamento, "embedding"):
+            vetor = colecoes[0].db.embeddings.embed_query(pergunta)
+    candidatos = CANDIDATOS if reranqueador is not None else k_docs
+
+    resultados = []
+    for colecao in colecoes:
+        indice_lexico = colecao.indice_lexico if busca == "hibrida" else None
+        filtro_colecao = filtro.resolver(colecao.datas_indexacao) if filtro else None
+        if indice_lexico is not None:
+            encontrados = buscar_hibrido(
+                pergunta,
+                colecao.db,
+                indice_lexico,
+                candidatos,
+                relevancia_minima=relevancia_minima,
+                vetor=vetor,
+                rastreamento=rastreamento,
+                filtro=filtro_colecao,
+            )
+        else:
+            encontrados = buscar_contexto(
+                pergunta, colecao.db, candidatos, vetor, rastreamento, filtro_colecao
+            )
+            if relevancia_minima is not None:
+                encontrados = [r for r in encontrados if r[1] >= relevancia_minima]
+        resultados += [
+            (
+                Document(
+                    id=doc.id,
+                    page_content=doc.page_content,
+                    metadata=dict(doc.metadata, colecao=colecao.nome),
+                ),
+                score,
+            )
+            for doc, score in encontrados
+        ]
+
+    resultados.sort(key=lambda par: -par[1])
+    if reranqueador is not None:
+        return reranquear(
+            pergunta, resultados, reranqueador, k_docs, cache, rastreamento
+        )
+    return resultados[:k_docs]
+
+
+def montar_contexto(resultados, rastreamento=None, max_tokens=None):
+    """Transforma os resultados da busca em (contexto do prompt, fontes exibidas).
+
+    Chunks sobrepostos são unidos, quase duplicatas descartadas e o contexto
+    limitado a `max_tokens` (padrão: CONTEXTO_MAX_TOKENS); ver contexto.py. O
+    bloco renderizado é reaproveitado para os mesmos trechos (ver prompts.py).
+    """
+    with etapa(rastreamento, "montagem_contexto", documentos=len(resultados)):
+        resultados = selecionar_trechos(resultados, max_tokens)
+        contexto, em_cache = cache_contextos().obter(resultados)
+        fontes = []
+
+        for i, (doc, score) in enumerate(resultados):
+            fontes.append(
+                {
+                    "conteudo": doc.page_content[:300] + "...",
+                    "fonte": doc.metadata.get("source", "Desconhecido"),
+                    "score": score,
+                    "pagina": doc.metadata.get("page", "N/A"),
+                    "colecao": doc.metadata.get("colecao"),
+                    "chunk_id": i + 1,
+                    "id": doc.id,
+                }
+            )
+
+        if rastreamento is not None:
+            rastreamento.atributos["trechos_contexto"] = len(resultados)
+            rastreamento.atributos["contexto_em_cache"] = em_cache
+        return contexto, fontes
+
+
+def criar_chain(temperature=0.1, chat=None):
+    """Cria a chain prompt | modelo usada para gerar as respostas.
+
+    Sem `chat`, usa o roteador com os backends do .env (ver roteador_llm.py).
+    """
+    prompt = template_prompt()
+    if chat is None:
+        from roteador_llm import criar_roteador
+
+        chat = criar_roteador(temperature)
+    return prompt | chat
+
+
+def gerar_resposta(
+    chain, pergunta, contexto, ao_receber_token=None, rastreamento=None
+):
+    """Gera a resposta do LLM. Retorna (resposta, segundos até o primeiro token).
+
+    Com `ao_receber_token`, a resposta é recebida em streaming e a função é
+    chamada com o texto parcial a cada token.
+    """
+    inicio = time.time()
+    entrada = {"pergunta": pergunta, "base_conhecimento": contexto}
+
+    if ao_receber_token is None:
+        mensagem = chain.invoke(entrada)
+        tempo_primeiro_token = time.time() - inicio
+    else:
+        mensagem = None
+        tempo_primeiro_token = None
+        for pedaco in chain.stream(entrada):
+            if tempo_primeiro_token is None:
+                tempo_primeiro_token = time.time() - inicio
+            mensagem = pedaco if mensagem is None else mensagem + pedaco
+            ao_receber_token(mensagem.content)
+        tempo_primeiro_token = tempo_primeiro_token or time.time() - inicio
+
+    resposta = mensagem.content if mensagem is not None else ""
+    if rastreamento is not None:
+        rastreamento.registrar("llm_primeiro_token", tempo_primeiro_token)
+        rastreamento.registrar("llm_total", time.time() - inicio)
+        backend = getattr(mensagem, "response_metadata", {}).get("backend")
+        if backend is not None:
+            rastreamento.atributos["llm_backend"] = backend
+        rastreamento.atributos.update(
+            contar_tokens_chamada(mensagem, pergunta, contexto, resposta)
+        )
+    return resposta, tempo_primeiro_token
+
+
+def contar_tokens_chamada(mensagem, pergunta, contexto, resposta):
+    """Tokens de entrada e saída informados pelo provedor, ou estimados.
+
+    `tokens_cache` são os de entrada que o provedor leu do cache de prompt, e
+    `tokens_prefixo` o tamanho do início fixo (instruções + contexto) que ele
+    pode reaproveitar na próxima pergunta sobre os mesmos trechos.
+    """
+    template = TEMPLATES["rag"]
+    uso = getattr(mensagem, "usage_metadata", None)
+    if uso:
+        detalhes = uso.get("input_token_details") or {}
+        return {
+            "tokens_entrada": uso["input_tokens"],
+            "tokens_cache": detalhes.get("cache_read", 0),
+            "tokens_prefixo": template.tokens_prefixo(contexto),
+            "tokens_saida": uso["output_tokens"],
+            "tokens_estimados": False,
+        }
+    return {
+        "tokens_entrada": template.contar_tokens(pergunta, contexto),
+        "tokens_prefixo": template.tokens_prefixo(contexto),
+        "tokens_saida": contar_tokens(resposta),
+        "tokens_estimados": True,
+    }
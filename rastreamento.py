@@ -0,0 +1,135 @@
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+
+# Configurações (podem ser sobrescritas pelo .env)
+ARQUIVO_RASTREAMENTO = ".cache/rastreamento.jsonl"
+
+# Ordem e rótulos das etapas do pipeline de consulta
+ETAPAS = {
+    "cache_respostas": "💾 Cache",
+    "embedding": "🧠 Embedding",
+    "busca_vetorial": "🔍 Busca",
+    "busca_lexica": "🔤 BM25",
+    "reranqueamento": "🎯 Rerank",
+    "montagem_contexto": "📄 Contexto",
+    "llm_primeiro_token": "⚡ 1º token",
+    "llm_total": "🤖 LLM",
+}
+
+
+class Rastreamento:
+    """Registra a duração de cada etapa de uma consulta e atributos como tokens.
+
+    Ao final (`finalizar`), o rastreamento é enviado a cada exportador.
+    """
+
+    def __init__(self, nome, exportadores=(), atributos=None):
+        self.id = uuid.uuid4().hex
+        self.nome = nome
+        self.exportadores = list(exportadores)
+        self.atributos = dict(atributos or {})
+        self.etapas = []
+        self.inicio = time.perf_counter()
+        self.data = datetime.now().isoformat(timespec="seconds")
+        self.duracao_ms = None
+
+    @contextmanager
+    def etapa(self, nome, **atributos):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.registrar(nome, time.perf_counter() - inicio, **atributos)
+
+    def registrar(self, nome, segundos, **atributos):
+        """Registra uma etapa medida fora do `etapa()` (ex.: tempo até o 1º token)."""
+        self.etapas.append({"nome": nome, "duracao_ms": segundos * 1000, **atributos})
+
+    def etapas_ms(self):
+        duracoes = {}
+        for etapa in self.etapas:
+            nome = etapa["nome"]
+            duracoes[nome] = duracoes.get(nome, 0.0) + etapa["duracao_ms"]
+        return duracoes
+
+    def finalizar(self):
+        if self.duracao_ms is None:
+            self.duracao_ms = (time.perf_counter() - self.inicio) * 1000
+            for exportador in self.exportadores:
+                exportador.exportar(self)
+        return self
+
+    def como_dict(self):
+        return {
+            "id": self.id,
+            "nome": self.nome,
+            "data": self.data,
+            "duracao_ms": self.duracao_ms,
+            "etapas": self.etapas,
+            "atributos": self.atributos,
+        }
+
+
+@contextmanager
+def etapa(rastreamento, nome, **atributos):
+    """Como `Rastreamento.etapa`, mas sem efeito quando não há rastreamento."""
+    if rastreamento is None:
+        yield
+        return
+    with rastreamento.etapa(nome, **atributos):
+        yield
+
+
+class ExportadorJsonl:
+    """Acrescenta cada rastreamento como uma linha JSON em um arquivo."""
+
+    def __init__(self, caminho=None):
+        self.caminho = caminho or os.getenv(
+            "RASTREAMENTO_ARQUIVO", ARQUIVO_RASTREAMENTO
+        )
+        self._lock = threading.Lock()
+
+    def exportar(self, rastreamento):
+        pasta = os.path.dirname(self.caminho)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+        linha = json.dumps(rastreamento.como_dict(), ensure_ascii=False)
+        with self._lock, open(self.caminho, "a", encoding="utf-8") as arquivo:
+            arquivo.write(linha + "\n")
+
+
+class ExportadorMemoria:
+    """Guarda os últimos rastreamentos em memória (testes e painel do app)."""
+
+    def __init__(self, max_itens=1000):
+        self.rastreamentos = deque(maxlen=max_itens)
+
+    def exportar(self, rastreamento):
+        self.rastreamentos.append(rastreamento.como_dict())
+
+    def resumo(self):
+        """Consultas, média e p95 (ms) por etapa, na ordem de ETAPAS."""
+        duracoes = {}
+        for rastreamento in list(self.rastreamentos):
+            for etapa_ in rastreamento["etapas"]:
+                duracoes.setdefault(etapa_["nome"], []).append(etapa_["duracao_ms"])
+            duracoes.setdefault("total", []).append(rastreamento["duracao_ms"])
+
+        ordem = [*ETAPAS, *sorted(set(duracoes) - set(ETAPAS) - {"total"}), "total"]
+        return {
+            nome: {
+                "consultas": len(duracoes[nome]),
+                "media_ms": float(np.mean(duracoes[nome])),
+                "p95_ms": float(np.percentile(duracoes[nome], 95)),
+            }
+            for nome in ordem
+            if nome in duracoes
+        }
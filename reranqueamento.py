@@ -0,0 +1,187 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from cache_respostas import normalizar_pergunta
+from rastreamento import etapa
+
+# Configurações (podem ser sobrescritas pelo .env)
+CANDIDATOS = 50  # trechos buscados na primeira etapa para o cross-encoder
+TAMANHO_LOTE = 16  # pares (pergunta, trecho) por execução do modelo
+MAX_TOKENS_PAR = 512
+MAX_ITENS_CACHE = 50000
+ORCAMENTO_MS = 300  # tempo de CPU aceitável para o reranqueamento
+ARQUIVO_MODELO = "model.onnx"
+ARQUIVO_TOKENIZER = "tokenizer.json"
+
+
+class ReranqueadorOnnx:
+    """Cross-encoder (ex.: ms-marco-MiniLM) exportado para ONNX, rodando na CPU.
+
+    Qualquer objeto com `nome` e `pontuar(pergunta, textos)` serve como
+    reranqueador; este é o padrão, carregado de uma pasta com `model.onnx` e
+    `tokenizer.json`.
+    """
+
+    def __init__(self, sessao, tokenizer, nome, tamanho_lote=TAMANHO_LOTE):
+        self.sessao = sessao
+        self.tokenizer = tokenizer
+        self.nome = nome
+        self.tamanho_lote = tamanho_lote
+        self.entradas = {entrada.name for entrada in sessao.get_inputs()}
+
+    @classmethod
+    def carregar(cls, pasta, tamanho_lote=None, threads=None):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        opcoes = onnxruntime.SessionOptions()
+        opcoes.intra_op_num_threads = threads or int(
+            os.getenv("RERANQUEADOR_THREADS", 0)
+        )
+        sessao = onnxruntime.InferenceSession(
+            os.path.join(pasta, ARQUIVO_MODELO),
+            opcoes,
+            providers=["CPUExecutionProvider"],
+        )
+        tokenizer = Tokenizer.from_file(os.path.join(pasta, ARQUIVO_TOKENIZER))
+        tokenizer.enable_truncation(MAX_TOKENS_PAR)
+        if tokenizer.padding is None:
+            pad_id = tokenizer.token_to_id("[PAD]") or 0
+            tokenizer.enable_padding(pad_id=pad_id, pad_token="[PAD]")
+        tamanho_lote = tamanho_lote or int(
+            os.getenv("RERANQUEADOR_LOTE", TAMANHO_LOTE)
+        )
+        nome = os.path.basename(os.path.normpath(pasta))
+        return cls(sessao, tokenizer, nome, tamanho_lote)
+
+    def pontuar(self, pergunta, textos):
+        """Logits de relevância de cada texto para a pergunta, em lotes."""
+        scores = []
+        for inicio in range(0, len(textos), self.tamanho_lote):
+            lote = textos[inicio : inicio + self.tamanho_lote]
+            codificados = self.tokenizer.encode_batch(
+                [(pergunta, texto) for texto in lote]
+            )
+            entradas = {
+                "input_ids": [c.ids for c in codificados],
+                "attention_mask": [c.attention_mask for c in codificados],
+                "token_type_ids": [c.type_ids for c in codificados],
+            }
+            logits = self.sessao.run(
+                None,
+                {
+                    nome: np.asarray(valores, dtype=np.int64)
+                    for nome, valores in entradas.items()
+                    if nome in self.entradas
+                },
+            )[0]
+            # (n, 1) ou (n, 2) com a classe "relevante" por último
+            scores.append(np.asarray(logits, dtype=np.float32).reshape(len(lote), -1))
+        if not scores:
+            return np.empty(0, dtype=np.float32)
+        return np.concatenate(scores)[:, -1]
+
+
+def carregar_reranqueador(pasta=None):
+    """Reranqueador da pasta `RERANQUEADOR_MODELO`, ou None se não configurado."""
+    pasta = pasta or os.getenv("RERANQUEADOR_MODELO")
+    if not pasta or not os.path.exists(os.path.join(pasta, ARQUIVO_MODELO)):
+        return None
+    return ReranqueadorOnnx.carregar(pasta)
+
+
+class CacheScores:
+    """Scores do cross-encoder por (hash da pergunta, id do chunk), LRU em memória.
+
+    Os ids dos chunks vêm do conteúdo (ver db.gerar_ids_chunks), então um
+    score guardado continua válido depois de reindexar.
+    """
+
+    def __init__(self, max_itens=None):
+        self.max_itens = max_itens or int(
+            os.getenv("RERANQUEADOR_CACHE_MAX_ITENS", MAX_ITENS_CACHE)
+        )
+        self._scores = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._scores)
+
+    def buscar(self, chave_pergunta, ids):
+        """Retorna {id: score} dos ids que já foram pontuados para a pergunta."""
+        encontrados = {}
+        with self._lock:
+            for id_chunk in ids:
+                chave = (chave_pergunta, id_chunk)
+                if chave in self._scores:
+                    self._scores.move_to_end(chave)
+                    encontrados[id_chunk] = self._scores[chave]
+        return encontrados
+
+    def guardar(self, chave_pergunta, scores):
+        with self._lock:
+            for id_chunk, score in scores.items():
+                self._scores[(chave_pergunta, id_chunk)] = score
+                self._scores.move_to_end((chave_pergunta, id_chunk))
+            while len(self._scores) > self.max_itens:
+                self._scores.popitem(last=False)
+
+
+def chave_pergunta(pergunta, nome_modelo):
+    texto = f"{nome_modelo}\0{normalizar_pergunta(pergunta)}"
+    return hashlib.sha256(texto.encode("utf-8")).hexdigest()[:32]
+
+
+def reranquear(
+    pergunta, resultados, reranqueador, top_n=4, cache=None, rastreamento=None
+):
+    """Reordena pares (documento, score) pelo cross-encoder e mantém os `top_n`.
+
+    O score devolvido é o do cross-encoder em [0, 1]. Só os pares fora do
+    `cache` vão ao modelo. Com `rastreamento`, registra a etapa
+    "reranqueamento" e se ela passou de RERANQUEADOR_ORCAMENTO_MS.
+    """
+    inicio = time.perf_counter()
+    with etapa(rastreamento, "reranqueamento", candidatos=len(resultados)):
+        chave = chave_pergunta(pergunta, reranqueador.nome)
+        ids = [doc.id for doc, _ in resultados]
+        guardados = cache.buscar(chave, ids) if cache is not None else {}
+        faltantes = [
+            i for i, id_chunk in enumerate(ids) if id_chunk not in guardados
+        ]
+        novos = reranqueador.pontuar(
+            pergunta, [resultados[i][0].page_content for i in faltantes]
+        )
+
+        logits = np.array(
+            [guardados.get(id_chunk, 0.0) for id_chunk in ids], dtype=np.float32
+        )
+        logits[faltantes] = novos
+        if cache is not None:
+            cache.guardar(
+                chave,
+                {
+                    ids[i]: float(logit)
+                    for i, logit in zip(faltantes, novos)
+                    if ids[i] is not None
+                },
+            )
+        ordem = np.argsort(-logits, kind="stable")[:top_n]
+        scores = 1 / (1 + np.exp(-logits[ordem]))
+
+    if rastreamento is not None:
+        duracao_ms = (time.perf_counter() - inicio) * 1000
+        orcamento_ms = float(os.getenv("RERANQUEADOR_ORCAMENTO_MS", ORCAMENTO_MS))
+        rastreamento.atributos.update(
+            reranqueador=reranqueador.nome,
+            reranqueamento_em_cache=len(ids) - len(faltantes),
+            reranqueamento_acima_do_orcamento=duracao_ms > orcamento_ms,
+        )
+    return [
+        (resultados[i][0], float(score)) for i, score in zip(ordem, scores)
+    ]
@@ -0,0 +1,361 @@
+import itertools
+import os
+import queue
+import threading
+import time
+from collections import deque
+
+import numpy as np
+from langchain_core.language_models.chat_models import (
+    BaseChatModel,
+    generate_from_stream,
+)
+from langchain_core.outputs import ChatGenerationChunk
+from pydantic import ConfigDict
+
+from rag import modelo_chat
+
+# Configurações (podem ser sobrescritas pelo .env)
+BACKENDS_PADRAO = ("groq", "openai")  # os que têm chave no .env, nesta ordem
+CHAVES = {"groq": "GROQ_API_KEY", "openai": "OPENAI_API_KEY"}
+TIMEOUT_S = 30.0  # sem token nesse tempo, o backend falhou
+FALHAS_PARA_ABRIR = 3  # falhas seguidas que abrem o disjuntor
+ESPERA_DISJUNTOR_S = 30.0  # tempo com o disjuntor aberto até uma nova tentativa
+# hedging desligado por padrão: cada disparo extra é uma chamada paga a mais
+HEDGE_PERCENTIL = 0  # ex.: 95 dispara o próximo no p95 do primeiro token
+HEDGE_ATRASO_PADRAO_S = 2.0  # usado até haver AMOSTRAS_MINIMAS latências
+AMOSTRAS_MINIMAS = 20
+JANELA_LATENCIAS = 200
+
+
+def eh_limite_de_taxa(erro):
+    """Indica se o erro do provedor é um HTTP 429 (limite de requisições)."""
+    status = getattr(erro, "status_code", None)
+    if status is None:
+        status = getattr(getattr(erro, "response", None), "status_code", None)
+    if status is not None:
+        return status == 429
+    mensagem = str(erro).lower()
+    return "429" in mensagem or "rate limit" in mensagem
+
+
+class Disjuntor:
+    """Circuit breaker: abre após `falhas_maximas` falhas seguidas.
+
+    Aberto, o backend é pulado; passados `espera` segundos, uma única
+    tentativa é liberada e o resultado dela fecha ou reabre o disjuntor.
+    Um 429 não conta como falha: o backend está de pé, só pediu para esperar.
+    """
+
+    def __init__(self, falhas_maximas=None, espera=None, relogio=time.monotonic):
+        self.falhas_maximas = falhas_maximas or int(
+            os.getenv("LLM_FALHAS_PARA_ABRIR", FALHAS_PARA_ABRIR)
+        )
+        self.espera = espera or float(
+            os.getenv("LLM_ESPERA_DISJUNTOR_S", ESPERA_DISJUNTOR_S)
+        )
+        self.relogio = relogio
+        self.falhas = 0
+        self.aberto_em = None
+        self._em_teste = False
+        self._lock = threading.Lock()
+
+    def permite(self):
+        with self._lock:
+            if self.aberto_em is None:
+                return True
+            if self._em_teste or self.relogio() - self.aberto_em < self.espera:
+                return False
+            self._em_teste = True
+            return True
+
+    def sucesso(self):
+        with self._lock:
+            self.falhas = 0
+            self.aberto_em = None
+            self._em_teste = False
+
+    def falha(self):
+        with self._lock:
+            self.falhas += 1
+            self._em_teste = False
+            if self.falhas >= self.falhas_maximas:
+                self.aberto_em = self.relogio()
+
+    def liberar(self):
+        """Tentativa cancelada sem resultado (ex.: a perdedora do hedging)."""
+        with self._lock:
+            self._em_teste = False
+
+    @property
+    def aberto(self):
+        return self.aberto_em is not None
+
+
+class BackendChat:
+    """Um modelo de chat com timeout, disjuntor e as latências observadas."""
+
+    def __init__(self, nome, modelo, timeout=None, disjuntor=None):
+        self.nome = nome
+        self.modelo = modelo
+        self.timeout = timeout or float(os.getenv("LLM_TIMEOUT_S", TIMEOUT_S))
+        self.disjuntor = disjuntor or Disjuntor()
+        self.latencias = deque(maxlen=JANELA_LATENCIAS)  # até o primeiro token
+
+    def percentil(self, percentil):
+        """Percentil das latências até o primeiro token, ou None sem amostras."""
+        amostras = list(self.latencias)
+        if len(amostras) < AMOSTRAS_MINIMAS:
+            return None
+        return float(np.percentile(amostras, percentil))
+
+    def resumo(self):
+        return {
+            "nome": self.nome,
+            "disjuntor_aberto": self.disjuntor.aberto,
+            "falhas": self.disjuntor.falhas,
+            "p50_s": self.percentil(50),
+            "p95_s": self.percentil(95),
+        }
+
+
+class Tentativa:
+    """O streaming de um backend em uma thread, entregando os pedaços na fila."""
+
+    def __init__(self, indice, backend, messages, fila, stop=None, **kwargs):
+        self.indice = indice
+        self.backend = backend
+        self.inicio = time.monotonic()
+        self.ultimo_pedaco = self.inicio
+        self.cancelada = threading.Event()
+        threading.Thread(
+            target=self._executar,
+            args=(messages, fila, stop, kwargs),
+            name=f"llm-{backend.nome}",
+            daemon=True,
+        ).start()
+
+    def _executar(self, messages, fila, stop, kwargs):
+        try:
+            for pedaco in self.backend.modelo.stream(messages, stop=stop, **kwargs):
+                if self.cancelada.is_set():
+                    return  # fecha o stream da requisição perdedora
+                fila.put(("pedaco", self.indice, pedaco))
+            fila.put(("fim", self.indice, None))
+        except Exception as erro:
+            fila.put(("erro", self.indice, erro))
+
+    def prazo(self):
+        return self.ultimo_pedaco + self.backend.timeout
+
+
+class RoteadorLLM(BaseChatModel):
+    """Modelo de chat que distribui as chamadas entre vários backends.
+
+    Os backends são tentados na ordem: um que falha, estoura `timeout` sem
+    mandar tokens ou está com o disjuntor aberto dá a vez ao seguinte. O
+    hedging é opcional e vem desligado (`percentil_hedge` 0, ou
+    LLM_HEDGE_PERCENTIL no .env): ligado, se o primeiro não mandou o primeiro
+    token no percentil `percentil_hedge` da sua latência, o próximo é
+    disparado em paralelo e fica valendo quem responder primeiro; o outro é
+    cancelado.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    backends: list
+    percentil_hedge: float = HEDGE_PERCENTIL
+    atraso_hedge_padrao: float = HEDGE_ATRASO_PADRAO_S
+
+    @property
+    def _llm_type(self):
+        return "roteador-llm"
+
+    def atraso_hedge(self, backend):
+        """Segundos sem token até disparar o próximo backend (None: sem hedging)."""
+        if not self.percentil_hedge:
+            return None
+        atraso = backend.percentil(self.percentil_hedge)
+        return self.atraso_hedge_padrao if atraso is None else atraso
+
+    def resumo(self):
+        return [backend.resumo() for backend in self.backends]
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        return generate_from_stream(
+            self._stream(messages, stop=stop, run_manager=run_manager, **kwargs)
+        )
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        fila = queue.Queue()
+        pendentes = iter(self.backends)
+        numeros = itertools.count()
+        ativas = {}
+        vencedora = None
+        hedge_em = None
+        ultimo_erro = RuntimeError("Todos os backends de chat estão indisponíveis")
+        erro_limite = None  # o último 429: quem chamou pode esperar e repetir
+
+        def iniciar_proxima():
+            # o próximo backend com o disjuntor fechado (ou em teste)
+            nonlocal hedge_em
+            hedge_em = None
+            for backend in pendentes:
+                if backend.disjuntor.permite():
+                    tentativa = Tentativa(
+                        next(numeros), backend, messages, fila, stop, **kwargs
+                    )
+                    ativas[tentativa.indice] = tentativa
+                    atraso = self.atraso_hedge(backend)
+                    if atraso is not None:
+                        hedge_em = tentativa.inicio + atraso
+                    return True
+            return False
+
+        def descartar(tentativa, falhou):
+            tentativa.cancelada.set()
+            del ativas[tentativa.indice]
+            if falhou:
+                tentativa.backend.disjuntor.falha()
+            else:
+                tentativa.backend.disjuntor.liberar()
+
+        if not iniciar_proxima():
+            raise ultimo_erro
+        try:
+            while True:
+                prazos = [tentativa.prazo() for tentativa in ativas.values()]
+                if vencedora is None and hedge_em is not None:
+                    prazos.append(hedge_em)
+                try:
+                    evento, indice, dado = fila.get(
+                        timeout=max(0.0, min(prazos) - time.monotonic())
+                    )
+                except queue.Empty:
+                    agora = time.monotonic()
+                    for tentativa in list(ativas.values()):
+                        if agora >= tentativa.prazo():
+                            ultimo_erro = TimeoutError(
+                                f"{tentativa.backend.nome}: sem resposta em "
+                                f"{tentativa.backend.timeout:.1f}s"
+                            )
+                            descartar(tentativa, falhou=True)
+                    if vencedora is not None:
+                        if vencedora.indice not in ativas:
+                            raise ultimo_erro
+                    elif not ativas or (hedge_em is not None and agora >= hedge_em):
+                        # fallback (nenhuma ativa) ou hedging (a ativa demorou)
+                        if not iniciar_proxima() and not ativas:
+                            raise ultimo_erro
+                    continue
+
+                tentativa = ativas.get(indice)
+                if tentativa is None:
+                    continue  # evento de uma tentativa já descartada
+                if evento == "erro":
+                    ultimo_erro = dado
+                    limite = eh_limite_de_taxa(dado)
+                    if limite:
+                        erro_limite = dado
+                    descartar(tentativa, falhou=not limite)
+                    if tentativa is vencedora:
+                        raise dado
+                    if not ativas and not iniciar_proxima():
+                        raise erro_limite or dado
+                    continue
+                if evento == "fim":
+                    del ativas[indice]
+                    tentativa.backend.disjuntor.sucesso()
+                    return
+
+                tentativa.ultimo_pedaco = time.monotonic()
+                if vencedora is None:
+                    vencedora = tentativa
+                    tentativa.backend.latencias.append(
+                        tentativa.ultimo_pedaco - tentativa.inicio
+                    )
+                    for outra in list(ativas.values()):
+                        if outra is not tentativa:
+                            descartar(outra, falhou=False)
+                    dado.response_metadata["backend"] = tentativa.backend.nome
+                pedaco = ChatGenerationChunk(message=dado)
+                if run_manager:
+                    run_manager.on_llm_new_token(dado.content, chunk=pedaco)
+                yield pedaco
+        finally:
+            # quem parou de ler o stream no meio cancela as que sobraram
+            for tentativa in list(ativas.values()):
+                descartar(tentativa, falhou=False)
+
+
+def ler_timeouts():
+    """Timeouts por backend de LLM_TIMEOUTS, ex.: "groq=10,openai=20"."""
+    timeouts = {}
+    for item in os.getenv("LLM_TIMEOUTS", "").split(","):
+        if "=" in item:
+            nome, segundos = item.split("=", 1)
+            timeouts[nome.strip()] = float(segundos)
+    return timeouts
+
+
+def criar_modelo(nome, temperatura=0.1, timeout=None):
+    """Cliente de chat do backend `nome` (groq, openai ou local)."""
+    if nome == "local":
+        from modelos_locais import ChatLocal
+
+        return ChatLocal()
+    if nome not in CHAVES:
+        raise ValueError(
+            f"Backend de chat desconhecido: {nome} (use groq, openai ou local)"
+        )
+    chave = os.getenv(CHAVES[nome])
+    if not chave:
+        raise ValueError(f"{CHAVES[nome]} não configurada no arquivo .env")
+    if nome == "groq":
+        from langchain_groq import ChatGroq
+
+        return ChatGroq(
+            temperature=temperatura, model=modelo_chat(), api_key=chave, timeout=timeout
+        )
+    from langchain_openai import ChatOpenAI
+
+    return ChatOpenAI(
+        temperature=temperatura,
+        model=os.getenv("LLM_MODEL", "gpt-3.5-turbo"),
+        api_key=chave,
+        timeout=timeout,
+        # o roteador sempre usa streaming: sem isso não vêm os tokens (e os do cache)
+        stream_usage=True,
+    )
+
+
+def criar_roteador(temperatura=0.1, nomes=None):
+    """Roteador com os backends de LLM_BACKENDS (ex.: "groq,openai,local").
+
+    Sem LLM_BACKENDS, usa os de BACKENDS_PADRAO que têm chave no .env. O
+    hedging só é ligado com LLM_HEDGE_PERCENTIL (padrão 0, desligado).
+    """
+    if nomes is None:
+        nomes = [n.strip() for n in os.getenv("LLM_BACKENDS", "").split(",")]
+        nomes = [nome for nome in nomes if nome]
+    if not nomes:
+        nomes = [nome for nome in BACKENDS_PADRAO if os.getenv(CHAVES[nome])]
+    if not nomes:
+        raise ValueError(
+            "Nenhum backend de chat configurado: defina GROQ_API_KEY, "
+            "OPENAI_API_KEY ou LLM_BACKENDS no arquivo .env"
+        )
+    timeouts = ler_timeouts()
+    backends = []
+    for nome in nomes:
+        timeout = timeouts.get(nome)
+        backends.append(
+            BackendChat(nome, criar_modelo(nome, temperatura, timeout), timeout)
+        )
+    return RoteadorLLM(
+        backends=backends,
+        percentil_hedge=float(os.getenv("LLM_HEDGE_PERCENTIL", HEDGE_PERCENTIL)),
+        atraso_hedge_padrao=float(
+            os.getenv("LLM_HEDGE_ATRASO_S", HEDGE_ATRASO_PADRAO_S)
+        ),
+    )
@@ -0,0 +1,328 @@
+import argparse
+import json
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+from flask import Flask, Response, jsonify, request
+
+from cache_respostas import CacheRespostas
+from colecoes import GerenciadorColecoes
+from db import COLECAO_PADRAO, caminhos_colecao, listar_colecoes
+from filtros import FiltroBusca
+from rag import (
+    BUSCAS,
+    buscar_em_colecoes,
+    criar_chain,
+    gerar_resposta,
+    modelo_chat,
+    montar_contexto,
+)
+from rastreamento import ExportadorJsonl, Rastreamento
+from reranqueamento import CacheScores, carregar_reranqueador
+
+load_dotenv()
+
+# Configurações
+CAMINHO_DB = "db"
+HOST = "127.0.0.1"
+PORTA = 8765
+TRABALHADORES = 8
+RESPOSTA_SEM_CONTEXTO = (
+    "Não encontrei informações relevantes para sua pergunta "
+    "nos documentos disponíveis."
+)
+
+
+class ServicoRAG:
+    """Mantém coleções, índices BM25 e clientes dos modelos abertos entre consultas.
+
+    As consultas rodam em um pool de `trabalhadores` threads. Cada coleção é
+    aberta na primeira consulta e reaberta sozinha quando `python db.py` gera
+    uma nova versão do índice; ver colecoes.py. Sem `reranqueador`, usa o de
+    RERANQUEADOR_MODELO (se houver).
+    """
+
+    def __init__(
+        self,
+        caminho_db=CAMINHO_DB,
+        trabalhadores=TRABALHADORES,
+        embeddings=None,
+        chat=None,
+        exportadores=None,
+        reranqueador=None,
+        memoria_maxima_mb=None,
+    ):
+        self.caminho_db = caminho_db
+        self.trabalhadores = trabalhadores
+        self.chat = chat
+        self.exportadores = (
+            [ExportadorJsonl()] if exportadores is None else list(exportadores)
+        )
+        self.colecoes = GerenciadorColecoes(
+            embeddings, caminho_padrao=caminho_db, memoria_maxima_mb=memoria_maxima_mb
+        )
+        self.cache = CacheRespostas()
+        self.reranqueador = reranqueador or carregar_reranqueador()
+        self.cache_scores = CacheScores()
+        self.executor = ThreadPoolExecutor(
+            max_workers=trabalhadores, thread_name_prefix="consulta"
+        )
+        self.em_andamento = 0
+        self._chains = {}
+        self._lock = threading.Lock()
+        self._lock_contador = threading.Lock()
+
+    def _chain(self, temperatura):
+        with self._lock:
+            if temperatura not in self._chains:
+                self._chains[temperatura] = criar_chain(temperatura, chat=self.chat)
+            return self._chains[temperatura]
+
+    def saude(self):
+        """Estado do serviço; os números de documentos são da coleção padrão."""
+        padrao = self.colecoes.obter(COLECAO_PADRAO)
+        return {
+            "status": "ok",
+            **padrao.resumo(),
+            "reranqueador": getattr(self.reranqueador, "nome", None),
+            "versao_indice": padrao.versao,
+            "colecoes": listar_colecoes(),
+            "colecoes_abertas": self.colecoes.abertas(),
+            "memoria_colecoes_mb": round(self.colecoes.memoria_bytes() / 2**20, 1),
+            "trabalhadores": self.trabalhadores,
+            "em_andamento": self.em_andamento,
+        }
+
+    def enviar(self, *args, **kwargs):
+        """Agenda `responder` no pool de trabalhadores e retorna o Future."""
+        return self.executor.submit(self.responder, *args, **kwargs)
+
+    def responder(
+        self,
+        pergunta,
+        k_docs=4,
+        temperatura=0.1,
+        busca="vetorial",
+        relevancia_minima=None,
+        reranquear=False,
+        colecoes=None,
+        ao_receber_token=None,
+        filtro=None,
+    ):
+        """Responde uma pergunta. Retorna um dict pronto para virar JSON.
+
+        `colecoes` é a lista de coleções consultadas (padrão: a padrão), com os
+        k melhores trechos de todas juntos. `reranquear` só tem efeito com um
+        reranqueador carregado. `filtro` (um FiltroBusca) restringe os trechos
+        por arquivo, página e data de indexação.
+        """
+        if busca not in BUSCAS:
+            raise ValueError(f"busca deve ser uma de {', '.join(BUSCAS)}")
+        abertas = self.colecoes.obter_varias(colecoes)
+        reranqueador = self.reranqueador if reranquear else None
+        with self._lock_contador:
+            self.em_andamento += 1
+        rastreamento = Rastreamento(
+            "servico", self.exportadores, atributos={"modelo": modelo_chat()}
+        )
+        try:
+            # as versões das coleções consultadas entram na chave: reindexar uma
+            # coleção não descarta as respostas das outras
+            versoes = tuple((colecao.nome, colecao.versao) for colecao in abertas)
+            parametros = (
+                k_docs,
+                temperatura,
+                modelo_chat(),
+                busca,
+                relevancia_minima,
+                reranqueador is not None,
+                versoes,
+                filtro.chave() if filtro else None,
+            )
+            with rastreamento.etapa("embedding"):
+                vetor = abertas[0].db.embeddings.embed_query(pergunta)
+            with rastreamento.etapa("cache_respostas"):
+                em_cache = self.cache.buscar(pergunta, None, parametros, vetor)
+            if em_cache is not None:
+                rastreamento.atributos["cache"] = True
+                resultado = dict(em_cache, cache=True)
+                if ao_receber_token is not None:
+                    ao_receber_token(resultado["resposta"])
+                return self._finalizar(resultado, rastreamento, None)
+
+            resultados = buscar_em_colecoes(
+                pergunta,
+                abertas,
+                k_docs,
+                busca=busca,
+                relevancia_minima=relevancia_minima,
+                vetor=vetor,
+                reranqueador=reranqueador,
+                cache=self.cache_scores,
+                rastreamento=rastreamento,
+                filtro=filtro,
+            )
+
+            if not resultados:
+                resultado = {
+                    "resposta": RESPOSTA_SEM_CONTEXTO,
+                    "fontes": [],
+                    "sem_contexto": True,
+                }
+                return self._finalizar(resultado, rastreamento, None)
+
+            contexto, fontes = montar_contexto(resultados, rastreamento)
+            inicio_llm = time.perf_counter() - rastreamento.inicio
+            resposta, primeiro_token = gerar_resposta(
+                self._chain(temperatura),
+                pergunta,
+                contexto,
+                ao_receber_token=ao_receber_token,
+                rastreamento=rastreamento,
+            )
+            resultado = {
+                "resposta": resposta,
+                "fontes": fontes,
+                "sem_contexto": False,
+            }
+            self.cache.guardar(pergunta, None, resultado, parametros, vetor)
+            return self._finalizar(
+                dict(resultado, cache=False), rastreamento, inicio_llm + primeiro_token
+            )
+        finally:
+            with self._lock_contador:
+                self.em_andamento -= 1
+
+    def _finalizar(self, resultado, rastreamento, primeiro_token):
+        rastreamento.finalizar()
+        total = rastreamento.duracao_ms / 1000
+        return dict(
+            resultado,
+            tempo_total=total,
+            tempo_primeiro_token=total if primeiro_token is None else primeiro_token,
+            etapas=rastreamento.etapas_ms(),
+            atributos=rastreamento.atributos,
+        )
+
+
+def ler_parametros(dados):
+    pergunta = (dados.get("pergunta") or "").strip()
+    if not pergunta:
+        raise ValueError("Informe a pergunta no campo 'pergunta'")
+    if dados.get("busca", "vetorial") not in BUSCAS:
+        raise ValueError(f"busca deve ser uma de {', '.join(BUSCAS)}")
+    relevancia_minima = dados.get("relevancia_minima")
+    return {
+        "pergunta": pergunta,
+        "k_docs": int(dados.get("k", 4)),
+        "temperatura": float(dados.get("temperatura", 0.1)),
+        "busca": dados.get("busca", "vetorial"),
+        "relevancia_minima": (
+            None if relevancia_minima is None else float(relevancia_minima)
+        ),
+        "reranquear": bool(dados.get("reranquear", False)),
+        "colecoes": ler_colecoes(dados.get("colecoes")),
+        # {"fontes": [...], "pagina_inicial": 0, "indexado_desde": "2025-03-01"}
+        "filtro": FiltroBusca.de_dict(dados.get("filtro")),
+    }
+
+
+def ler_colecoes(colecoes):
+    """Lista de coleções de "a,b" ou ["a", "b"]; None usa a padrão."""
+    if not colecoes:
+        return None
+    if isinstance(colecoes, str):
+        colecoes = colecoes.split(",")
+    colecoes = [str(nome).strip() for nome in colecoes if str(nome).strip()]
+    for nome in colecoes:
+        caminhos_colecao(nome)  # ValueError para nomes inválidos
+    return colecoes or None
+
+
+def evento(dados):
+    return f"data: {json.dumps(dados, ensure_ascii=False)}\n\n"
+
+
+def criar_app(servico=None):
+    """Cria o app Flask (também serve para gunicorn: 'servico:criar_app()')."""
+    servico = servico or ServicoRAG()
+    app = Flask(__name__)
+    app.json.ensure_ascii = False
+
+    @app.get("/health")
+    def health():
+        return jsonify(servico.saude())
+
+    @app.post("/ask")
+    def ask():
+        try:
+            parametros = ler_parametros(request.get_json(force=True) or {})
+            servico.colecoes.obter_varias(parametros["colecoes"])
+        except (TypeError, ValueError) as erro:
+            return jsonify({"erro": str(erro)}), 400
+        try:
+            return jsonify(servico.enviar(**parametros).result())
+        except Exception as erro:
+            return jsonify({"erro": f"{type(erro).__name__}: {erro}"}), 500
+
+    @app.post("/ask/stream")
+    def ask_stream():
+        """Server-sent events: {"tipo": "token", "texto": ...} e, no fim, "fim"."""
+        try:
+            parametros = ler_parametros(request.get_json(force=True) or {})
+            servico.colecoes.obter_varias(parametros["colecoes"])
+        except (TypeError, ValueError) as erro:
+            return jsonify({"erro": str(erro)}), 400
+
+        eventos = queue.Queue()
+        enviados = 0  # caracteres do texto parcial já enviados
+
+        def ao_receber_token(texto_parcial):
+            nonlocal enviados
+            novo = texto_parcial[enviados:]
+            if novo:
+                enviados = len(texto_parcial)
+                eventos.put({"tipo": "token", "texto": novo})
+
+        def concluir(futuro):
+            erro = futuro.exception()
+            if erro is not None:
+                mensagem = f"{type(erro).__name__}: {erro}"
+                eventos.put({"tipo": "erro", "erro": mensagem})
+            else:
+                eventos.put(dict(futuro.result(), tipo="fim"))
+
+        futuro = servico.enviar(**parametros, ao_receber_token=ao_receber_token)
+        futuro.add_done_callback(concluir)
+
+        def gerar():
+            while True:
+                dados = eventos.get()
+                yield evento(dados)
+                if dados["tipo"] != "token":
+                    return
+
+        return Response(
+            gerar(),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Serviço HTTP de perguntas, com banco e modelos já carregados."
+    )
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--porta", type=int, default=PORTA)
+    parser.add_argument("--trabalhadores", type=int, default=TRABALHADORES)
+    args = parser.parse_args()
+
+    servico = ServicoRAG(trabalhadores=args.trabalhadores)
+    print(f"Banco carregado: {servico.saude()['documentos']} chunks")
+    criar_app(servico).run(host=args.host, port=args.porta, threaded=True)
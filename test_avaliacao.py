@@ -0,0 +1,148 @@
+"""
+Testes da avaliação da busca (recall@k, MRR e varredura de parâmetros)
+Usa embeddings locais e páginas geradas na hora, sem acesso à rede
+"""
+
+import json
+import os
+
+import pytest
+from langchain_core.documents import Document
+
+import db
+from avaliacao import (
+    avaliar,
+    configuracao_chunks,
+    ler_perguntas,
+    mais_barata,
+    relevante,
+)
+from divisao_chunks import dividir_documentos
+from modelos_locais import EmbeddingsLocais
+
+ASSUNTOS = {
+    "tuplas": "tuplas são sequências imutáveis e não podem ser alteradas",
+    "listas": "listas são sequências mutáveis que aceitam append e remove",
+    "herança": "herança permite que classes filhas reaproveitem métodos da mãe",
+    "decoradores": "decoradores envolvem funções para acrescentar comportamento",
+}
+
+
+def paginas():
+    return [
+        Document(
+            page_content=f"{texto}. " + "texto de preenchimento " * 40,
+            metadata={"source": "base/curso.pdf", "page": i},
+        )
+        for i, texto in enumerate(ASSUNTOS.values())
+    ]
+
+
+def perguntas():
+    return [
+        {"pergunta": " ".join(texto.split()[:4]), "pagina": i}
+        for i, texto in enumerate(ASSUNTOS.values())
+    ]
+
+
+def test_rotulos(tmp_path):
+    metadados = {"source": "base/curso.pdf", "page": 2}
+    rotulo = {"trecho": "herança permite"}
+    assert relevante("c1", "A  herança\npermite", metadados, rotulo)
+    assert relevante("c1", "", metadados, {"fonte": "curso.pdf", "pagina": 2})
+    assert not relevante("c1", "", metadados, {"fonte": "curso.pdf", "pagina": 3})
+    assert not relevante("c1", "", metadados, {"chunk": "c2"})
+
+    arquivo = tmp_path / "perguntas.jsonl"
+    arquivo.write_text(json.dumps({"pergunta": "x"}) + "\n", encoding="utf-8")
+    with pytest.raises(ValueError):
+        ler_perguntas(str(arquivo))
+
+
+def test_varredura_de_parametros(monkeypatch):
+    monkeypatch.delenv("CHUNKS_TOKENS", raising=False)
+
+    linhas = avaliar(
+        paginas(),
+        perguntas(),
+        EmbeddingsLocais(dimensao=256),
+        "tokens",
+        tamanhos=[40, 400],
+        sobreposicoes=[0, 10, 40],
+        ks=[1, 4],
+        limiares=[-1.0, 1.1],
+        tamanho_lote=3,
+    )
+
+    # sobreposição do tamanho do chunk não é combinação válida
+    assert {(l["tamanho"], l["sobreposicao"]) for l in linhas} == {
+        (40, 0),
+        (40, 10),
+        (400, 0),
+        (400, 10),
+        (400, 40),
+    }
+    assert len(linhas) == 5 * 4
+    assert "CHUNKS_TOKENS" not in os.environ
+    por_chave = {
+        (l["tamanho"], l["sobreposicao"], l["k"], l["limiar"]): l for l in linhas
+    }
+    pequeno = por_chave[(40, 0, 1, -1.0)]
+    assert pequeno["chunks"] > por_chave[(400, 0, 1, -1.0)]["chunks"]
+    assert pequeno["recall_k"] == 1.0 and pequeno["mrr"] == 1.0
+    assert por_chave[(40, 0, 4, -1.0)]["tokens_contexto"] > pequeno["tokens_contexto"]
+    # acima de qualquer relevância possível, nenhuma pergunta tem resposta
+    assert por_chave[(40, 0, 1, 1.1)]["sem_resposta"] == 1.0
+    assert por_chave[(40, 0, 1, 1.1)]["recall_k"] == 0.0
+    assert pequeno["latencia"]["media_ms"] > 0
+
+    escolhida = mais_barata(linhas, recall_minimo=1.0)
+    assert escolhida["recall_k"] == 1.0 and escolhida["k"] == 1
+    assert escolhida["tokens_contexto"] == min(
+        l["tokens_contexto"] for l in linhas if l["recall_k"] == 1.0
+    )
+    assert mais_barata(linhas, recall_minimo=1.5) is None
+
+
+def test_rotulo_com_o_id_do_chunk_no_db():
+    with configuracao_chunks("tokens", 400, 0):
+        chunks = dividir_documentos(paginas(), "tokens")
+    ids = db.gerar_ids_chunks(chunks)
+    rotuladas = [
+        {"pergunta": pergunta["pergunta"], "chunk": ids[i]}
+        for i, pergunta in enumerate(perguntas())
+    ]
+    assert [chunk.metadata["page"] for chunk in chunks] == [0, 1, 2, 3]
+
+    (linha,) = avaliar(
+        paginas(),
+        rotuladas,
+        EmbeddingsLocais(dimensao=256),
+        "tokens",
+        tamanhos=[400],
+        sobreposicoes=[0],
+        ks=[4],
+        limiares=[-1.0],
+    )
+
+    assert linha["recall_k"] == 1.0 and linha["mrr"] == 1.0
+
+
+def test_varredura_na_estrategia_configurada(monkeypatch):
+    monkeypatch.delenv("CHUNKS_ESTRATEGIA", raising=False)
+    monkeypatch.setenv("CHUNKS_CARACTERES", "300")
+    monkeypatch.setenv("CHUNKS_SOBREPOSICAO_CARACTERES", "50")
+    embeddings = EmbeddingsLocais(dimensao=64)
+
+    (atual,) = avaliar(paginas(), perguntas(), embeddings, ks=[1], limiares=[0])
+    pequeno, grande = avaliar(
+        paginas(), perguntas(), embeddings, tamanhos=[150, 3000], ks=[1], limiares=[0]
+    )
+
+    # o padrão é "caracteres", com o tamanho e a sobreposição do .env
+    assert (atual["estrategia"], atual["tamanho"]) == ("caracteres", 300)
+    assert atual["sobreposicao"] == 50 == pequeno["sobreposicao"]
+    assert pequeno["chunks"] > atual["chunks"] > grande["chunks"] == 4
+    assert os.environ["CHUNKS_CARACTERES"] == "300"
+    with pytest.raises(ValueError, match="paginas"):
+        avaliar(paginas(), perguntas(), embeddings, "paginas")
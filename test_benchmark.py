@@ -0,0 +1,88 @@
+"""
+Testes do benchmark e dos modelos locais usados nele
+"""
+
+import numpy as np
+
+import benchmark
+import rag
+from cache_paginas import CachePaginas, hash_arquivo
+from latencias import percentis
+from modelos_locais import ChatLocal, EmbeddingsLocais
+
+
+def test_embeddings_locais_sao_deterministicos_e_semanticos():
+    embeddings = EmbeddingsLocais(dimensao=64)
+    heranca, heranca_python, tupla = embeddings.embed_documents(
+        ["herança em Python", "o que é herança em Python?", "tuplas são imutáveis"]
+    )
+
+    assert embeddings.embed_query("herança em Python") == heranca
+    assert np.dot(heranca, heranca_python) > np.dot(heranca, tupla)
+
+
+def test_chat_local_gera_a_mesma_resposta_com_e_sem_streaming():
+    chain = rag.criar_chain(chat=ChatLocal(tokens_resposta=8))
+    parciais = []
+
+    completa, _ = rag.gerar_resposta(chain, "pergunta", "contexto")
+    em_streaming, _ = rag.gerar_resposta(
+        chain, "pergunta", "contexto", ao_receber_token=parciais.append
+    )
+
+    assert completa == em_streaming == parciais[-1]
+    assert parciais[0] == "Resposta" and len(parciais) >= 8
+
+
+def test_percentis():
+    resumo = percentis([0.001 * i for i in range(1, 101)])
+
+    assert round(resumo["p50_ms"], 1) == 50.5
+    assert round(resumo["p99_ms"], 2) == 99.01
+    assert percentis([])["p95_ms"] == 0.0
+
+
+def test_cenario_pequeno(tmp_path, monkeypatch):
+    parametros = {
+        "consultas": 5,
+        "concorrencia": 2,
+        "k": 2,
+        "backend": "local",
+        "latencia_embeddings": 0.0,
+        "latencia_por_texto": 0.0,
+        "latencia_primeiro_token": 0.0,
+        "latencia_por_token": 0.0,
+        "tokens_resposta": 5,
+    }
+    pasta_base = benchmark.db.PASTA_BASE
+    monkeypatch.setattr(benchmark.db, "PASTA_BASE", pasta_base)
+    monkeypatch.setattr(benchmark.db, "CAMINHO_DB", benchmark.db.CAMINHO_DB)
+    monkeypatch.setattr(benchmark.db, "criar_embeddings", benchmark.db.criar_embeddings)
+    monkeypatch.setenv("CACHE_PAGINAS_PASTA", str(tmp_path / "paginas"))
+
+    cenario = benchmark.executar_cenario(2, parametros)
+
+    assert cenario["chunks"] > 0
+    assert cenario["consultas"]["total"] == 5
+    assert cenario["consultas"]["latencia"]["p99_ms"] >= 0
+    assert cenario["pico_rss_mb"] > 0
+    assert cenario["ingestao"]["cache_paginas"] == "frio"
+    # o cache de páginas do usuário não é lido nem escrito
+    assert not (tmp_path / "paginas").exists()
+
+    # o cenário aponta o db.py para a pasta temporária dele (feito para rodar
+    # num processo novo): a base volta antes do segundo
+    monkeypatch.setattr(benchmark.db, "PASTA_BASE", pasta_base)
+    quente = benchmark.executar_cenario(2, dict(parametros, cache_paginas="quente"))
+    assert quente["ingestao"]["cache_paginas"] == "quente"
+    assert quente["chunks"] == cenario["chunks"]
+
+
+def test_copias_do_corpus_tem_conteudos_diferentes(tmp_path):
+    benchmark.montar_corpus(tmp_path, 2)
+    pdfs = sorted(tmp_path.glob("*.pdf"))
+
+    assert hash_arquivo(pdfs[0]) != hash_arquivo(pdfs[1])
+    # o PDF continua legível com o comentário no fim
+    paginas = CachePaginas(str(tmp_path / "paginas")).paginas(str(pdfs[1]))
+    assert paginas and paginas[0].page_content.strip()
@@ -0,0 +1,76 @@
+"""
+Testes do cache de embeddings em disco
+"""
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from cache_embeddings import EmbeddingsComCache
+
+
+class EmbeddingsContados(DeterministicFakeEmbedding):
+    chamadas: int = 0
+    textos: int = 0
+
+    def embed_documents(self, texts):
+        self.chamadas += 1
+        self.textos += len(texts)
+        return super().embed_documents(texts)
+
+    def embed_query(self, text):
+        self.chamadas += 1
+        return super().embed_query(text)
+
+
+def test_textos_repetidos_nao_voltam_ao_provedor(tmp_path):
+    base = EmbeddingsContados(size=8)
+    cache = EmbeddingsComCache(base, caminho=str(tmp_path / "cache.sqlite3"))
+
+    primeira = cache.embed_documents(["lista", "tupla", "lista"])
+    assert base.textos == 2
+
+    segunda = cache.embed_documents(["tupla", "lista"])
+    assert base.textos == 2
+    assert segunda == [primeira[1], primeira[0]]
+
+    # a pergunta do usuário também aproveita o cache
+    assert cache.embed_query("lista") == primeira[0]
+    assert base.chamadas == 1
+
+
+def test_cache_persiste_entre_instancias(tmp_path):
+    caminho = str(tmp_path / "cache.sqlite3")
+    vetor = EmbeddingsComCache(EmbeddingsContados(size=8), caminho=caminho).embed_query(
+        "dicionário"
+    )
+
+    base = EmbeddingsContados(size=8)
+    assert EmbeddingsComCache(base, caminho=caminho).embed_query("dicionário") == vetor
+    assert base.chamadas == 0
+
+
+def test_modelos_diferentes_nao_compartilham_entradas(tmp_path):
+    caminho = str(tmp_path / "cache.sqlite3")
+    EmbeddingsComCache(EmbeddingsContados(size=8), caminho=caminho).embed_query("set")
+
+    outro = EmbeddingsContados(size=8)
+    cache = EmbeddingsComCache(outro, caminho=caminho)
+    cache.modelo = "outro-modelo"
+    cache.embed_query("set")
+    assert outro.chamadas == 1
+
+
+def test_descarta_menos_usados_recentemente(tmp_path):
+    base = EmbeddingsContados(size=8)
+    cache = EmbeddingsComCache(base, caminho=str(tmp_path / "cache.sqlite3"), max_itens=2)
+
+    cache.embed_query("a")
+    cache.embed_query("b")
+    cache.embed_query("a")  # "a" passa a ser o mais recente
+    cache.embed_query("c")  # descarta "b"
+    assert len(cache) == 2
+
+    chamadas = base.chamadas
+    cache.embed_query("a")
+    assert base.chamadas == chamadas
+    cache.embed_query("b")
+    assert base.chamadas == chamadas + 1
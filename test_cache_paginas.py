@@ -0,0 +1,69 @@
+"""
+Testes do cache de páginas extraídas dos PDFs
+Usa PDFs gerados na hora, sem acesso à rede
+"""
+
+import os
+
+import cache_paginas
+from cache_paginas import CachePaginas
+from test_db import criar_pdf
+
+
+def test_hash_so_e_recalculado_quando_o_arquivo_muda(tmp_path, monkeypatch):
+    calculados = []
+    hash_original = cache_paginas.hash_arquivo
+
+    def contar(caminho):
+        calculados.append(caminho)
+        return hash_original(caminho)
+
+    monkeypatch.setattr(cache_paginas, "hash_arquivo", contar)
+    pdf = tmp_path / "a.pdf"
+    criar_pdf(pdf, ["Listas sao mutaveis."])
+    cache = CachePaginas(str(tmp_path / "cache"))
+    primeiro = cache.impressao(str(pdf))
+    cache.salvar_impressoes()
+
+    assert CachePaginas(str(tmp_path / "cache")).impressao(str(pdf)) == primeiro
+    assert len(calculados) == 1
+
+    criar_pdf(pdf, ["Tuplas sao imutaveis e ordenadas."])
+    os.utime(pdf, ns=(1, 1))
+    assert CachePaginas(str(tmp_path / "cache")).impressao(str(pdf)) != primeiro
+    assert len(calculados) == 2
+
+
+def test_arquivo_corrompido_e_extraido_de_novo(tmp_path):
+    pdf = tmp_path / "a.pdf"
+    criar_pdf(pdf, ["Listas sao mutaveis."])
+    cache = CachePaginas(str(tmp_path / "cache"))
+    paginas = cache.paginas(str(pdf))
+    [arquivo] = (tmp_path / "cache").glob("*.arrow")
+
+    arquivo.write_bytes(b"corrompido")
+    novamente = CachePaginas(str(tmp_path / "cache")).paginas(str(pdf))
+
+    assert [p.page_content for p in novamente] == [p.page_content for p in paginas]
+    assert novamente[0].metadata["source"] == str(pdf)
+    assert arquivo.read_bytes().startswith(b"ARROW1")
+
+
+def test_paginas_gravadas_em_lotes_e_lidas_lote_a_lote(tmp_path, monkeypatch):
+    import pyarrow as pa
+    from langchain_core.documents import Document
+
+    monkeypatch.setattr(cache_paginas, "PAGINAS_POR_LOTE", 2)
+    cache = CachePaginas(str(tmp_path))
+    paginas = [
+        Document(page_content=f"pagina {i}", metadata={"source": "x.pdf", "page": i})
+        for i in range(3)
+    ]
+    arquivo = str(tmp_path / "a.arrow")
+    cache._gravar(arquivo, paginas)
+
+    with pa.memory_map(arquivo) as entrada:
+        assert pa.ipc.open_file(entrada).num_record_batches == 2
+    lidas = cache._ler(arquivo, "base/a.pdf")
+    assert [p.page_content for p in lidas] == ["pagina 0", "pagina 1", "pagina 2"]
+    assert [p.metadata for p in lidas][2] == {"source": "base/a.pdf", "page": 2}
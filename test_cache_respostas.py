@@ -0,0 +1,70 @@
+"""
+Testes do cache de respostas (exato e semântico)
+"""
+
+from cache_respostas import CacheRespostas, normalizar_pergunta
+
+
+class Relogio:
+    def __init__(self):
+        self.agora = 0.0
+
+    def __call__(self):
+        return self.agora
+
+
+def test_normalizacao_ignora_caixa_acentos_e_pontuacao():
+    assert normalizar_pergunta("  O que é   HERANÇA?? ") == "o que e heranca"
+
+
+def test_pergunta_normalizada_igual_e_atendida_pelo_cache():
+    cache = CacheRespostas()
+    cache.guardar("O que é herança?", versao=1, valor="resposta")
+
+    assert cache.buscar("o que e heranca", versao=1) == "resposta"
+    assert cache.buscar("O que é polimorfismo?", versao=1) is None
+
+
+def test_pergunta_quase_identica_usa_similaridade():
+    cache = CacheRespostas(limiar=0.9)
+    cache.guardar("O que é herança?", 1, "resposta", vetor=[1.0, 0.0, 0.0])
+
+    assert cache.buscar("Explique herança", 1, vetor=[0.99, 0.1, 0.0]) == "resposta"
+    assert cache.buscar("O que é uma tupla?", 1, vetor=[0.0, 1.0, 0.0]) is None
+
+
+def test_parametros_diferentes_nao_compartilham_respostas():
+    cache = CacheRespostas()
+    cache.guardar("pergunta", 1, "k=4", parametros=(4,), vetor=[1.0, 0.0])
+
+    assert cache.buscar("pergunta", 1, parametros=(8,), vetor=[1.0, 0.0]) is None
+
+
+def test_entradas_expiram_apos_ttl():
+    relogio = Relogio()
+    cache = CacheRespostas(ttl=60, relogio=relogio)
+    cache.guardar("pergunta", 1, "resposta")
+
+    relogio.agora = 59
+    assert cache.buscar("pergunta", 1) == "resposta"
+    relogio.agora = 61
+    assert cache.buscar("pergunta", 1) is None
+
+
+def test_nova_versao_do_indice_invalida_o_cache():
+    cache = CacheRespostas()
+    cache.guardar("pergunta", 1, "resposta")
+
+    assert cache.buscar("pergunta", 2) is None
+    assert len(cache) == 0
+
+
+def test_limite_de_itens_descarta_o_menos_usado():
+    cache = CacheRespostas(max_itens=2)
+    cache.guardar("a", 1, "A")
+    cache.guardar("b", 1, "B")
+    cache.buscar("a", 1)
+    cache.guardar("c", 1, "C")
+
+    assert cache.buscar("b", 1) is None
+    assert cache.buscar("a", 1) == "A"
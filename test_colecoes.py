@@ -0,0 +1,100 @@
+"""
+Testes das coleções: abertura sob demanda, descarte por memória e busca em várias
+Usa índices locais em pastas temporárias, sem acesso à rede
+"""
+
+import warnings
+
+import pytest
+
+from colecoes import GerenciadorColecoes
+from db import listar_colecoes
+from indice_lexico import IndiceLexico
+from indice_local import IndiceLocal
+from modelos_locais import ChatLocal, EmbeddingsLocais
+from rag import buscar_em_colecoes
+from servico import ServicoRAG, criar_app
+
+TEXTOS = {
+    "python": ["herança permite reaproveitar classes", "tuplas são imutáveis"],
+    "django": ["views do django recebem requisições", "herança de templates"],
+}
+
+
+@pytest.fixture
+def pasta_colecoes(tmp_path, monkeypatch):
+    warnings.filterwarnings("ignore", message="Relevance scores must be between")
+    monkeypatch.setenv("BANCO_VETORIAL", "local")
+    monkeypatch.setenv("COLECOES_PASTA", str(tmp_path))
+    embeddings = EmbeddingsLocais(dimensao=64)
+    for nome, textos in TEXTOS.items():
+        caminho = tmp_path / nome / "db"
+        indice = IndiceLocal(str(caminho), embeddings)
+        ids = indice.add_texts(textos, metadatas=[{"source": f"{nome}.pdf"}] * 2)
+        indice.salvar()
+        IndiceLexico.construir(zip(ids, textos)).salvar(str(caminho))
+    return tmp_path
+
+
+def test_abre_sob_demanda_e_descarta_a_menos_usada(pasta_colecoes):
+    gerenciador = GerenciadorColecoes(EmbeddingsLocais(dimensao=64))
+    assert gerenciador.abertas() == []
+
+    python = gerenciador.obter("python")
+    assert gerenciador.obter("python") is python
+    assert python.indice_lexico is not None and python.memoria_bytes > 0
+
+    # um limite menor que duas coleções: a usada há mais tempo é fechada
+    gerenciador.memoria_maxima_mb = 1.5 * python.memoria_bytes / (1024 * 1024)
+    gerenciador.obter("django")
+    assert gerenciador.abertas() == ["django"]
+    assert gerenciador.obter("python") is not python
+
+    assert "python" in listar_colecoes() and "django" in listar_colecoes()
+    with pytest.raises(ValueError):
+        gerenciador.obter("nao_existe")
+    with pytest.raises(ValueError):
+        gerenciador.obter("../db")
+
+
+def test_busca_em_varias_colecoes_junta_os_melhores(pasta_colecoes):
+    gerenciador = GerenciadorColecoes(EmbeddingsLocais(dimensao=64))
+    colecoes = gerenciador.obter_varias(["python", "django", "python"])
+
+    for busca in ("vetorial", "hibrida"):
+        resultados = buscar_em_colecoes("herança", colecoes, k_docs=3, busca=busca)
+
+        assert len(resultados) == 3
+        assert {doc.metadata["colecao"] for doc, _ in resultados} == {
+            "python",
+            "django",
+        }
+        scores = [score for _, score in resultados]
+        assert scores == sorted(scores, reverse=True)
+    # os documentos do índice não são alterados
+    doc = colecoes[0].db.similarity_search("herança", k=1)[0]
+    assert "colecao" not in doc.metadata
+
+
+def test_servico_escolhe_as_colecoes(pasta_colecoes):
+    servico = ServicoRAG(
+        caminho_db=str(pasta_colecoes / "python" / "db"),
+        trabalhadores=1,
+        embeddings=EmbeddingsLocais(dimensao=64),
+        chat=ChatLocal(tokens_resposta=3),
+        exportadores=[],
+    )
+    app = criar_app(servico).test_client()
+
+    resposta = app.post(
+        "/ask", json={"pergunta": "herança", "k": 4, "colecoes": "python,django"}
+    )
+
+    assert resposta.status_code == 200
+    fontes = resposta.get_json()["fontes"]
+    assert {fonte["colecao"] for fonte in fontes} == {"python", "django"}
+    for colecoes in ("outra", "../db"):
+        erro = app.post("/ask", json={"pergunta": "x", "colecoes": colecoes})
+        assert erro.status_code == 400
+    abertas = app.get("/health").get_json()["colecoes_abertas"]
+    assert {"python", "django"} <= set(abertas)
@@ -0,0 +1,122 @@
+"""
+Testes das variantes comprimidas do índice local
+Usa vetores sintéticos e embeddings locais, sem acesso à rede
+"""
+
+import os
+
+import numpy as np
+import pytest
+
+import db
+from compressao import (
+    carregar_variante,
+    comparar_variantes,
+    construir_variante,
+    ler_variante,
+    salvar_variante,
+)
+from filtros import FiltroBusca
+from indice_local import IndiceLocal
+from modelos_locais import EmbeddingsLocais
+from test_db import criar_pdf
+
+DIMENSAO = 64
+
+
+def criar_indice(caminho, total=600):
+    """Índice com vetores em poucos grupos, como os de textos parecidos."""
+    rng = np.random.default_rng(1)
+    centros = rng.normal(size=(12, DIMENSAO))
+    vetores = centros[rng.integers(0, len(centros), total)]
+    vetores = vetores + 0.4 * rng.normal(size=(total, DIMENSAO))
+    indice = IndiceLocal(str(caminho), EmbeddingsLocais(dimensao=DIMENSAO))
+    indice.upsert_vetores(
+        [f"id{i}" for i in range(total)],
+        vetores.astype(np.float32),
+        [{"source": f"doc{i % 3}.pdf", "page": i % 7} for i in range(total)],
+        [f"texto {i}" for i in range(total)],
+    )
+    indice.salvar()
+    consultas = vetores[:40] + 0.2 * rng.normal(size=(40, DIMENSAO))
+    return indice, consultas.astype(np.float32)
+
+
+def test_reordenar_em_precisao_total_recupera_o_recall(tmp_path):
+    indice, consultas = criar_indice(tmp_path)
+
+    linhas = comparar_variantes(
+        indice, consultas, ["dim-16", "pca-8", "pq-8"], k=10, fator=10
+    )
+
+    completo, *variantes = linhas
+    assert completo["variante"] == "completo" and completo["recall_k"] == 1.0
+    for linha in variantes:
+        assert linha["recall_k"] >= 0.9, linha
+        assert linha["recall_k"] >= linha["recall_sem_reordenar"]
+        assert linha["bytes_por_vetor"] < completo["bytes_por_vetor"]
+    assert indice.variante is None
+    with pytest.raises(ValueError):
+        ler_variante("pca-x")
+
+
+def test_variante_salva_e_busca_filtrada(tmp_path):
+    indice, consultas = criar_indice(tmp_path)
+    salvar_variante(str(tmp_path), construir_variante("pq-8", indice))
+    with pytest.raises(ValueError, match="--comprimir pca-8"):
+        carregar_variante(str(tmp_path), "pca-8")
+
+    comprimido = IndiceLocal(
+        str(tmp_path), EmbeddingsLocais(dimensao=DIMENSAO), variante="pq-8"
+    )
+    assert comprimido.variante.codigos.dtype == np.uint8
+    assert comprimido.variante.codigos.shape == (len(indice), 8)
+
+    filtro = FiltroBusca(["doc1.pdf"], 2, 4)
+    exatos = indice.buscar_por_vetores(consultas, 5, filtro=filtro)
+    aproximados = comprimido.buscar_por_vetores(consultas, 5, filtro=filtro)
+    for exato, aproximado in zip(exatos, aproximados):
+        for doc, _ in aproximado:
+            assert doc.metadata["source"] == "doc1.pdf"
+            assert 2 <= doc.metadata["page"] <= 4
+        # o primeiro é igual: as distâncias vêm da precisão total
+        assert aproximado[0] == exato[0]
+
+    # ao mudar as linhas, os códigos antigos deixam de valer
+    comprimido.delete(["id0"])
+    comprimido.salvar()
+    assert comprimido.variante is None
+
+
+def test_atualizar_db_gera_as_variantes(tmp_path, monkeypatch):
+    pasta_base = tmp_path / "base"
+    pasta_base.mkdir()
+    monkeypatch.setattr(db, "PASTA_BASE", str(pasta_base))
+    monkeypatch.setattr(db, "CAMINHO_DB", str(tmp_path / "db"))
+    monkeypatch.setenv("CACHE_PAGINAS_PASTA", str(tmp_path / "paginas"))
+    monkeypatch.delenv("INDICE_VARIANTE", raising=False)
+    monkeypatch.delenv("BANCO_VETORIAL", raising=False)
+    monkeypatch.setattr(db, "criar_embeddings", lambda: EmbeddingsLocais(dimensao=32))
+    criar_pdf(pasta_base / "a.pdf", ["Listas sao mutaveis e aceitam append."])
+    criar_pdf(pasta_base / "b.pdf", ["Tuplas sao imutaveis e guardam sequencias."])
+
+    db.atualizar_db(backend="local", max_processos=1, variantes=["dim-8", "pq-4"])
+    caminho = db.caminho_indice()
+    assert db.carregar_manifesto()["variantes"] == ["dim-8", "pq-4"]
+    assert os.path.exists(os.path.join(caminho, "indice_local_pq-4.npz"))
+    assert db.abrir_banco().variante.nome == "dim-8"
+    monkeypatch.setenv("INDICE_VARIANTE", "pq-4")
+    assert db.abrir_banco().variante.nome == "pq-4"
+    monkeypatch.setenv("INDICE_VARIANTE", db.SEM_VARIANTE)
+    assert db.abrir_banco().variante is None
+    monkeypatch.delenv("INDICE_VARIANTE")
+
+    # sem novos PDFs, só a lista de variantes mudou: um novo snapshot sem elas
+    db.atualizar_db(max_processos=1, variantes=[])
+    caminho = db.caminho_indice()
+    assert db.carregar_manifesto()["variantes"] == []
+    assert not [n for n in os.listdir(caminho) if n.startswith("indice_local_")]
+    assert db.abrir_banco().variante is None
+
+    with pytest.raises(ValueError, match="índice local"):
+        db.atualizar_db(backend="chroma", variantes=["pca-8"])
@@ -0,0 +1,65 @@
+"""
+Testes da montagem do contexto com limite de tokens
+"""
+
+from langchain_core.documents import Document
+
+import rag
+from contexto import contar_tokens, selecionar_trechos, unir_sobrepostos
+
+PAGINA = " ".join(f"palavra{i}" for i in range(400))
+
+
+def chunk(inicio, fim, score, pagina=1, fonte="base/a.pdf"):
+    texto = PAGINA[inicio:fim]
+    metadados = {"source": fonte, "page": pagina, "start_index": inicio}
+    return Document(page_content=texto, metadata=metadados, id=f"{inicio}"), score
+
+
+def test_une_chunks_sobrepostos_e_adjacentes_da_mesma_pagina():
+    espaco = PAGINA.index(" ", 1150)
+    resultados = [
+        chunk(500, espaco, 0.7),
+        chunk(0, 700, 0.9),
+        chunk(espaco + 1, 1500, 0.5),  # separado do anterior só pelo espaço
+        chunk(2500, 2800, 0.6),
+        chunk(0, 700, 0.8, pagina=2),
+    ]
+
+    unidos = sorted(unir_sobrepostos(resultados), key=lambda par: -par[1])
+
+    textos = [doc.page_content for doc, _ in unidos]
+    assert textos[0] == PAGINA[0:1500]
+    assert unidos[0][1] == 0.9
+    assert textos[1:] == [PAGINA[0:700], PAGINA[2500:2800]]
+    assert unidos[0][0].metadata["start_index"] == 0
+
+
+def test_remove_quase_duplicatas_de_outras_fontes():
+    doc, _ = chunk(0, 1000, 0.9)
+    copia = Document(page_content=doc.page_content + " fim", metadata={"page": 3})
+
+    trechos = selecionar_trechos([(doc, 0.9), (copia, 0.8)], max_tokens=0)
+
+    assert [score for _, score in trechos] == [0.9]
+
+
+def test_respeita_orcamento_em_ordem_de_relevancia():
+    resultados = [chunk(0, 800, 0.9), chunk(1600, 2400, 0.8), chunk(3000, 3200, 0.7)]
+    primeiro = contar_tokens(PAGINA[0:800]) + 20
+
+    trechos = selecionar_trechos(resultados, max_tokens=primeiro + 120)
+    total = sum(contar_tokens(doc.page_content) + 20 for doc, _ in trechos)
+
+    assert [score for _, score in trechos] == [0.9, 0.8]
+    assert trechos[1][0].page_content != PAGINA[1600:2400]  # cortado
+    assert total <= primeiro + 120
+
+
+def test_montar_contexto_nao_repete_a_sobreposicao():
+    contexto, fontes = rag.montar_contexto(
+        [chunk(0, 700, 0.9), chunk(500, 1200, 0.8)], max_tokens=0
+    )
+
+    assert len(fontes) == 1
+    assert contexto.count(PAGINA[500:700]) == 1
@@ -0,0 +1,70 @@
+"""
+Testes do armazém de conversas (SQLite e memória)
+"""
+
+import pytest
+
+from conversas import ConversasMemoria, ConversasSQLite, criar_armazem
+
+
+def fonte(id_trecho, conteudo, score=0.9):
+    return {
+        "id": id_trecho,
+        "conteudo": conteudo,
+        "fonte": "base/a.pdf",
+        "pagina": 1,
+        "score": score,
+        "colecao": None,
+    }
+
+
+@pytest.fixture(params=["sqlite", "memoria"])
+def conversas(request, tmp_path):
+    if request.param == "sqlite":
+        return ConversasSQLite(str(tmp_path / "conversas.sqlite3"), max_turnos=3)
+    return ConversasMemoria(max_turnos=3)
+
+
+def test_paginas_do_mais_recente_e_limite_de_turnos(conversas):
+    for i in range(5):
+        conversas.adicionar("aba", f"p{i}", f"r{i}", [], processing_time=i)
+    conversas.adicionar("outra", "x", "y")
+
+    assert conversas.contar("aba") == 3 and conversas.contar("outra") == 1
+    primeira = conversas.pagina("aba", 0, 2)
+    assert [t["pergunta"] for t in primeira] == ["p4", "p3"]
+    assert primeira[0]["processing_time"] == 4
+    assert [t["pergunta"] for t in conversas.pagina("aba", 1, 2)] == ["p2"]
+
+
+def test_fontes_guardadas_por_id_do_chunk(conversas):
+    conversas.adicionar("aba", "p1", "r1", [fonte("c1", "texto 1"), fonte("c2", "t2")])
+    conversas.adicionar("aba", "p2", "r2", [fonte("c1", "texto 1", score=0.5)])
+
+    turno = conversas.pagina("aba")[0]
+    assert turno["fontes"] == [
+        {"id": "c1", "fonte": "base/a.pdf", "pagina": 1, "score": 0.5, "colecao": None}
+    ]
+    assert len(conversas) == 2  # "c1" guardado uma vez para os dois turnos
+    assert conversas.trechos(["c1", "c2", "c9"]) == {"c1": "texto 1", "c2": "t2"}
+
+    # o texto sai junto com o último turno que cita o chunk
+    for i in range(3):
+        conversas.adicionar("aba", f"n{i}", "r", [fonte("c1", "texto 1")])
+    assert conversas.trechos(["c1", "c2"]) == {"c1": "texto 1"}
+    conversas.limpar("aba")
+    assert conversas.contar("aba") == 0 and len(conversas) == 0
+
+
+def test_historico_sobrevive_ao_reinicio(tmp_path, monkeypatch):
+    monkeypatch.setenv("CONVERSAS_CAMINHO", str(tmp_path / "c.sqlite3"))
+    criar_armazem().adicionar("aba", "p", "r", [fonte(None, "sem id")])
+
+    reaberto = criar_armazem()
+    turno = reaberto.pagina("aba")[0]
+    assert turno["pergunta"] == "p"
+    assert reaberto.trechos([turno["fontes"][0]["id"]]) == {
+        turno["fontes"][0]["id"]: "sem id"
+    }
+    with pytest.raises(ValueError):
+        criar_armazem("redis")
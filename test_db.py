@@ -0,0 +1,327 @@
+"""
+Testes da indexação incremental do db.py
+Usa embeddings falsos e PDFs gerados na hora, sem acesso à rede
+"""
+
+import os
+import shutil
+import threading
+import time
+
+import pytest
+from langchain_core.documents import Document
+from langchain_chroma.vectorstores import Chroma
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+import db
+from colecoes import GerenciadorColecoes
+
+
+def criar_pdf(caminho, linhas):
+    """Gera um PDF mínimo de uma página com as linhas de texto informadas."""
+    texto = " ".join(f"({linha}) Tj T*" for linha in linhas)
+    conteudo = f"BT /F1 12 Tf 14 TL 72 720 Td {texto} ET".encode("latin-1")
+    objetos = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+        b"/Resources << /Font << /F1 5 0 R >> >> /Contents 4 0 R >>",
+        b"<< /Length %d >>\nstream\n" % len(conteudo) + conteudo + b"\nendstream",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    pdf = b"%PDF-1.4\n"
+    offsets = []
+    for numero, objeto in enumerate(objetos, start=1):
+        offsets.append(len(pdf))
+        pdf += b"%d 0 obj\n" % numero + objeto + b"\nendobj\n"
+    inicio_xref = len(pdf)
+    pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objetos) + 1)
+    pdf += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    pdf += b"trailer\n<< /Size %d /Root 1 0 R >>\n" % (len(objetos) + 1)
+    pdf += b"startxref\n%d\n%%%%EOF\n" % inicio_xref
+    caminho.write_bytes(pdf)
+
+
+class EmbeddingsContados(DeterministicFakeEmbedding):
+    textos_vetorizados: int = 0
+
+    def embed_documents(self, texts):
+        EmbeddingsContados.textos_vetorizados += len(texts)
+        return super().embed_documents(texts)
+
+
+@pytest.fixture
+def ambiente(tmp_path, monkeypatch):
+    pasta_base = tmp_path / "base"
+    pasta_base.mkdir()
+    monkeypatch.setattr(db, "PASTA_BASE", str(pasta_base))
+    monkeypatch.setattr(db, "CAMINHO_DB", str(tmp_path / "db"))
+    monkeypatch.setenv("CACHE_PAGINAS_PASTA", str(tmp_path / "paginas"))
+    monkeypatch.setattr(db, "criar_embeddings", lambda: EmbeddingsContados(size=16))
+    EmbeddingsContados.textos_vetorizados = 0
+    return pasta_base
+
+
+def ids_no_banco():
+    banco = Chroma(
+        persist_directory=db.caminho_indice(),
+        embedding_function=EmbeddingsContados(size=16),
+    )
+    return set(banco.get()["ids"])
+
+
+def test_segunda_execucao_sem_mudancas_nao_vetoriza(ambiente):
+    criar_pdf(ambiente / "a.pdf", ["Listas sao mutaveis.", "Tuplas sao imutaveis."])
+    criar_pdf(ambiente / "b.pdf", ["Dicionarios mapeiam chaves em valores."])
+
+    db.create_db()
+    assert EmbeddingsContados.textos_vetorizados == 2
+    assert len(ids_no_banco()) == 2
+
+    EmbeddingsContados.textos_vetorizados = 0
+    db.create_db()
+    assert EmbeddingsContados.textos_vetorizados == 0
+    assert len(ids_no_banco()) == 2
+
+
+def test_arquivos_alterados_e_removidos(ambiente):
+    criar_pdf(ambiente / "a.pdf", ["Listas sao mutaveis."])
+    criar_pdf(ambiente / "b.pdf", ["Dicionarios mapeiam chaves em valores."])
+    db.create_db()
+    manifesto = db.carregar_manifesto()
+    ids_b = set(manifesto["arquivos"][str(ambiente / "b.pdf")]["chunks"])
+
+    criar_pdf(ambiente / "a.pdf", ["Listas sao mutaveis e ordenadas."])
+    (ambiente / "b.pdf").unlink()
+    EmbeddingsContados.textos_vetorizados = 0
+    db.create_db()
+
+    manifesto = db.carregar_manifesto()
+    assert list(manifesto["arquivos"]) == [str(ambiente / "a.pdf")]
+    assert EmbeddingsContados.textos_vetorizados == 1
+    ids_a = set(manifesto["arquivos"][str(ambiente / "a.pdf")]["chunks"])
+    assert ids_no_banco() == ids_a
+    assert not ids_b & ids_no_banco()
+
+
+def test_banco_sem_manifesto_e_reconstruido(ambiente):
+    criar_pdf(ambiente / "a.pdf", ["Listas sao mutaveis."])
+    chunks = db.split_documents(db.load_documents())
+    db.vetorizar_chunks(chunks)
+    assert len(ids_no_banco()) == 1
+
+    db.create_db()
+    assert ids_no_banco() == set(db.gerar_ids_chunks(chunks))
+
+
+def test_vetorizacao_em_lotes_com_requisicoes_limitadas(ambiente):
+    class EmbeddingsLentos(DeterministicFakeEmbedding):
+        def embed_documents(self, texts):
+            with trava:
+                tamanhos.append(len(texts))
+                simultaneas[0] += 1
+                simultaneas[1] = max(simultaneas[1], simultaneas[0])
+            time.sleep(0.01)
+            with trava:
+                simultaneas[0] -= 1
+            return super().embed_documents(texts)
+
+    trava = threading.Lock()
+    tamanhos = []
+    simultaneas = [0, 0]
+    banco = Chroma(
+        persist_directory=db.CAMINHO_DB, embedding_function=EmbeddingsLentos(size=16)
+    )
+    pares = (
+        (f"id-{i}", Document(page_content=f"texto {i}", metadata={"page": i}))
+        for i in range(20)
+    )
+
+    total = db.vetorizar_em_lotes(banco, pares, tamanho_lote=3, max_requisicoes=2)
+
+    assert total == 20
+    assert max(tamanhos) == 3 and sum(tamanhos) == 20
+    assert simultaneas[1] <= 2
+    assert len(ids_no_banco()) == 20
+
+
+def test_versao_do_indice_so_muda_quando_o_banco_muda(ambiente):
+    criar_pdf(ambiente / "a.pdf", ["Listas sao mutaveis."])
+    db.create_db()
+    versao = db.versao_indice()
+    assert versao is not None
+
+    db.create_db()
+    assert db.versao_indice() == versao
+
+    time.sleep(0.01)
+    criar_pdf(ambiente / "a.pdf", ["Listas sao mutaveis e ordenadas."])
+    db.create_db()
+    assert db.versao_indice() != versao
+
+
+def test_trocar_a_estrategia_de_divisao_redivide_o_arquivo(ambiente, monkeypatch):
+    criar_pdf(ambiente / "a.pdf", ["Listas sao mutaveis.", "Tuplas sao imutaveis."])
+    monkeypatch.setenv("CHUNKS_ESTRATEGIA", "caracteres")
+    db.create_db()
+    fonte = str(ambiente / "a.pdf")
+    assert db.carregar_manifesto()["arquivos"][fonte]["divisao"].startswith(
+        "caracteres/"
+    )
+
+    # o texto do chunk não muda: só os metadados são regravados, sem embeddings
+    EmbeddingsContados.textos_vetorizados = 0
+    monkeypatch.setenv("CHUNKS_ESTRATEGIA", "paginas")
+    db.create_db()
+
+    manifesto = db.carregar_manifesto()
+    assert manifesto["arquivos"][fonte]["divisao"].startswith("paginas/")
+    assert manifesto["arquivos"][fonte]["tokens"] > 0
+    assert EmbeddingsContados.textos_vetorizados == 0
+    banco = db.abrir_banco(EmbeddingsContados(size=16))
+    assert banco.get()["metadatas"][0]["estrategia"] == "paginas"
+
+
+def test_padrao_nao_redivide_indices_antigos(ambiente, monkeypatch, capsys):
+    monkeypatch.delenv("CHUNKS_ESTRATEGIA", raising=False)
+    criar_pdf(ambiente / "a.pdf", ["Listas sao mutaveis."])
+    db.create_db()
+    fonte = str(ambiente / "a.pdf")
+    # manifesto de antes das estratégias, sem a assinatura da divisão
+    manifesto = db.carregar_manifesto()
+    del manifesto["arquivos"][fonte]["divisao"]
+    db.salvar_manifesto(manifesto)
+    capsys.readouterr()
+
+    db.create_db()
+    assert "0 chunks vetorizados" in capsys.readouterr().out
+
+    # a assinatura antiga também levava CHUNKS_TOKENS, que a divisão não lê
+    manifesto = db.carregar_manifesto()
+    manifesto["arquivos"][fonte]["divisao"] = "caracteres/400/40/1000"
+    db.salvar_manifesto(manifesto)
+    monkeypatch.setenv("CHUNKS_TOKENS", "300")
+    db.create_db()
+    assert "0 chunks vetorizados" in capsys.readouterr().out
+
+    monkeypatch.setenv("CHUNKS_CARACTERES", "1000")
+    db.create_db()
+    assert "Aviso: a divisão em chunks mudou" in capsys.readouterr().out
+    assert db.carregar_manifesto()["arquivos"][fonte]["divisao"] == (
+        "caracteres/1000/500"
+    )
+
+    monkeypatch.setenv("CHUNKS_ESTRATEGIA", "auto")
+    db.create_db()
+    assert "Aviso: a divisão em chunks mudou" in capsys.readouterr().out
+
+
+def test_snapshot_publicado_de_uma_vez_e_antigos_apagados(ambiente, monkeypatch):
+    monkeypatch.setenv("BANCO_VETORIAL", "local")
+    criar_pdf(ambiente / "a.pdf", ["Listas sao mutaveis."])
+    db.create_db()
+    primeiro = db.caminho_indice()
+    gerenciador = GerenciadorColecoes(EmbeddingsContados(size=16))
+    antiga = gerenciador.obter()
+
+    criar_pdf(ambiente / "b.pdf", ["Tuplas sao imutaveis."])
+    db.create_db()
+    segundo = db.caminho_indice()
+    assert segundo != primeiro
+    # o snapshot anterior fica intacto para as consultas em andamento
+    assert len(antiga.db) == 1 and len(antiga.db.similarity_search("listas")) == 1
+    nova = gerenciador.obter()
+    assert nova is not antiga and len(nova.db) == 2
+
+    criar_pdf(ambiente / "c.pdf", ["Dicionarios mapeiam chaves em valores."])
+    db.create_db()
+    snapshots = os.listdir(os.path.join(db.CAMINHO_DB, db.PASTA_SNAPSHOTS))
+    assert sorted(snapshots) == sorted(
+        os.path.basename(caminho) for caminho in (segundo, db.caminho_indice())
+    )
+
+
+def test_indice_de_antes_dos_snapshots_sai_da_raiz(ambiente):
+    criar_pdf(ambiente / "a.pdf", ["Listas sao mutaveis."])
+    db.create_db()
+    # o db/ de antes dos snapshots: o índice direto na raiz, sem ATUAL
+    raiz = db.CAMINHO_DB
+    snapshot = db.caminho_indice()
+    for nome in os.listdir(snapshot):
+        os.replace(os.path.join(snapshot, nome), os.path.join(raiz, nome))
+    shutil.rmtree(os.path.join(raiz, db.PASTA_SNAPSHOTS))
+    os.remove(os.path.join(raiz, db.ARQUIVO_ATUAL))
+    assert db.caminho_indice() == raiz and len(ids_no_banco()) == 1
+
+    EmbeddingsContados.textos_vetorizados = 0
+    criar_pdf(ambiente / "b.pdf", ["Tuplas sao imutaveis."])
+    db.create_db()
+
+    # copiado para o primeiro snapshot, o índice antigo vira o anterior a ele
+    assert EmbeddingsContados.textos_vetorizados == 1 and len(ids_no_banco()) == 2
+    assert sorted(os.listdir(raiz)) == [db.ARQUIVO_ATUAL, db.PASTA_SNAPSHOTS]
+    snapshots = os.path.join(raiz, db.PASTA_SNAPSHOTS)
+    assert sorted(os.listdir(snapshots)) == [
+        db.SNAPSHOT_LEGADO,
+        os.path.basename(db.caminho_indice()),
+    ]
+    assert db.ARQUIVO_MANIFESTO in os.listdir(
+        os.path.join(snapshots, db.SNAPSHOT_LEGADO)
+    )
+
+    criar_pdf(ambiente / "c.pdf", ["Dicionarios mapeiam chaves em valores."])
+    db.create_db()
+    assert db.SNAPSHOT_LEGADO not in os.listdir(snapshots)
+    assert len(ids_no_banco()) == 3
+
+
+def test_falha_na_indexacao_mantem_o_snapshot_publicado(ambiente, monkeypatch):
+    monkeypatch.setenv("BANCO_VETORIAL", "local")
+    criar_pdf(ambiente / "a.pdf", ["Listas sao mutaveis."])
+    db.create_db()
+    publicado = db.caminho_indice()
+
+    def falhar(embeddings, lote):
+        raise RuntimeError("provedor fora do ar")
+
+    monkeypatch.setattr(db, "vetorizar_lote", falhar)
+    criar_pdf(ambiente / "b.pdf", ["Tuplas sao imutaveis."])
+    with pytest.raises(RuntimeError):
+        db.create_db()
+
+    assert db.caminho_indice() == publicado
+    assert os.listdir(os.path.join(db.CAMINHO_DB, db.PASTA_SNAPSHOTS)) == [
+        os.path.basename(publicado)
+    ]
+    assert len(db.abrir_banco(EmbeddingsContados(size=16))) == 1
+
+
+def test_paginas_em_cache_nao_passam_pelo_pypdf(ambiente, monkeypatch):
+    from langchain_community import document_loaders
+
+    criar_pdf(ambiente / "a.pdf", ["Listas sao mutaveis.", "Tuplas sao imutaveis."])
+    pypdf = document_loaders.PyPDFLoader
+    extraidas = pypdf(str(ambiente / "a.pdf")).load()
+    db.create_db()
+    pasta = ambiente.parent / "paginas"
+    assert len(list(pasta.glob("*.arrow"))) == 1
+
+    class SemPypdf:
+        def __init__(self, *args, **kwargs):
+            raise AssertionError("o pypdf não deveria ser chamado")
+
+    monkeypatch.setattr(document_loaders, "PyPDFLoader", SemPypdf)
+    # mudar a divisão redivide o arquivo com as páginas do cache
+    monkeypatch.setenv("CHUNKS_ESTRATEGIA", "paginas")
+    db.create_db()
+    paginas = db.load_documents()
+    assert [p.page_content for p in paginas] == [p.page_content for p in extraidas]
+    assert [p.metadata for p in paginas] == [
+        {**p.metadata, "source": str(ambiente / "a.pdf")} for p in extraidas
+    ]
+
+    # um PDF alterado tem outro hash; o arquivo de páginas antigo é apagado
+    monkeypatch.setattr(document_loaders, "PyPDFLoader", pypdf)
+    criar_pdf(ambiente / "a.pdf", ["Dicionarios mapeiam chaves em valores."])
+    assert "Dicionarios" in db.load_documents()[0].page_content
+    assert len(list(pasta.glob("*.arrow"))) == 1
@@ -0,0 +1,121 @@
+"""
+Testes das estratégias de divisão em chunks
+"""
+
+from langchain_core.documents import Document
+
+from contexto import contar_tokens
+from divisao_chunks import (
+    assinatura_estrategia,
+    assinatura_gravada,
+    comparar_estrategias,
+    dividir_documentos,
+    estrategia_configurada,
+    perguntas_das_secoes,
+)
+from modelos_locais import EmbeddingsLocais
+
+FAQ = [
+    "1.  COMO  INSTALAR  O  PYTHON?   Baixe o instalador no site oficial e marque "
+    "a opção de adicionar ao PATH.  2.  O  QUE  SÃO  LISTAS?   Listas guardam "
+    "vários valores em ordem e podem ser alteradas depois de criadas.",
+    "Elas aceitam valores de tipos diferentes.  3.  O  QUE  SÃO  TUPLAS?   Tuplas "
+    "são como listas, mas imutáveis: não podem ser alteradas depois de criadas.",
+]
+
+
+def paginas(textos, fonte="base/faq.pdf"):
+    return [
+        Document(page_content=texto, metadata={"source": fonte, "page": i})
+        for i, texto in enumerate(textos)
+    ]
+
+
+def test_chunks_por_tokens_respeitam_o_limite_e_o_start_index(monkeypatch):
+    monkeypatch.setenv("CHUNKS_TOKENS", "30")
+    monkeypatch.setenv("CHUNKS_SOBREPOSICAO", "5")
+    texto = " ".join(f"palavra{i}" for i in range(300))
+
+    chunks = dividir_documentos(paginas([texto]), "tokens")
+
+    assert len(chunks) > 5
+    for chunk in chunks:
+        inicio = chunk.metadata["start_index"]
+        assert texto[inicio : inicio + len(chunk.page_content)] == chunk.page_content
+        assert chunk.metadata["tokens"] == contar_tokens(chunk.page_content) <= 30
+        assert chunk.metadata["estrategia"] == "tokens"
+    # com sobreposição, cada chunk começa antes do fim do anterior
+    fim_anterior = chunks[0].metadata["start_index"] + len(chunks[0].page_content)
+    assert chunks[1].metadata["start_index"] < fim_anterior
+
+
+def test_secoes_atravessam_paginas_e_guardam_o_titulo():
+    documentos = paginas(FAQ)
+
+    chunks = dividir_documentos(documentos, "auto")  # reconhece o FAQ
+
+    assert [c.metadata["secao"] for c in chunks] == [
+        "1. COMO INSTALAR O PYTHON?",
+        "2. O QUE SÃO LISTAS?",
+        "3. O QUE SÃO TUPLAS?",
+    ]
+    assert chunks[1].page_content.rstrip().endswith("valores de tipos diferentes.")
+    assert [c.metadata["page"] for c in chunks] == [0, 0, 1]
+    for chunk in chunks:
+        pagina = FAQ[chunk.metadata["page"]]
+        inicio = chunk.metadata["start_index"]
+        assert pagina[inicio:].startswith(chunk.page_content[:20])
+        assert chunk.metadata["estrategia"] == "secoes"
+
+
+def test_estrategia_por_arquivo(monkeypatch):
+    monkeypatch.delenv("CHUNKS_ESTRATEGIA", raising=False)
+    monkeypatch.setenv("CHUNKS_ESTRATEGIAS", "FAQ*.pdf=secoes, manual*.pdf=paginas")
+
+    assert estrategia_configurada("base/FAQ Python.pdf") == "secoes"
+    assert estrategia_configurada("base/manual_django.pdf") == "paginas"
+    # sem configuração, a divisão de sempre: índices antigos não são refeitos
+    assert estrategia_configurada("base/outro.pdf") == "caracteres"
+    monkeypatch.setenv("CHUNKS_ESTRATEGIA", "auto")
+    assert estrategia_configurada("base/outro.pdf") == "auto"
+
+    comum = paginas(["Texto corrido sem títulos numerados."], "base/outro.pdf")
+    assert dividir_documentos(comum)[0].metadata["estrategia"] == "tokens"
+    paginado = dividir_documentos(paginas(FAQ, "base/manual.pdf"))
+    assert [c.page_content for c in paginado] == FAQ
+
+
+def test_assinatura_so_com_os_parametros_da_estrategia(monkeypatch):
+    monkeypatch.setenv("CHUNKS_TOKENS", "300")
+    monkeypatch.delenv("CHUNKS_CARACTERES", raising=False)
+
+    assert assinatura_estrategia(None, "caracteres") == "caracteres/2000/500"
+    assert assinatura_estrategia(None, "tokens") == "tokens/300/40"
+    assert assinatura_estrategia(None, "paginas") == "paginas/1000"
+    assert assinatura_estrategia(None, "auto") == "auto/300/40/1000"
+    monkeypatch.setenv("CHUNKS_CARACTERES", "1000")
+    assert assinatura_estrategia(None, "caracteres") == "caracteres/1000/500"
+
+    # manifestos antigos: sem assinatura, ou com as três variáveis sempre
+    assert assinatura_gravada(None) == "caracteres/2000/500"
+    assert assinatura_gravada("caracteres/400/40/1000") == "caracteres/2000/500"
+    assert assinatura_gravada("tokens/300/40/1000") == "tokens/300/40"
+    assert assinatura_gravada("paginas/400/40/800") == "paginas/800"
+    assert assinatura_gravada("secoes/400/40/800") == "secoes/400/40/800"
+
+
+def test_relatorio_compara_as_estrategias():
+    documentos = paginas(FAQ)
+    perguntas = perguntas_das_secoes(documentos)
+
+    relatorio = comparar_estrategias(documentos, perguntas, EmbeddingsLocais(), k=2)
+
+    assert perguntas[1] == {
+        "pergunta": "O que são listas?",
+        "trecho": "Listas guardam vários valores em ordem e podem",
+    }
+    por_nome = {linha["estrategia"]: linha for linha in relatorio}
+    assert set(por_nome) == {"caracteres", "tokens", "paginas", "secoes"}
+    assert por_nome["secoes"]["chunks"] == 3 and por_nome["paginas"]["chunks"] == 2
+    assert por_nome["secoes"]["acerto_k"] == 1.0
+    assert all(linha["custo_embedding_usd"] > 0 for linha in relatorio)
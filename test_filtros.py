@@ -0,0 +1,173 @@
+"""
+Testes da busca filtrada por arquivo, página e data de indexação
+Usa embeddings locais e PDFs gerados na hora, sem acesso à rede
+"""
+
+import time
+import warnings
+
+import numpy as np
+import pytest
+
+import db
+from colecoes import GerenciadorColecoes
+from filtros import FiltroBusca, IndiceMetadados, ler_paginas
+from indice_lexico import IndiceLexico
+from indice_local import IndiceLocal
+from modelos_locais import EmbeddingsLocais
+from rag import buscar_contexto, buscar_em_colecoes
+from test_db import criar_pdf
+
+METADADOS = [
+    {"source": "base/a.pdf", "page": 0},
+    {"source": "base/b.pdf", "page": 0},
+    {"source": "base/a.pdf", "page": 1},
+    {"source": "outra/b.pdf", "page": 2},
+    {"source": "base/a.pdf", "page": 2},
+    {"source": "base/c.pdf"},
+]
+
+
+@pytest.fixture(autouse=True)
+def sem_avisos(monkeypatch):
+    monkeypatch.delenv("BANCO_VETORIAL", raising=False)
+    warnings.filterwarnings("ignore", message="Relevance scores must be between")
+
+
+def test_posicoes_por_fonte_e_pagina():
+    indice = IndiceMetadados.construir(METADADOS)
+
+    def posicoes(*args):
+        return indice.posicoes(FiltroBusca(*args)).tolist()
+
+    assert indice.posicoes(None) is None
+    assert indice.posicoes(FiltroBusca(indexado_desde=0)) is None
+    assert posicoes(["base/a.pdf"]) == [0, 2, 4]
+    # só o nome do arquivo casa com todas as pastas
+    assert posicoes(["b.pdf"]) == [1, 3]
+    assert posicoes(["a.pdf"], 1, 2) == [2, 4]
+    assert posicoes(None, 1) == [2, 3, 4]
+    assert posicoes(None, None, 0) == [0, 1]
+    assert posicoes(["x.pdf"]) == []
+    assert ler_paginas("3-10") == (3, 10)
+    assert ler_paginas("3-") == (3, None) and ler_paginas("-4") == (None, 4)
+    assert ler_paginas("5") == (5, 5)
+
+
+def test_resolver_datas_e_where_do_chroma():
+    datas = {"base/a.pdf": 100.0, "base/b.pdf": 200.0, "base/c.pdf": None}
+
+    assert FiltroBusca(["a.pdf"]).resolver(datas).fontes == ("base/a.pdf",)
+    assert FiltroBusca(indexado_desde=150).resolver(datas).fontes == ("base/b.pdf",)
+    vazio = FiltroBusca(["a.pdf"], indexado_desde=150).resolver(datas)
+    assert vazio.nenhuma_fonte
+    assert FiltroBusca(pagina_inicial=1).resolver(datas).fontes is None
+    # sem manifesto, nenhum arquivo tem data: como o base/c.pdf acima
+    assert FiltroBusca(["a.pdf"]).resolver({}).fontes == ("a.pdf",)
+    with pytest.warns(UserWarning, match="sem manifesto"):
+        sem_datas = FiltroBusca(["a.pdf"], 1, indexado_ate=300).resolver({})
+    assert sem_datas.nenhuma_fonte and sem_datas.pagina_inicial == 1
+
+    assert FiltroBusca(["base/a.pdf"]).where_chroma() == {
+        "source": {"$in": ["base/a.pdf"]}
+    }
+    assert FiltroBusca(None, 1, 3).where_chroma() == {
+        "$and": [{"page": {"$gte": 1}}, {"page": {"$lte": 3}}]
+    }
+    filtro = FiltroBusca.de_dict({"fontes": "a.pdf,b.pdf", "pagina_final": "2"})
+    assert FiltroBusca.de_dict(filtro.como_dict()).chave() == filtro.chave()
+    assert FiltroBusca.de_dict({}) is None
+
+
+def test_indice_local_so_compara_as_linhas_filtradas(tmp_path):
+    embeddings = EmbeddingsLocais(dimensao=32)
+    textos = [f"texto {i} sobre listas e tuplas" for i in range(len(METADADOS))]
+    ids = [f"id{i}" for i in range(len(METADADOS))]
+    indice = IndiceLocal(str(tmp_path), embeddings)
+    indice.add_texts(textos, METADADOS, ids)
+    indice.salvar()
+
+    lidas = []
+    original = indice.similaridades_lote
+
+    def contar(vetores, posicoes=None):
+        lidas.append(len(indice.ids) if posicoes is None else len(posicoes))
+        return original(vetores, posicoes)
+
+    indice.similaridades_lote = contar
+    vetor = embeddings.embed_query("listas")
+    filtro = FiltroBusca(["a.pdf"], 1)
+    filtrado = buscar_contexto("listas", indice, 10, vetor, filtro=filtro)
+    completo = buscar_contexto("listas", indice, 10, vetor)
+
+    assert {doc.id for doc, _ in filtrado} == {"id2", "id4"}
+    assert lidas == [2, len(METADADOS)]
+    # mesmos scores e ordem da busca completa, restrita às linhas do filtro
+    assert filtrado == [par for par in completo if par[0].id in {"id2", "id4"}]
+
+    lexico = IndiceLexico.construir(zip(ids, textos), METADADOS)
+    lexico.salvar(str(tmp_path / "lexico"))
+    lexico = IndiceLexico.carregar(str(tmp_path / "lexico"))
+    assert {i for i, _ in lexico.buscar("listas", 10, filtro)} == {"id2", "id4"}
+    assert len(lexico.buscar("listas", 10)) == len(METADADOS)
+    assert IndiceLexico.construir(zip(ids, textos)).buscar("listas", 10, filtro) == []
+    assert np.array_equal(lexico.metadados.paginas, [0, 0, 1, 2, 2, -1])
+
+
+@pytest.mark.parametrize("backend", ["chroma", "local"])
+def test_busca_filtrada_nas_colecoes(tmp_path, monkeypatch, backend):
+    pasta_base = tmp_path / "base"
+    pasta_base.mkdir()
+    monkeypatch.setattr(db, "PASTA_BASE", str(pasta_base))
+    monkeypatch.setattr(db, "CAMINHO_DB", str(tmp_path / "db"))
+    monkeypatch.setenv("CACHE_PAGINAS_PASTA", str(tmp_path / "paginas"))
+    monkeypatch.setattr(db, "criar_embeddings", lambda: EmbeddingsLocais(dimensao=32))
+    criar_pdf(pasta_base / "a.pdf", ["Listas sao mutaveis e aceitam append."])
+    criar_pdf(pasta_base / "b.pdf", ["Listas e tuplas guardam sequencias."])
+    inicio = time.time()
+    db.atualizar_db(backend=backend, max_processos=1)
+
+    colecoes = GerenciadorColecoes(caminho_padrao=db.CAMINHO_DB).obter_varias(None)
+    fonte_b = str(pasta_base / "b.pdf")
+    assert set(colecoes[0].datas_indexacao) == {str(pasta_base / "a.pdf"), fonte_b}
+
+    for busca in ("vetorial", "hibrida"):
+        todos = buscar_em_colecoes("listas", colecoes, k_docs=4, busca=busca)
+        assert len(todos) == 2
+        filtrados = buscar_em_colecoes(
+            "listas", colecoes, k_docs=4, busca=busca, filtro=FiltroBusca(["b.pdf"])
+        )
+        assert [doc.metadata["source"] for doc, _ in filtrados] == [fonte_b]
+
+    depois = FiltroBusca(indexado_desde=time.time() + 60)
+    assert buscar_em_colecoes("listas", colecoes, filtro=depois) == []
+    desde = FiltroBusca(indexado_desde=inicio - 1)
+    assert len(buscar_em_colecoes("listas", colecoes, filtro=desde)) == 2
+    paginas = FiltroBusca(pagina_inicial=1)
+    assert buscar_em_colecoes("listas", colecoes, busca="hibrida", filtro=paginas) == []
+
+
+def test_chroma_sem_manifesto_filtra_so_pelo_nome_do_arquivo(tmp_path):
+    from langchain_chroma.vectorstores import Chroma
+
+    # como o db/ distribuído: sem manifesto, com `source` = "base/<nome>.pdf"
+    banco = Chroma(
+        persist_directory=str(tmp_path), embedding_function=EmbeddingsLocais(32)
+    )
+    banco.add_texts(
+        ["listas em Python", "listas e tuplas", "listas mutaveis"],
+        [
+            {"source": "base/a.pdf", "page": 0},
+            {"source": "base/b.pdf", "page": 1},
+            {"source": "outra/a.pdf", "page": 2},
+        ],
+        ids=["a0", "b1", "a2"],
+    )
+    filtro = FiltroBusca(["a.pdf"]).resolver(db.datas_indexacao(str(tmp_path)))
+
+    filtrados = buscar_contexto("listas", banco, 10, filtro=filtro)
+    assert {doc.id for doc, _ in filtrados} == {"a0", "a2"}
+    so_b = buscar_contexto("listas", banco, 10, filtro=FiltroBusca(["b.pdf"], 1))
+    assert [doc.id for doc, _ in so_b] == ["b1"]
+    assert buscar_contexto("listas", banco, 10, filtro=FiltroBusca(["x.pdf"])) == []
+    assert len(buscar_contexto("listas", banco, 10)) == 3
@@ -0,0 +1,126 @@
+"""
+Testes do índice BM25 e da busca híbrida
+Usa embeddings locais e PDFs gerados na hora, sem acesso à rede
+"""
+
+import math
+from collections import Counter
+
+import pytest
+
+import db
+import rag
+from filtros import FiltroBusca
+from indice_lexico import IndiceLexico, fundir_rrf, tokenizar
+from indice_local import IndiceLocal
+from modelos_locais import EmbeddingsLocais
+from test_db import criar_pdf
+
+TEXTOS = {
+    "a": "Use os.path.join para montar caminhos de arquivos.",
+    "b": "O erro TypeError aparece quando o tipo do argumento é inválido.",
+    "c": "Listas são mutáveis; tuplas são imutáveis.",
+    "d": "Dicionários guardam pares de chave e valor. Listas de listas.",
+}
+
+
+def bm25_referencia(consulta, textos, k1=1.2, b=0.75):
+    documentos = {i: tokenizar(texto) for i, texto in textos.items()}
+    media = sum(map(len, documentos.values())) / len(documentos)
+    scores = {}
+    for i, termos in documentos.items():
+        contagem = Counter(termos)
+        score = 0.0
+        for termo in set(tokenizar(consulta)):
+            n = sum(termo in outros for outros in documentos.values())
+            if not contagem[termo]:
+                continue
+            idf = math.log(1 + (len(documentos) - n + 0.5) / (n + 0.5))
+            tf = contagem[termo]
+            score += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len(termos) / media))
+        if score:
+            scores[i] = score
+    return sorted(scores.items(), key=lambda item: -item[1])
+
+
+def test_tokenizar():
+    # "os" e "é" são palavras vazias, mas o nome completo é mantido
+    assert tokenizar("O que é os.path.join?") == ["os.path.join", "path", "join"]
+    assert tokenizar("__init__ e Ação") == ["__init__", "init", "acao"]
+
+
+def test_bm25_igual_a_referencia_e_persistencia(tmp_path):
+    indice = IndiceLexico.construir(TEXTOS.items())
+    indice.salvar(str(tmp_path))
+    carregado = IndiceLexico.carregar(str(tmp_path))
+
+    for consulta in ["listas mutáveis", "TypeError", "os.path.join", "nada aqui"]:
+        esperado = bm25_referencia(consulta, TEXTOS)
+        for busca in (indice.buscar, carregado.buscar):
+            resultado = busca(consulta, k=4)
+            assert [i for i, _ in resultado] == [i for i, _ in esperado]
+            assert [s for _, s in resultado] == pytest.approx([s for _, s in esperado])
+    assert IndiceLexico.carregar(str(tmp_path / "vazio")) is None
+
+
+def test_busca_filtrada_pontua_so_as_posicoes_do_filtro():
+    textos = [f"listas {'tuplas ' * (i % 5)}numero{i % 7}" for i in range(300)]
+    metadados = [{"source": f"doc{i % 4}.pdf", "page": i % 9} for i in range(300)]
+    indice = IndiceLexico.construir(
+        ((f"id{i}", texto) for i, texto in enumerate(textos)), metadados
+    )
+    completo = dict(indice.buscar("listas tuplas numero3", k=300))
+
+    # "numero3" tem menos documentos que o filtro; "listas", mais
+    for filtro in (FiltroBusca(["doc1.pdf"]), FiltroBusca(["doc2.pdf"], 4, 4)):
+        passam = {f"id{i}" for i in indice.metadados.posicoes(filtro).tolist()}
+        filtrado = indice.buscar("listas tuplas numero3", k=300, filtro=filtro)
+        assert {i for i, _ in filtrado} == passam
+        assert filtrado == sorted(
+            [(i, completo[i]) for i, _ in filtrado], key=lambda par: -par[1]
+        )
+        assert dict(filtrado) == pytest.approx({i: completo[i] for i in passam})
+
+
+def test_fundir_rrf():
+    scores = fundir_rrf([["x", "y"], ["y", "z"]], k_rrf=1)
+
+    assert scores == pytest.approx({"x": 1 / 2, "y": 1 / 3 + 1 / 2, "z": 1 / 3})
+
+
+def test_busca_hibrida_encontra_termo_exato(tmp_path):
+    banco = IndiceLocal(str(tmp_path), EmbeddingsLocais(dimensao=16))
+    banco.add_texts(list(TEXTOS.values()), ids=list(TEXTOS))
+    lexico = IndiceLexico.construir(TEXTOS.items())
+
+    resultados = rag.buscar_hibrido(
+        "TypeError", banco, lexico, k_docs=2, relevancia_minima=0.99
+    )
+
+    # nenhum vetor passa do limite, mas o BM25 acha o trecho com o nome do erro
+    assert [doc.id for doc, _ in resultados] == ["b"]
+    assert resultados[0][1] == pytest.approx(0.5)
+
+
+def test_atualizar_db_constroi_indice_lexico(tmp_path, monkeypatch):
+    pasta_base = tmp_path / "base"
+    pasta_base.mkdir()
+    monkeypatch.setattr(db, "PASTA_BASE", str(pasta_base))
+    monkeypatch.setattr(db, "CAMINHO_DB", str(tmp_path / "db"))
+    monkeypatch.setenv("CACHE_PAGINAS_PASTA", str(tmp_path / "paginas"))
+    monkeypatch.setattr(db, "criar_embeddings", lambda: EmbeddingsLocais(dimensao=16))
+    monkeypatch.delenv("BANCO_VETORIAL", raising=False)
+    criar_pdf(pasta_base / "a.pdf", ["Use enumerate para obter os indices."])
+    criar_pdf(pasta_base / "b.pdf", ["Tuplas sao imutaveis."])
+
+    db.atualizar_db()
+    lexico = db.carregar_indice_lexico()
+    banco = db.abrir_banco()
+    assert sorted(lexico.ids) == sorted(banco.get()["ids"])
+
+    (pasta_base / "b.pdf").unlink()
+    db.atualizar_db()
+    lexico = db.carregar_indice_lexico()
+    assert len(lexico) == 1
+    [(id_chunk, _)] = lexico.buscar("enumerate")
+    assert "enumerate" in banco.get_by_ids([id_chunk])[0].page_content
@@ -0,0 +1,136 @@
+"""
+Testes do índice vetorial local (NumPy mapeado em memória)
+Usa embeddings locais e PDFs gerados na hora, sem acesso à rede
+"""
+
+import warnings
+
+import numpy as np
+import pytest
+from langchain_chroma.vectorstores import Chroma
+
+import db
+from indice_local import IndiceLocal
+from modelos_locais import EmbeddingsLocais
+from rag import buscar_varias
+from test_db import criar_pdf
+
+TEXTOS = [
+    "listas são mutáveis e aceitam append",
+    "tuplas são imutáveis",
+    "dicionários mapeiam chaves em valores",
+    "herança permite reaproveitar classes",
+    "funções são definidas com def",
+]
+
+
+@pytest.fixture(autouse=True)
+def sem_backend_no_ambiente(monkeypatch):
+    monkeypatch.delenv("BANCO_VETORIAL", raising=False)
+    warnings.filterwarnings("ignore", message="Relevance scores must be between")
+
+
+def test_mesmos_resultados_que_o_chroma(tmp_path):
+    embeddings = EmbeddingsLocais(dimensao=64)
+    ids = [f"id{i}" for i in range(len(TEXTOS))]
+    chroma = Chroma(
+        persist_directory=str(tmp_path / "chroma"), embedding_function=embeddings
+    )
+    chroma.add_texts(TEXTOS, ids=ids)
+    indice = IndiceLocal(str(tmp_path / "local"), embeddings)
+    indice.add_texts(TEXTOS, ids=ids)
+
+    for pergunta in ["o que são tuplas?", "como definir funções", "classes"]:
+        esperado = chroma.similarity_search_with_relevance_scores(pergunta, k=3)
+        obtido = indice.similarity_search_with_relevance_scores(pergunta, k=3)
+        # empates (textos sem palavras em comum) podem vir em outra ordem
+        assert obtido[0][0].page_content == esperado[0][0].page_content
+        assert [s for _, s in obtido] == pytest.approx(
+            [s for _, s in esperado], abs=1e-4
+        )
+
+
+def test_varias_perguntas_numa_busca(tmp_path):
+    embeddings = EmbeddingsLocais(dimensao=64)
+    chroma = Chroma(
+        persist_directory=str(tmp_path / "chroma"), embedding_function=embeddings
+    )
+    chroma.add_texts(TEXTOS)
+    indice = IndiceLocal(str(tmp_path / "local"), embeddings)
+    indice.add_texts(TEXTOS)
+    perguntas = ["o que são tuplas?", "como definir funções", "herança"]
+
+    for banco in (chroma, indice):
+        varias = buscar_varias(perguntas, banco, k_docs=2)
+        assert len(varias) == 3
+        for pergunta, obtido in zip(perguntas, varias):
+            esperado = banco.similarity_search_with_relevance_scores(pergunta, k=2)
+            assert obtido[0][0].page_content == esperado[0][0].page_content
+            assert [s for _, s in obtido] == pytest.approx(
+                [s for _, s in esperado], abs=1e-4
+            )
+    assert buscar_varias([], indice) == []
+    assert IndiceLocal(str(tmp_path / "vazio"), embeddings).buscar_por_vetores(
+        [[1.0] * 64], k=2
+    ) == [[]]
+
+
+def test_persistencia_mmap_e_int8(tmp_path):
+    embeddings = EmbeddingsLocais(dimensao=64)
+    for quantizado in (False, True):
+        caminho = str(tmp_path / f"indice-{quantizado}")
+        indice = IndiceLocal(caminho, embeddings, quantizado=quantizado)
+        indice.add_texts(TEXTOS, metadatas=[{"page": i} for i in range(5)])
+        indice.salvar()
+
+        reaberto = IndiceLocal(caminho, embeddings)
+        assert isinstance(reaberto._matriz, np.memmap)
+        assert reaberto.quantizado is quantizado
+        assert reaberto._matriz.dtype == (np.int8 if quantizado else np.float32)
+        doc, score = reaberto.similarity_search_with_relevance_scores("tuplas", k=1)[0]
+        assert doc.metadata == {"page": 1} and score > 0.3
+
+    with pytest.raises(ValueError):
+        IndiceLocal(str(tmp_path / "indice-True"), embeddings, quantizado=False)
+
+
+def test_remocao_substituicao_e_metadados(tmp_path):
+    indice = IndiceLocal(str(tmp_path), EmbeddingsLocais(dimensao=64))
+    indice.add_texts(TEXTOS[:3], ids=["a", "b", "c"])
+    indice.salvar()
+
+    indice.delete(ids=["a"])
+    indice.add_texts(["tuplas e listas"], ids=["b"])
+    indice.atualizar_metadados(["c"], [{"page": 7}])
+    indice.salvar()
+
+    reaberto = IndiceLocal(str(tmp_path), EmbeddingsLocais(dimensao=64))
+    assert sorted(reaberto.ids) == ["b", "c"]
+    assert reaberto.textos[reaberto.ids.index("b")] == "tuplas e listas"
+    assert reaberto.metadados[reaberto.ids.index("c")] == {"page": 7}
+
+
+def test_atualizar_db_com_backend_local(tmp_path, monkeypatch):
+    pasta_base = tmp_path / "base"
+    pasta_base.mkdir()
+    monkeypatch.setattr(db, "PASTA_BASE", str(pasta_base))
+    monkeypatch.setattr(db, "CAMINHO_DB", str(tmp_path / "db"))
+    monkeypatch.setenv("CACHE_PAGINAS_PASTA", str(tmp_path / "paginas"))
+    monkeypatch.setattr(db, "criar_embeddings", lambda: EmbeddingsLocais(dimensao=32))
+    criar_pdf(pasta_base / "a.pdf", ["Listas sao mutaveis."])
+    criar_pdf(pasta_base / "b.pdf", ["Tuplas sao imutaveis."])
+
+    db.atualizar_db(backend="local-int8")
+    banco = db.abrir_banco()
+    assert isinstance(banco, IndiceLocal) and banco.quantizado
+    assert len(banco) == 2
+
+    (pasta_base / "b.pdf").unlink()
+    db.atualizar_db()
+    assert len(db.abrir_banco()) == 1
+
+    # trocar de backend reconstrói o índice no backend novo
+    db.atualizar_db(backend="chroma")
+    banco = db.abrir_banco()
+    assert isinstance(banco, Chroma)
+    assert len(banco.get()["ids"]) == 1
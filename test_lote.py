@@ -0,0 +1,190 @@
+"""
+Testes do processamento de perguntas em lote
+Usa banco e modelo falsos, sem acesso à rede
+"""
+
+import asyncio
+import json
+
+from langchain_core.documents import Document
+from langchain_core.messages import AIMessage
+
+import lote
+import rag
+from modelos_locais import ChatLocal, EmbeddingsLocais
+from roteador_llm import BackendChat, Disjuntor, RoteadorLLM
+
+
+class ErroLimite(Exception):
+    status_code = 429
+
+
+class ChatLimitado(ChatLocal):
+    falhas_429: int = 0
+    chamadas: int = 0
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        self.chamadas += 1
+        if self.falhas_429:
+            self.falhas_429 -= 1
+            raise ErroLimite("Too Many Requests")
+        yield from super()._stream(messages, stop, run_manager, **kwargs)
+
+
+class BancoFalso:
+    def __init__(self):
+        self.embeddings = EmbeddingsLocais(dimensao=8)
+        self.buscas = []
+
+    def buscar_por_vetores(self, vetores, k=4, filtro=None):
+        self.buscas.append(len(vetores))
+        documento = Document(page_content="sobre a pergunta", metadata={"page": 1})
+        return [[(documento, 0.1)] for _ in vetores]
+
+    def _select_relevance_score_fn(self):
+        return lambda distancia: 1.0 - distancia
+
+
+class ChainFalsa:
+    def __init__(self, falhas_429=0):
+        self.falhas_429 = falhas_429
+        self.chamadas = 0
+        self.simultaneas = 0
+        self.max_simultaneas = 0
+
+    async def ainvoke(self, entrada):
+        self.chamadas += 1
+        if self.falhas_429:
+            self.falhas_429 -= 1
+            raise ErroLimite("Too Many Requests")
+        self.simultaneas += 1
+        self.max_simultaneas = max(self.max_simultaneas, self.simultaneas)
+        await asyncio.sleep(0.01)
+        self.simultaneas -= 1
+        return AIMessage(content=f"resposta: {entrada['pergunta']}")
+
+
+def escrever_perguntas(caminho, quantidade):
+    with open(caminho, "w", encoding="utf-8") as arquivo:
+        for i in range(quantidade):
+            registro = {"request_id": f"q-{i}", "title": f"Pergunta {i}", "body": "?"}
+            arquivo.write(json.dumps(registro) + "\n")
+
+
+def ler_saida(caminho):
+    with open(caminho, encoding="utf-8") as arquivo:
+        return [json.loads(linha) for linha in arquivo]
+
+
+def test_responde_todas_com_concorrencia_limitada(tmp_path):
+    entrada, saida = tmp_path / "perguntas.jsonl", tmp_path / "respostas.jsonl"
+    escrever_perguntas(entrada, 10)
+    chain = ChainFalsa()
+
+    respondidas, erros = asyncio.run(
+        lote.processar_lote(entrada, saida, BancoFalso(), chain, concorrencia=3)
+    )
+
+    registros = ler_saida(saida)
+    assert (respondidas, erros) == (10, 0)
+    assert sorted(r["id"] for r in registros) == sorted(f"q-{i}" for i in range(10))
+    assert chain.max_simultaneas <= 3
+    assert all(r["fontes"] and r["latencia"]["total"] > 0 for r in registros)
+
+
+def test_busca_o_contexto_em_grupos(tmp_path):
+    entrada, saida = tmp_path / "perguntas.jsonl", tmp_path / "respostas.jsonl"
+    escrever_perguntas(entrada, 10)
+    banco = BancoFalso()
+
+    respondidas, _ = asyncio.run(
+        lote.processar_lote(
+            entrada, saida, banco, ChainFalsa(), concorrencia=3, tamanho_lote_busca=4
+        )
+    )
+
+    assert respondidas == 10
+    assert sorted(banco.buscas) == [2, 4, 4]
+    assert all(r["fontes"][0]["score"] == 0.9 for r in ler_saida(saida))
+
+
+def test_retoma_de_onde_parou(tmp_path):
+    entrada, saida = tmp_path / "perguntas.jsonl", tmp_path / "respostas.jsonl"
+    escrever_perguntas(entrada, 5)
+    with open(saida, "w", encoding="utf-8") as arquivo:
+        arquivo.write(json.dumps({"id": "q-0", "resposta": "ok"}) + "\n")
+        arquivo.write(json.dumps({"id": "q-1", "erro": "falhou"}) + "\n")
+        arquivo.write('{"id": "q-2", "resp')  # linha cortada por interrupção
+    chain = ChainFalsa()
+
+    asyncio.run(lote.processar_lote(entrada, saida, BancoFalso(), chain))
+
+    assert chain.chamadas == 4
+    assert lote.ids_respondidos(saida) == {f"q-{i}" for i in range(5)}
+
+
+def test_repete_apos_erro_429(tmp_path, monkeypatch):
+    async def sem_espera(_):
+        pass
+
+    entrada, saida = tmp_path / "perguntas.jsonl", tmp_path / "respostas.jsonl"
+    escrever_perguntas(entrada, 1)
+    chain = ChainFalsa(falhas_429=2)
+    monkeypatch.setattr(lote.asyncio, "sleep", sem_espera)
+
+    respondidas, erros = asyncio.run(
+        lote.processar_lote(entrada, saida, BancoFalso(), chain)
+    )
+
+    assert (respondidas, erros) == (1, 0)
+    assert chain.chamadas == 3
+
+
+def test_repete_o_429_vindo_do_roteador(tmp_path, monkeypatch):
+    async def sem_espera(_):
+        pass
+
+    entrada, saida = tmp_path / "perguntas.jsonl", tmp_path / "respostas.jsonl"
+    escrever_perguntas(entrada, 1)
+    limitados = [ChatLimitado(falhas_429=3, tokens_resposta=4) for _ in range(2)]
+    backends = [
+        BackendChat(nome, chat, disjuntor=Disjuntor(2, espera=60))
+        for nome, chat in zip("ab", limitados)
+    ]
+    chain = rag.criar_chain(chat=RoteadorLLM(backends=backends))
+    monkeypatch.setattr(lote.asyncio, "sleep", sem_espera)
+
+    respondidas, erros = asyncio.run(
+        lote.processar_lote(entrada, saida, BancoFalso(), chain)
+    )
+
+    # cada rodada passa pelos dois backends; o 429 chega ao lote, que espera
+    assert (respondidas, erros) == (1, 0)
+    assert [chat.chamadas for chat in limitados] == [4, 3]
+    assert not any(backend.disjuntor.aberto for backend in backends)
+    assert ler_saida(saida)[0]["resposta"].startswith("Resposta local")
+
+
+def test_limite_de_taxa_espaca_as_chamadas(monkeypatch):
+    class Relogio:
+        agora = 0.0
+
+        def __call__(self):
+            return self.agora
+
+    relogio = Relogio()
+    esperas = []
+
+    async def dormir(segundos):
+        esperas.append(segundos)
+        relogio.agora += segundos
+
+    async def executar():
+        limite = lote.LimiteTaxa(por_minuto=60, relogio=relogio)
+        for _ in range(3):
+            await limite.aguardar()
+
+    monkeypatch.setattr(lote.asyncio, "sleep", dormir)
+    asyncio.run(executar())
+
+    assert sum(esperas) == 2.0
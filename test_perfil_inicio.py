@@ -0,0 +1,21 @@
+"""
+Testes do tempo de partida: main.py e app.py não importam as bibliotecas pesadas
+"""
+
+from perfil_inicio import main, perfil
+
+
+def test_partida_sem_bibliotecas_pesadas():
+    for modulo in ("main", "app"):
+        resultado = perfil(modulo, repeticoes=1)
+
+        assert resultado["pesados"] == [], modulo
+        assert resultado["ms"] > 0 and resultado["pacotes"]
+    # o db.py pode pagar pelo langchain: é importado só na primeira consulta
+    assert "langsmith" in perfil("db", repeticoes=1)["pesados"]
+
+
+def test_orcamento_define_o_codigo_de_saida(capsys):
+    assert main(["main", "--orcamento-ms", "100000", "--repeticoes", "1"]) == 0
+    assert main(["main", "--orcamento-ms", "0.001", "--repeticoes", "1"]) == 1
+    assert "❌ import main" in capsys.readouterr().out
@@ -0,0 +1,86 @@
+"""
+Testes da camada de prompts: templates compilados, prefixo fixo e cache de contextos
+Sem acesso à rede
+"""
+
+from langchain_core.documents import Document
+from langchain_core.messages import AIMessage, SystemMessage
+
+import rag
+from prompts import TEMPLATES, CacheContextos, template_prompt
+from rastreamento import Rastreamento
+
+
+def documento(id_doc, texto):
+    return Document(page_content=texto, metadata={"source": "a.pdf"}, id=id_doc)
+
+
+def test_instrucoes_fixas_vem_primeiro_e_o_template_e_compilado_uma_vez():
+    assert template_prompt() is template_prompt()
+    prompt = template_prompt()
+
+    primeira = prompt.invoke(
+        {"pergunta": "O que é herança?", "base_conhecimento": "X"}
+    )
+    segunda = prompt.invoke({"pergunta": "E tuplas?", "base_conhecimento": "X"})
+
+    sistema, usuario = primeira.to_messages()
+    assert isinstance(sistema, SystemMessage)
+    assert sistema == segunda.to_messages()[0]
+    assert sistema.content == TEMPLATES["rag"].instrucoes
+    # contexto antes da pergunta: o início da mensagem também se repete
+    outra = segunda.to_messages()[1].content
+    assert usuario.content.index("X") < usuario.content.index("O que é herança?")
+    inicio = usuario.content.split("O que é herança?")[0]
+    assert inicio == outra.split("E tuplas?")[0]
+    assert template_prompt("terminal").invoke(
+        {"pergunta": "p", "base_conhecimento": "c"}
+    ).to_messages()[1].content.endswith("Pergunta: p")
+
+
+def test_cache_de_contextos_por_conjunto_de_trechos():
+    cache = CacheContextos(max_itens=2)
+    trechos = [(documento("a", "listas"), 0.9), (documento("b", "tuplas"), 0.8)]
+
+    contexto, em_cache = cache.obter(trechos)
+    # outro score para os mesmos trechos: o mesmo texto, sem renderizar de novo
+    de_novo, em_cache_de_novo = cache.obter([(doc, 0.1) for doc, _ in trechos])
+
+    assert not em_cache and em_cache_de_novo and de_novo is contexto
+    assert "0.9" not in contexto and "📄 **Documento 2**:\ntuplas" in contexto
+    assert (cache.acertos, cache.consultas) == (1, 2)
+    # trecho cortado no limite de tokens tem outra chave
+    cortado = [trechos[0], (documento("b", "tup"), 0.8)]
+    assert cache.obter(cortado) == (rag.cache_contextos().obter(cortado)[0], False)
+    cache.obter([trechos[1]])
+    assert not cache.obter(trechos)[1]  # o mais antigo saiu
+    assert cache.obter([(documento(None, "sem id"), 0.5)])[1] is False
+
+
+def test_tokens_de_cache_e_de_prefixo_por_chamada():
+    rag.cache_contextos().limpar()
+    resultados = [(documento("c1", "Herança permite reutilizar classes."), 0.9)]
+    rastreamentos = [Rastreamento("pergunta", []) for _ in range(2)]
+    for rastreamento in rastreamentos:
+        contexto, _ = rag.montar_contexto(resultados, rastreamento)
+    assert [r.atributos["contexto_em_cache"] for r in rastreamentos] == [False, True]
+
+    template = TEMPLATES["rag"]
+    mensagem = AIMessage(
+        content="ok",
+        usage_metadata={
+            "input_tokens": 1200,
+            "output_tokens": 5,
+            "total_tokens": 1205,
+            "input_token_details": {"cache_read": 1024},
+        },
+    )
+    informados = rag.contar_tokens_chamada(mensagem, "herança?", contexto, "ok")
+    assert informados["tokens_cache"] == 1024
+    assert informados["tokens_prefixo"] == template.tokens_prefixo(contexto)
+    assert not informados["tokens_estimados"]
+
+    estimados = rag.contar_tokens_chamada(AIMessage("ok"), "herança?", contexto, "ok")
+    assert "tokens_cache" not in estimados and estimados["tokens_estimados"]
+    assert estimados["tokens_entrada"] > estimados["tokens_prefixo"]
+    assert estimados["tokens_prefixo"] > rag.contar_tokens(contexto)
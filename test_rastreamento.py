@@ -0,0 +1,112 @@
+"""
+Testes do rastreamento por etapa das consultas
+Usa modelos locais, sem acesso à rede
+"""
+
+import json
+import warnings
+
+import pytest
+from langchain_chroma.vectorstores import Chroma
+from langchain_core.documents import Document
+
+import rag
+from modelos_locais import ChatLocal, EmbeddingsLocais
+from rastreamento import ExportadorJsonl, ExportadorMemoria, Rastreamento, etapa
+
+
+@pytest.fixture
+def banco(tmp_path):
+    warnings.filterwarnings("ignore", message="Relevance scores must be between")
+    banco = Chroma(
+        persist_directory=str(tmp_path / "db"),
+        embedding_function=EmbeddingsLocais(dimensao=64),
+    )
+    banco.add_documents(
+        [
+            Document(page_content="herança em Python", metadata={"page": 1}),
+            Document(page_content="tuplas são imutáveis", metadata={"page": 2}),
+        ]
+    )
+    return banco
+
+
+def test_etapas_sao_exportadas_uma_vez(tmp_path):
+    memoria = ExportadorMemoria()
+    arquivo = tmp_path / "rastreamento.jsonl"
+    rastreamento = Rastreamento("teste", [memoria, ExportadorJsonl(str(arquivo))])
+
+    with rastreamento.etapa("embedding"):
+        pass
+    with etapa(rastreamento, "embedding"):
+        pass
+    rastreamento.registrar("llm_primeiro_token", 0.25)
+    rastreamento.finalizar()
+    rastreamento.finalizar()
+
+    linhas = arquivo.read_text(encoding="utf-8").splitlines()
+    assert len(linhas) == 1 and len(memoria.rastreamentos) == 1
+    assert [e["nome"] for e in json.loads(linhas[0])["etapas"]] == [
+        "embedding",
+        "embedding",
+        "llm_primeiro_token",
+    ]
+    assert rastreamento.etapas_ms()["llm_primeiro_token"] == 250
+    with etapa(None, "sem efeito"):
+        pass
+
+
+def test_resumo_por_etapa():
+    memoria = ExportadorMemoria()
+    for duracao in (0.01, 0.02, 0.03):
+        rastreamento = Rastreamento("teste", [memoria])
+        rastreamento.registrar("busca_vetorial", duracao)
+        rastreamento.finalizar()
+
+    resumo = memoria.resumo()
+
+    assert list(resumo) == ["busca_vetorial", "total"]
+    assert resumo["busca_vetorial"]["consultas"] == 3
+    assert resumo["busca_vetorial"]["media_ms"] == pytest.approx(20)
+
+
+def test_pipeline_registra_todas_as_etapas(banco):
+    rastreamento = Rastreamento("pergunta", [])
+    chain = rag.criar_chain(chat=ChatLocal(tokens_resposta=6))
+
+    resultados = rag.buscar_contexto(
+        "herança em Python", banco, k_docs=1, rastreamento=rastreamento
+    )
+    contexto, _ = rag.montar_contexto(resultados, rastreamento)
+    rag.gerar_resposta(
+        chain,
+        "herança em Python",
+        contexto,
+        ao_receber_token=lambda _: None,
+        rastreamento=rastreamento,
+    )
+
+    assert resultados[0][0].page_content == "herança em Python"
+    assert set(rastreamento.etapas_ms()) == {
+        "embedding",
+        "busca_vetorial",
+        "montagem_contexto",
+        "llm_primeiro_token",
+        "llm_total",
+    }
+    assert rastreamento.atributos["tokens_saida"] > 0
+    assert rastreamento.atributos["tokens_entrada"] > rag.contar_tokens(contexto)
+
+
+def test_vetor_informado_nao_recalcula_embedding(banco):
+    rastreamento = Rastreamento("pergunta", [])
+    vetor = banco.embeddings.embed_query("tuplas")
+    requisicoes = banco.embeddings.requisicoes
+
+    resultados = rag.buscar_contexto(
+        "tuplas", banco, k_docs=1, vetor=vetor, rastreamento=rastreamento
+    )
+
+    assert resultados[0][0].metadata["page"] == 2
+    assert banco.embeddings.requisicoes == requisicoes
+    assert "embedding" not in rastreamento.etapas_ms()
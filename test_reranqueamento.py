@@ -0,0 +1,133 @@
+"""
+Testes do reranqueamento com cross-encoder e do cache de scores
+Usa o reranqueador local e uma sessão ONNX falsa, sem baixar modelos
+"""
+
+import warnings
+
+import numpy as np
+from langchain_core.documents import Document
+from tokenizers import Tokenizer
+from tokenizers.models import WordLevel
+from tokenizers.pre_tokenizers import Whitespace
+
+import rag
+from indice_local import IndiceLocal
+from modelos_locais import EmbeddingsLocais, ReranqueadorLocal
+from rastreamento import Rastreamento
+from reranqueamento import CacheScores, ReranqueadorOnnx, reranquear
+
+TEXTOS = [
+    "tuplas são imutáveis em Python",
+    "herança permite reaproveitar classes",
+    "listas são mutáveis",
+    "classes filhas herdam métodos da classe mãe com herança",
+]
+
+
+def resultados():
+    return [
+        (Document(page_content=texto, id=f"c{i}"), 0.5)
+        for i, texto in enumerate(TEXTOS)
+    ]
+
+
+def test_reordena_e_mantem_os_top_n():
+    reranqueador = ReranqueadorLocal(tamanho_lote=3)
+    rastreamento = Rastreamento("teste")
+
+    melhores = reranquear(
+        "herança de classes", resultados(), reranqueador, 2, rastreamento=rastreamento
+    )
+
+    assert [doc.id for doc, _ in melhores] == ["c1", "c3"]
+    assert all(0 <= score <= 1 for _, score in melhores)
+    assert melhores[0][1] >= melhores[1][1]
+    assert reranqueador.lotes == 2 and reranqueador.pares == 4
+    assert "reranqueamento" in rastreamento.etapas_ms()
+    assert rastreamento.atributos["reranqueamento_acima_do_orcamento"] is False
+
+
+def test_cache_evita_pontuar_pares_repetidos(monkeypatch):
+    reranqueador = ReranqueadorLocal()
+    cache = CacheScores()
+    rastreamento = Rastreamento("teste")
+
+    primeira = reranquear("herança de classes", resultados(), reranqueador, 2, cache)
+    # a mesma pergunta com mais um candidato: só o novo vai ao modelo
+    mais_um = resultados() + [(Document(page_content="herança", id="c4"), 0.1)]
+    segunda = reranquear(
+        "Herança de classes?", mais_um, reranqueador, 2, cache, rastreamento
+    )
+
+    assert reranqueador.pares == 5
+    assert rastreamento.atributos["reranqueamento_em_cache"] == 4
+    assert [doc.id for doc, _ in segunda] == [doc.id for doc, _ in primeira]
+    assert len(cache) == 5
+
+    monkeypatch.setenv("RERANQUEADOR_ORCAMENTO_MS", "0")
+    reranquear("outra", resultados(), reranqueador, 2, cache, rastreamento)
+    assert rastreamento.atributos["reranqueamento_acima_do_orcamento"] is True
+
+
+def test_cache_descarta_os_mais_antigos():
+    cache = CacheScores(max_itens=2)
+    cache.guardar("p", {"a": 1.0, "b": 2.0})
+    cache.buscar("p", ["a"])
+    cache.guardar("p", {"c": 3.0})
+
+    assert cache.buscar("p", ["a", "b", "c"]) == {"a": 1.0, "c": 3.0}
+
+
+class SessaoFalsa:
+    """Imita uma InferenceSession: logit = número de tokens do par."""
+
+    def __init__(self):
+        self.formatos = []
+
+    def get_inputs(self):
+        class Entrada:
+            def __init__(self, name):
+                self.name = name
+
+        return [Entrada("input_ids"), Entrada("attention_mask")]
+
+    def run(self, saidas, entradas):
+        self.formatos.append(entradas["input_ids"].shape)
+        assert set(entradas) == {"input_ids", "attention_mask"}
+        return [entradas["attention_mask"].sum(axis=1, keepdims=True).astype(float)]
+
+
+def test_reranqueador_onnx_pontua_pares_em_lotes():
+    vocabulario = {"[UNK]": 0, "[PAD]": 1, "a": 2, "b": 3}
+    tokenizer = Tokenizer(WordLevel(vocabulario, unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = Whitespace()
+    tokenizer.enable_padding(pad_id=1, pad_token="[PAD]")
+    sessao = SessaoFalsa()
+    reranqueador = ReranqueadorOnnx(sessao, tokenizer, "falso", tamanho_lote=2)
+
+    scores = reranqueador.pontuar("a", ["b", "a b a", "b b"])
+
+    np.testing.assert_array_equal(scores, [2, 4, 3])
+    assert sessao.formatos == [(2, 4), (1, 3)]
+    assert reranqueador.pontuar("a", []).shape == (0,)
+
+
+def test_buscar_reranqueado_no_indice_local(tmp_path):
+    warnings.filterwarnings("ignore", message="Relevance scores must be between")
+    indice = IndiceLocal(str(tmp_path), EmbeddingsLocais(dimensao=64))
+    indice.add_texts(TEXTOS, metadatas=[{"source": "base/a.pdf"}] * len(TEXTOS))
+    rastreamento = Rastreamento("teste")
+
+    melhores = rag.buscar_reranqueado(
+        "herança de métodos",
+        indice,
+        ReranqueadorLocal(),
+        k_docs=1,
+        candidatos=4,
+        rastreamento=rastreamento,
+    )
+
+    assert melhores[0][0].page_content == TEXTOS[3]
+    etapas = rastreamento.etapas_ms()
+    assert {"busca_vetorial", "reranqueamento"} <= set(etapas)
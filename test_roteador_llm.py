@@ -0,0 +1,116 @@
+"""
+Testes do roteador de LLMs: fallback, timeout, disjuntor e hedging
+Usa modelos de chat locais, sem acesso à rede
+"""
+
+import time
+
+import pytest
+
+import rag
+from modelos_locais import ChatLocal
+from roteador_llm import BackendChat, Disjuntor, RoteadorLLM, criar_roteador
+
+
+class ChatFalho(ChatLocal):
+    chamadas: int = 0
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        self.chamadas += 1
+        raise ConnectionError("provedor fora do ar")
+        yield
+
+
+def roteador(*backends, percentil_hedge=0, atraso_hedge_padrao=1.0):
+    return RoteadorLLM(
+        backends=list(backends),
+        percentil_hedge=percentil_hedge,
+        atraso_hedge_padrao=atraso_hedge_padrao,
+    )
+
+
+def test_fallback_e_disjuntor():
+    falho = ChatFalho()
+    primeiro = BackendChat("a", falho, disjuntor=Disjuntor(2, espera=60))
+    modelo = roteador(primeiro, BackendChat("b", ChatLocal(tokens_resposta=4)))
+
+    for _ in range(3):
+        resposta = modelo.invoke("O que é herança?")
+        assert resposta.content.startswith("Resposta local")
+        assert resposta.response_metadata["backend"] == "b"
+    # aberto após duas falhas: a terceira pergunta nem tenta o primeiro
+    assert falho.chamadas == 2 and primeiro.disjuntor.aberto
+
+    primeiro.disjuntor.relogio = lambda: time.monotonic() + 120
+    primeiro.modelo = ChatLocal(tokens_resposta=4)
+    assert modelo.invoke("x").response_metadata["backend"] == "a"
+    assert not primeiro.disjuntor.aberto
+
+    with pytest.raises(ConnectionError):
+        roteador(BackendChat("a", ChatFalho())).invoke("x")
+
+
+def test_timeout_passa_para_o_proximo():
+    lento = ChatLocal(tokens_resposta=3, latencia_primeiro_token=1.0)
+    modelo = roteador(
+        BackendChat("lento", lento, timeout=0.1),
+        BackendChat("rapido", ChatLocal(tokens_resposta=3)),
+    )
+
+    inicio = time.monotonic()
+    pedacos = list(modelo.stream("O que é herança?"))
+
+    assert time.monotonic() - inicio < 0.5
+    assert pedacos[0].response_metadata["backend"] == "rapido"
+    assert "".join(p.content for p in pedacos).startswith("Resposta local")
+
+
+def test_hedging_limita_a_cauda_pelo_mais_rapido():
+    def backends():
+        return (
+            BackendChat("a", ChatLocal(latencia_primeiro_token=0.6), timeout=5),
+            BackendChat("b", ChatLocal(latencia_primeiro_token=0.01), timeout=5),
+        )
+
+    # sem hedging, espera o primeiro backend
+    inicio = time.monotonic()
+    assert roteador(*backends()).invoke("x").response_metadata["backend"] == "a"
+    assert time.monotonic() - inicio >= 0.6
+
+    # com hedging, o segundo é disparado após 50 ms e ganha
+    modelo = roteador(*backends(), percentil_hedge=95, atraso_hedge_padrao=0.05)
+    inicio = time.monotonic()
+    resposta = modelo.invoke("x")
+    assert time.monotonic() - inicio < 0.4
+    assert resposta.response_metadata["backend"] == "b"
+    # o perdedor cancelado não conta como falha
+    assert [b["falhas"] for b in modelo.resumo()] == [0, 0]
+
+
+def test_criar_roteador_pelo_env(monkeypatch):
+    monkeypatch.setenv("LLM_BACKENDS", "local")
+    monkeypatch.setenv("LLM_TIMEOUTS", "local=3")
+    chain = rag.criar_chain()
+    [backend] = chain.last.backends
+    assert backend.nome == "local" and backend.timeout == 3.0
+    resposta, _ = rag.gerar_resposta(chain, "O que é herança?", "contexto")
+    assert resposta.startswith("Resposta local")
+
+    monkeypatch.setenv("LLM_BACKENDS", "outro")
+    with pytest.raises(ValueError):
+        criar_roteador()
+    monkeypatch.delenv("LLM_BACKENDS")
+    monkeypatch.delenv("GROQ_API_KEY", raising=False)
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    with pytest.raises(ValueError):
+        criar_roteador()
+
+
+def test_hedging_vem_desligado(monkeypatch):
+    monkeypatch.delenv("LLM_HEDGE_PERCENTIL", raising=False)
+    modelo = criar_roteador(nomes=["local", "local"])
+
+    assert modelo.percentil_hedge == 0
+    assert modelo.atraso_hedge(modelo.backends[0]) is None
+    monkeypatch.setenv("LLM_HEDGE_PERCENTIL", "95")
+    assert criar_roteador(nomes=["local", "local"]).percentil_hedge == 95
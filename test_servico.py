@@ -0,0 +1,88 @@
+"""
+Testes do serviço HTTP de consultas e do seu cliente
+Usa índice local e modelos locais, sem acesso à rede externa
+"""
+
+import threading
+import warnings
+
+import pytest
+from werkzeug.serving import make_server
+
+from cliente_servico import ClienteServico
+from indice_local import IndiceLocal
+from modelos_locais import ChatLocal, EmbeddingsLocais
+from servico import ServicoRAG, criar_app
+
+
+@pytest.fixture
+def servico(tmp_path, monkeypatch):
+    warnings.filterwarnings("ignore", message="Relevance scores must be between")
+    monkeypatch.setenv("BANCO_VETORIAL", "local")
+    embeddings = EmbeddingsLocais(dimensao=64)
+    indice = IndiceLocal(str(tmp_path), embeddings)
+    indice.add_texts(
+        ["herança permite reaproveitar classes", "tuplas são imutáveis"],
+        metadatas=[{"source": "base/a.pdf", "page": 1}, {"source": "base/b.pdf"}],
+    )
+    indice.salvar()
+    return ServicoRAG(
+        caminho_db=str(tmp_path),
+        trabalhadores=2,
+        embeddings=embeddings,
+        chat=ChatLocal(tokens_resposta=6),
+        exportadores=[],
+    )
+
+
+@pytest.fixture
+def cliente(servico):
+    servidor = make_server("127.0.0.1", 0, criar_app(servico), threaded=True)
+    thread = threading.Thread(target=servidor.serve_forever, daemon=True)
+    thread.start()
+    yield ClienteServico(f"http://127.0.0.1:{servidor.server_port}")
+    servidor.shutdown()
+
+
+def test_health_e_ask(servico):
+    app = criar_app(servico).test_client()
+
+    saude = app.get("/health").get_json()
+    resposta = app.post("/ask", json={"pergunta": "o que é herança?", "k": 1})
+    dados = resposta.get_json()
+
+    assert saude["status"] == "ok" and saude["documentos"] == 2
+    assert saude["backend"] == "local"
+    assert resposta.status_code == 200
+    assert dados["resposta"].startswith("Resposta local")
+    assert dados["fontes"][0]["fonte"] == "base/a.pdf"
+    assert {"embedding", "busca_vetorial", "llm_total"} <= set(dados["etapas"])
+    assert app.post("/ask", json={}).status_code == 400
+    assert app.post("/ask", json={"pergunta": "x", "busca": "?"}).status_code == 400
+
+
+def test_sem_contexto_e_cache(servico):
+    sem_contexto = servico.responder("herança", relevancia_minima=1.1)
+    primeira = servico.responder("o que é herança?", k_docs=1)
+    segunda = servico.responder("O que é herança", k_docs=1)
+
+    assert sem_contexto["sem_contexto"] and sem_contexto["fontes"] == []
+    assert not primeira["cache"] and segunda["cache"]
+    assert segunda["resposta"] == primeira["resposta"]
+
+
+def test_cliente_com_streaming(cliente):
+    eventos = list(cliente.perguntar_streaming("tuplas", k=1))
+    completa = cliente.perguntar("tuplas", k=1, temperatura=0.5)
+
+    tokens = [e["texto"] for e in eventos if e["tipo"] == "token"]
+    fim = eventos[-1]
+    assert fim["tipo"] == "fim" and len(tokens) >= 6
+    assert "".join(tokens) == fim["resposta"] == completa["resposta"]
+    assert cliente.saude()["trabalhadores"] == 2
+    with pytest.raises(RuntimeError):
+        cliente.perguntar("")
+
+
+def test_cliente_sem_servico():
+    assert ClienteServico("http://127.0.0.1:9").saude() is None